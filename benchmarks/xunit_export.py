@@ -0,0 +1,51 @@
+"""Measure per-record cost of building the XUnit XML.
+
+Usage: python benchmarks/xunit_export.py [NUM_RECORDS]
+"""
+# pylint: disable=protected-access
+
+import sys
+import time
+
+from lxml import etree
+
+from dump2polarion.exporters.xunit_exporter import ImportedData, XunitExport
+
+VERDICTS = ("passed", "failed", "skipped", "waiting", "Passed ")
+
+CONFIG = {"polarion-project-id": "BENCH", "xunit_import_properties": {}}
+
+
+def gen_records(num):
+    """Generate test records."""
+    return [
+        {
+            "id": "BENCH-{}".format(index),
+            "title": "test_bench[param{}]".format(index),
+            "classname": "bench.tests.TestBench",
+            "verdict": VERDICTS[index % len(VERDICTS)],
+            "comment": "comment {}".format(index % 10),
+            "time": "1.5",
+            "stdout": "some output\n" * 5,
+            "params": {"param": "param{}".format(index)},
+        }
+        for index in range(num)
+    ]
+
+
+def main(num=100000):
+    """Print the per-record cost of building the testcases elements."""
+    records = ImportedData(results=gen_records(num), testrun=None)
+    exporter = XunitExport("bench", records, CONFIG, transform_func=lambda arg: arg)
+    exporter._properties_element(exporter._top_element())
+    testsuite = etree.Element("testsuite")
+
+    start = time.perf_counter()
+    exporter._fill_tests_results(testsuite)
+    elapsed = time.perf_counter() - start
+
+    print("{} records: {:.2f} us per record".format(num, elapsed / num * 1e6))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -3,7 +3,7 @@
 from dump2polarion.configuration import get_config
 from dump2polarion.results.importer import import_results
 from dump2polarion.exporters.requirements_exporter import RequirementExport
-from dump2polarion.submit import submit_and_verify
+from dump2polarion.submit import submit_and_verify, submit_shards_and_verify
 from dump2polarion.exporters.testcases_exporter import TestcaseExport
 from dump2polarion.exporters.xunit_exporter import XunitExport
 
@@ -14,4 +14,5 @@ __all__ = [
     "import_results",
     "get_config",
     "submit_and_verify",
+    "submit_shards_and_verify",
 ]
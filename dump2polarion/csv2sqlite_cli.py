@@ -2,13 +2,15 @@
 
 import argparse
 import datetime
+import itertools
 import logging
+import operator
 import os
 import sqlite3
 
 from dump2polarion import utils
 from dump2polarion.exceptions import Dump2PolarionException
-from dump2polarion.results import csvtools
+from dump2polarion.results import csvtools, dbtools
 
 REQUIRED_KEYS = (
     "verdict",
@@ -25,49 +27,177 @@ REQUIRED_KEYS = (
 logger = logging.getLogger(__name__)
 
 
+# load modes
+MODE_CREATE = "create"
+MODE_APPEND = "append"
+MODE_MERGE = "merge"
+
+# columns that are indexed once the data are loaded
+INDEXED_KEYS = ("id", "verdict", "exported")
+
+# settings for fast loading of data in single transaction
+_BULK_PRAGMAS = ("PRAGMA cache_size = -65536", "PRAGMA temp_store = MEMORY")
+
+
 def get_args(args=None):
     """Get command line arguments."""
     parser = argparse.ArgumentParser(description="csv2sqlite")
     parser.add_argument("-i", "--input_file", required=True, help="Path to CSV records file")
     parser.add_argument("-o", "--output_file", required=True, help="Path to sqlite output file")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--append",
+        dest="mode",
+        action="store_const",
+        const=MODE_APPEND,
+        help="Append the records to existing database",
+    )
+    mode.add_argument(
+        "--merge",
+        dest="mode",
+        action="store_const",
+        const=MODE_MERGE,
+        help="Merge the records into existing database,"
+        " records replace the existing records with the same ID",
+    )
     parser.add_argument("--log-level", help="Set logging to specified level")
+    parser.set_defaults(mode=MODE_CREATE)
     return parser.parse_args(args)
 
 
-def dump2sqlite(records, output_file):
-    """Dump tests results to database."""
-    results_keys = list(records.results[0].keys())
-    pad_data = []
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
 
-    for key in REQUIRED_KEYS:
-        if key not in results_keys:
-            results_keys.append(key)
-            pad_data.append("")
 
-    conn = sqlite3.connect(os.path.expanduser(output_file), detect_types=sqlite3.PARSE_DECLTYPES)
+def _get_columns(conn, table="testcases"):
+    return [row[1] for row in conn.execute("PRAGMA table_info({})".format(table))]
+
+
+def _prepare_table(conn, results_keys, mode):
+    """Create the table or add missing columns to the existing table."""
+    columns = _get_columns(conn)
+    if mode == MODE_CREATE or not columns:
+        if columns:
+            raise Dump2PolarionException(
+                "The database already exists, use '--append' or '--merge' to add records"
+            )
+        conn.execute(
+            "CREATE TABLE testcases ({},sqltime TIMESTAMP)".format(
+                ",".join("{} TEXT".format(_quote(key)) for key in results_keys)
+            )
+        )
+        return
+
+    for key in results_keys:
+        if key not in columns:
+            conn.execute("ALTER TABLE testcases ADD COLUMN {} TEXT".format(_quote(key)))
+
+
+def _save_testrun(conn, testrun):
+    """Save testrun id, keep the testrun id that is already in the database."""
+    conn.execute("CREATE TABLE IF NOT EXISTS testrun (testrun TEXT)")
+    saved = conn.execute("SELECT testrun FROM testrun").fetchone()
+    if not saved:
+        conn.execute("INSERT INTO testrun VALUES (?)", (testrun,))
+    elif saved[0] != testrun:
+        logger.warning(
+            "The test run id '%s' differs from test run id '%s' in the database, keeping '%s'",
+            testrun,
+            saved[0],
+            saved[0],
+        )
+
+
+def _create_indexes(conn):
+    for key in INDEXED_KEYS:
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS testcases_{0} ON testcases ({1})".format(key, _quote(key))
+        )
+    dbtools.create_indexes(conn)
+
 
+def _iter_rows(results, records_keys, pad_data):
+    """Yield values of every column for each record."""
+    get_values = operator.itemgetter(*records_keys)
+    if len(records_keys) == 1:
+        # the single value is not returned as tuple
+        for row in results:
+            yield (get_values(row),) + pad_data
+        return
     # in each row there needs to be data for every column
-    # last column is current time
-    pad_data.append(datetime.datetime.utcnow())
+    for row in results:
+        yield get_values(row) + pad_data
 
-    to_db = [list(row.values()) + pad_data for row in records.results]
 
-    cur = conn.cursor()
-    cur.execute(
-        "CREATE TABLE testcases ({},sqltime TIMESTAMP)".format(
-            ",".join("{} TEXT".format(key) for key in results_keys)
+def _insert_rows(conn, rows, columns, mode):
+    """Insert rows into the table, in merge mode replace the rows with the same ID."""
+    placeholders = ",".join(["?"] * len(columns))
+    columns = ",".join(_quote(key) for key in columns)
+    if mode != MODE_MERGE:
+        conn.executemany(
+            "INSERT INTO testcases ({}) VALUES ({})".format(columns, placeholders), rows
         )
+        return
+
+    conn.execute("CREATE TEMP TABLE testcases_merged AS SELECT * FROM testcases LIMIT 0")
+    conn.executemany(
+        "INSERT INTO temp.testcases_merged ({}) VALUES ({})".format(columns, placeholders), rows
     )
-    cur.executemany(
-        "INSERT INTO testcases VALUES ({},?)".format(",".join(["?"] * len(results_keys))), to_db
+    conn.execute("DELETE FROM testcases WHERE id IN (SELECT id FROM temp.testcases_merged)")
+    conn.execute(
+        "INSERT INTO testcases ({0}) SELECT {0} FROM temp.testcases_merged".format(columns)
     )
+    conn.execute("DROP TABLE temp.testcases_merged")
+
 
-    if records.testrun:
-        cur.execute("CREATE TABLE testrun (testrun TEXT)")
-        cur.execute("INSERT INTO testrun VALUES (?)", (records.testrun,))
+def dump2sqlite(records, output_file, mode=MODE_CREATE):
+    """Dump tests results to database.
 
-    conn.commit()
-    conn.close()
+    The records are streamed into the database in single transaction. The `records.results`
+    can be iterator. With `MODE_APPEND` the records are added to existing database,
+    with `MODE_MERGE` they replace existing records with the same ID.
+    """
+    results = iter(records.results)
+    first_record = next(results)
+    records_keys = list(first_record.keys())
+    results_keys = list(records_keys)
+    pad_data = []
+
+    for key in REQUIRED_KEYS:
+        if key not in results_keys:
+            results_keys.append(key)
+            pad_data.append("")
+
+    output_file = os.path.expanduser(output_file)
+    new_db = not os.path.exists(output_file)
+    conn = sqlite3.connect(output_file, detect_types=sqlite3.PARSE_DECLTYPES)
+    try:
+        for pragma in _BULK_PRAGMAS:
+            conn.execute(pragma)
+        if new_db:
+            # nothing to lose when loading fails, the database is just being created
+            conn.execute("PRAGMA journal_mode = MEMORY")
+            conn.execute("PRAGMA synchronous = OFF")
+
+        # last column is current time
+        pad_data.append(datetime.datetime.utcnow())
+        rows = _iter_rows(itertools.chain((first_record,), results), records_keys, tuple(pad_data))
+
+        with conn:
+            # the table is created in the same transaction as the records are inserted
+            conn.execute("BEGIN")
+            _prepare_table(conn, results_keys, mode)
+            _insert_rows(conn, rows, results_keys + ["sqltime"], mode)
+            if records.testrun:
+                _save_testrun(conn, records.testrun)
+
+        # indexes are built once all the data are loaded
+        with conn:
+            _create_indexes(conn)
+        # switch to WAL now, before several dumpers can claim rows of the database concurrently
+        dbtools.enable_wal(conn)
+    finally:
+        conn.close()
 
     logger.info("Data written to '%s'", output_file)
 
@@ -82,14 +212,19 @@ def main(args=None):
         logger.warning("Make sure the input file '%s' is in CSV format", args.input_file)
 
     try:
-        records = csvtools.get_imported_data(args.input_file)
+        # records are streamed from the CSV file into the database
+        records = csvtools.get_imported_data(args.input_file, lazy=True)
     except (OSError, Dump2PolarionException) as err:
         logger.fatal(err)
         return 1
 
+    results = iter(records.results)
+    first_record = next(results)
+    records = records._replace(results=itertools.chain((first_record,), results))
+
     # check if all columns required by `pytest_polarion_cfme` are there
     required_columns = {"id": "ID", "title": "Title"}
-    missing_columns = [required_columns[k] for k in required_columns if k not in records.results[0]]
+    missing_columns = [required_columns[k] for k in required_columns if k not in first_record]
     if missing_columns:
         logger.fatal(
             "The input file '%s' is missing following columns: %s",
@@ -99,7 +234,7 @@ def main(args=None):
         return 1
 
     try:
-        dump2sqlite(records, args.output_file)
+        dump2sqlite(records, args.output_file, mode=args.mode)
     # pylint: disable=broad-except
     except Exception as err:
         logger.exception(err)
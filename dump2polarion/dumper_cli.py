@@ -13,9 +13,10 @@ import os
 from box import Box
 
 import dump2polarion
-from dump2polarion import utils
+from dump2polarion import profiling, utils
 from dump2polarion.exceptions import Dump2PolarionException, NothingToDoException
-from dump2polarion.results import dbtools
+from dump2polarion.results import importcache, importer
+from dump2polarion.results.records import ExportedRows
 
 # pylint: disable=invalid-name
 logger = logging.getLogger(__name__)
@@ -28,7 +29,10 @@ def get_args(args=None):
         "-i",
         "--input_file",
         required=True,
-        help="Path to CSV, SQLite or JUnit reports file or importers XML file",
+        nargs="+",
+        help="Path to CSV, SQLite or JUnit reports file or importers XML file;"
+        " several paths, directories or globs of results files can be specified;"
+        " results files can be compressed with gzip, xz or bzip2; '-' reads standard input",
     )
     parser.add_argument(
         "-o", "--output_file", help="Where to save the XML output file (default: not saved)"
@@ -55,8 +59,79 @@ def get_args(args=None):
     parser.add_argument(
         "--job-log", help="Where to save the log file produced by the Importer (default: not saved)"
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="NUM",
+        help="Number of processes for importing and transforming results,"
+        " 0 means number of CPUs"
+        " (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write the XUnit file one testcase at a time to keep memory usage low"
+        " (the XML file is always saved)",
+    )
+    parser.add_argument(
+        "--shard-records",
+        type=int,
+        metavar="NUM",
+        help="Split the XUnit into several files with at most NUM testcases each",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=float,
+        metavar="MB",
+        help="Split the XUnit into several files with testcases of at most MB megabytes each",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Don't pretty-print the saved XML file; the file is compressed with gzip"
+        " when its name ends with '.gz'",
+    )
+    parser.add_argument(
+        "--build",
+        help="Import Ostriz results of the build (build or test run id),"
+        " default is build of the first result",
+    )
+    parser.add_argument(
+        "--all-builds",
+        action="store_true",
+        help="Export and submit Ostriz results of every build found in the input data"
+        " into its own test run",
+    )
+    parser.add_argument(
+        "--claim-batch",
+        type=int,
+        metavar="NUM",
+        help="Claim and export at most NUM rows of SQLite input that are not claimed by another"
+        " dumper, so several dumpers can export the same database concurrently",
+    )
+    parser.add_argument(
+        "--import-cache",
+        action="store_true",
+        help="Cache data imported from local input files on disk, so the same files are not"
+        " parsed again (e.g. when retrying failed submission)",
+    )
+    parser.add_argument(
+        "--profile-report",
+        metavar="FILE",
+        help="Save timing and memory usage of individual processing stages into JSON file",
+    )
+    parser.add_argument(
+        "--profile-tracemalloc",
+        action="store_true",
+        help="Trace memory allocations for the profile report (slows down the processing)",
+    )
     parser.add_argument("--log-level", help="Set logging to specified level")
-    return parser.parse_args(args)
+    parsed_args = parser.parse_args(args)
+    if len(parsed_args.input_file) == 1:
+        parsed_args.input_file = parsed_args.input_file[0]
+    return parsed_args
 
 
 def get_submit_args(args):
@@ -116,6 +191,8 @@ def get_testrun_id(args, config, records_testrun_id):
 
 def submit_if_ready(args, submit_args, config):
     """Submit the input XML file if it's already in the expected format."""
+    if not isinstance(args.input_file, str):
+        return None
     __, ext = os.path.splitext(args.input_file)
     if ext.lower() != ".xml":
         return None
@@ -149,25 +226,123 @@ def _get_config(args):
     return dump2polarion.get_config(args.config_file, args_config)
 
 
-def dumper(args, config, transform_func=None):
-    """Perform main dumper functionality."""
-    args = process_args(args)
-    submit_args = get_submit_args(args)
+def _get_jobs(args):
+    # `args` can be passed to `dumper` without the "jobs" key
+    return args.jobs if isinstance(args.jobs, int) else 1
 
-    submit_outcome = submit_if_ready(args, submit_args, config)
-    if submit_outcome is not None:
-        # submitted, nothing more to do
-        return submit_outcome
 
+def _is_sharded(args):
+    return bool(args.shard_records or args.shard_size)
+
+
+def _export_output(args, exporter):
+    """Export the XUnit XML.
+
+    Return the XML root element, list of root elements of XML shards or name of the file
+    with streamed XML.
+    """
+    if args.stream and _is_sharded(args):
+        raise Dump2PolarionException("The '--stream' and '--shard-*' options can't be combined")
+    if args.stream:
+        # when no output file is specified, the 'testrun_TESTRUN_ID-TIMESTAMP'
+        # file will be created in current directory
+        return exporter.write_xml_stream(args.output_file, pretty_print=not args.compact)
+    if _is_sharded(args):
+        max_bytes = int(args.shard_size * 1024 * 1024) if args.shard_size else None
+        return exporter.export_shards_xml_roots(max_records=args.shard_records, max_bytes=max_bytes)
+    return exporter.export_xml_root()
+
+
+def _submit_output(args, submit_args, config, output):
+    """Submit the exported XUnit XML."""
+    if args.stream:
+        return dump2polarion.submit_and_verify(xml_file=output, config=config, **submit_args)
+    if _is_sharded(args):
+        return dump2polarion.submit_shards_and_verify(output, config=config, **submit_args)
+    return dump2polarion.submit_and_verify(xml_root=output, config=config, **submit_args)
+
+
+def _mark_exported(exported_rows):
+    """Mark exported records in SQLite input files as exported."""
+    if not exported_rows.rowids:
+        return
+    from dump2polarion.results import dbtools
+
+    for input_db, rowids in exported_rows.rowids.items():
+        dbtools.mark_exported_sqlite(input_db, rowids=rowids)
+
+
+def _write_output(args, exporter, output):
+    """Write the exported XML into a file."""
+    # when no output file is specified, the 'testrun_TESTRUN_ID-TIMESTAMP'
+    # file will be created in current directory
+    with profiling.stage("write"):
+        if _is_sharded(args):
+            exporter.write_xml_shards(output, args.output_file, pretty_print=not args.compact)
+        else:
+            exporter.write_xml_root(output, args.output_file, pretty_print=not args.compact)
+
+
+def _release_claimed(input_file, claimed_by):
+    """Release claim of rows that were not exported in SQLite input files."""
+    from dump2polarion.results import dbtools
+
+    try:
+        for input_db in importer.expand_input_files(input_file):
+            if importer.is_sqlite(input_db):
+                dbtools.release_claimed_sqlite(input_db, claimed_by)
+    except Dump2PolarionException as err:
+        logger.error(err)
+
+
+def _export_records(args, config, records, transform_func=None, exported_callback=None):
+    """Export the imported records, return the exporter and the exported output."""
+    testrun_id = get_testrun_id(args, config, records.testrun)
+    exporter = dump2polarion.XunitExport(
+        testrun_id,
+        records,
+        config,
+        transform_func=transform_func,
+        jobs=_get_jobs(args),
+        exported_callback=exported_callback,
+    )
+    return exporter, _export_output(args, exporter)
+
+
+def _write_and_submit(args, config, submit_args, exporter, output):
+    """Write and submit the exported output, return the response of the submit.
+
+    The response is `None` both when nothing is submitted and when the submit failed.
+    """
+    if not args.stream and (args.output_file or args.no_submit):
+        _write_output(args, exporter, output)
+
+    if args.no_submit:
+        return None
+    return _submit_output(args, submit_args, config, output)
+
+
+def _dump_results(args, config, submit_args, transform_func=None, claimed_by=None):
     import_time = datetime.datetime.utcnow()
+    # only the rows that were really exported are marked in SQLite input files
+    exported_rows = ExportedRows()
+    claim_kwargs = {"claim_batch": args.claim_batch, "claimed_by": claimed_by} if claimed_by else {}
 
     try:
-        records = dump2polarion.import_results(args.input_file, older_than=import_time)
-        testrun_id = get_testrun_id(args, config, records.testrun)
-        exporter = dump2polarion.XunitExport(
-            testrun_id, records, config, transform_func=transform_func
+        # results are read lazily, so import overlaps with export
+        records = dump2polarion.import_results(
+            args.input_file,
+            older_than=import_time,
+            lazy=True,
+            jobs=_get_jobs(args),
+            force=args.force,
+            build=args.build or None,
+            cache_dir=importcache.get_cache_dir() if args.import_cache else None,
+            **claim_kwargs
+        )
+        exporter, output = _export_records(
+            args, config, records, transform_func=transform_func, exported_callback=exported_rows
         )
-        output = exporter.export()
     except NothingToDoException as info:
         logger.info(info)
         return 0
@@ -175,21 +350,105 @@ def dumper(args, config, transform_func=None):
         logger.fatal(err)
         return 1
 
-    if args.output_file or args.no_submit:
-        # when no output file is specified, the 'testrun_TESTRUN_ID-TIMESTAMP'
-        # file will be created in current directory
-        exporter.write_xml(output, args.output_file)
+    response = _write_and_submit(args, config, submit_args, exporter, output)
+    if args.no_submit:
+        return 0
 
-    if not args.no_submit:
-        response = dump2polarion.submit_and_verify(output, config=config, **submit_args)
+    if response:
+        _mark_exported(exported_rows)
 
-        __, ext = os.path.splitext(args.input_file)
-        if ext.lower() in dbtools.SQLITE_EXT and response:
-            dbtools.mark_exported_sqlite(args.input_file, import_time)
+    return 0 if response else 2
 
-        return 0 if response else 2
 
-    return 0
+def _dump_build(args, config, submit_args, records, transform_func=None):
+    """Export and submit results of single build."""
+    try:
+        exporter, output = _export_records(args, config, records, transform_func=transform_func)
+    except NothingToDoException as info:
+        logger.info("%s: %s", records.testrun, info)
+        return 0
+    except (OSError, Dump2PolarionException) as err:
+        logger.fatal("%s: %s", records.testrun, err)
+        return 1
+
+    response = _write_and_submit(args, config, submit_args, exporter, output)
+    return 0 if args.no_submit or response else 2
+
+
+def _dump_all_builds(args, config, submit_args, transform_func=None):
+    """Export and submit results of all builds found in the Ostriz data."""
+    if args.testrun_id:
+        logger.fatal("The '--all-builds' and '--testrun-id' options can't be combined")
+        return 1
+    if args.output_file and not os.path.isdir(os.path.expanduser(args.output_file)):
+        logger.fatal("The output of '--all-builds' needs to be a directory")
+        return 1
+
+    from dump2polarion.results import ostriztools
+
+    try:
+        with profiling.stage("import") as stats:
+            builds = ostriztools.import_ostriz_builds(importer.expand_input_files(args.input_file))
+            stats.records = sum(len(records.results) for records in builds.values())
+    except NothingToDoException as info:
+        logger.info(info)
+        return 0
+    except (OSError, Dump2PolarionException) as err:
+        logger.fatal(err)
+        return 1
+
+    retval = 0
+    for records in builds.values():
+        retval = max(
+            retval,
+            _dump_build(args, config, submit_args, records, transform_func=transform_func),
+        )
+    return retval
+
+
+def _dump(args, config, transform_func=None):
+    submit_args = get_submit_args(args)
+
+    submit_outcome = submit_if_ready(args, submit_args, config)
+    if submit_outcome is not None:
+        # submitted, nothing more to do
+        return submit_outcome
+
+    if args.all_builds:
+        return _dump_all_builds(args, config, submit_args, transform_func=transform_func)
+
+    if not args.claim_batch:
+        return _dump_results(args, config, submit_args, transform_func=transform_func)
+
+    from dump2polarion.results import dbtools
+
+    # several dumpers can export the same SQLite database, each its own batch of rows
+    claimed_by = dbtools.get_worker_id()
+    try:
+        return _dump_results(
+            args, config, submit_args, transform_func=transform_func, claimed_by=claimed_by
+        )
+    finally:
+        # rows that were not exported can be claimed again
+        _release_claimed(args.input_file, claimed_by)
+
+
+def dumper(args, config, transform_func=None):
+    """Perform main dumper functionality.
+
+    When the `profile_report` argument is set, timing and memory usage of the individual
+    stages is saved into the JSON file.
+    """
+    args = process_args(args)
+    if not args.profile_report:
+        with profiling.stage("dumper"):
+            return _dump(args, config, transform_func=transform_func)
+
+    with profiling.profile(trace_memory=bool(args.profile_tracemalloc)) as report:
+        with profiling.stage("dumper"):
+            retval = _dump(args, config, transform_func=transform_func)
+    report.write_json(args.profile_report)
+    return retval
 
 
 def main(args=None, transform_func=None):
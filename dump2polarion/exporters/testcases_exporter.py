@@ -387,16 +387,35 @@ class TestcaseExport:
         if not records:
             raise NothingToDoException("Nothing to export")
 
-    def export(self) -> str:
-        """Return testcases XML."""
+    def export_xml_root(self) -> etree.Element:
+        """Return root element of the testcases XML."""
         top = self._top_element()
         properties = self._properties_element(top)
         self._fill_testcases(top)
         self._fill_lookup_prop(properties)
-        return utils.prettify_xml(top)
+        return top
+
+    def export(self) -> str:
+        """Return testcases XML."""
+        return utils.prettify_xml(self.export_xml_root())
 
     @staticmethod
-    def write_xml(xml_str: str, output_file: Optional[str] = None) -> None:
-        """Output the XML content into a file."""
-        gen_filename = "testcases-{:%Y%m%d%H%M%S}.xml".format(datetime.datetime.now())
-        utils.write_xml(xml_str, output_loc=output_file, filename=gen_filename)
+    def _gen_filename() -> str:
+        return "testcases-{:%Y%m%d%H%M%S}.xml".format(datetime.datetime.now())
+
+    def write_xml(self, xml_str: str, output_file: Optional[str] = None) -> None:
+        """Output the XML content produced by `export` into a file."""
+        utils.write_xml(
+            xml_str, output_loc=output_file, filename=self._gen_filename(), sanitize=False
+        )
+
+    def write_xml_root(
+        self, xml_root: etree.Element, output_file: Optional[str] = None, pretty_print: bool = True
+    ) -> None:
+        """Output the XML content produced by `export_xml_root` into a file."""
+        utils.write_xml_root(
+            xml_root,
+            output_loc=output_file,
+            filename=self._gen_filename(),
+            pretty_print=pretty_print,
+        )
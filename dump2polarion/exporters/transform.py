@@ -1,10 +1,13 @@
 """Helper functions for transforming results."""
 
+import copy
+import datetime
 import hashlib
 import logging
 import os
 import re
 import urllib.parse
+from collections.abc import MutableMapping
 from typing import Optional
 
 from docutils.core import publish_parts
@@ -16,6 +19,76 @@ logger = logging.getLogger(__name__)
 
 TEST_PARAM_RE = re.compile(r"\[.*\]")
 
+# values of these types are never copied
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None), datetime.datetime)
+
+
+class CopyOnWriteRecord(MutableMapping):
+    """Record data overlaying the original record.
+
+    Changes are stored in the overlay and never propagate to the original record, so
+    the record can be modified the same way as its deep copy. Only the changed fields
+    are stored. Mutable values (e.g. "params") are deep-copied on first access.
+
+    >>> orig = {"title": "test_foo", "params": {"foo": "bar"}, "classname": "TestFoo"}
+    >>> record = CopyOnWriteRecord(orig)
+    >>> record["title"] = "TestFoo.test_foo"
+    >>> record["params"]["foo"] = "baz"
+    >>> del record["classname"]
+    >>> sorted(record.items())
+    [('params', {'foo': 'baz'}), ('title', 'TestFoo.test_foo')]
+    >>> sorted(orig.items())
+    [('classname', 'TestFoo'), ('params', {'foo': 'bar'}), ('title', 'test_foo')]
+    """
+
+    __slots__ = ("_base", "_changes", "_deleted")
+
+    def __init__(self, base):
+        self._base = base
+        self._changes = {}
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        if key in self._changes:
+            return self._changes[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        value = self._base[key]
+        if not isinstance(value, _IMMUTABLE_TYPES):
+            value = copy.deepcopy(value)
+            self._changes[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._changes[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._changes.pop(key, None)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self._changes:
+            return True
+        return key not in self._deleted and key in self._base
+
+    def __iter__(self):
+        for key in self._base:
+            if key not in self._deleted:
+                yield key
+        for key in self._changes:
+            if key not in self._base:
+                yield key
+
+    def __len__(self):
+        return sum(1 for __ in self)
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, dict(self.items()))
+
 
 def only_passed_and_wait(result):
     """Return PASS and WAIT results only, skips everything else."""
@@ -5,7 +5,6 @@ If the 'polarion-lookup-method' is set to 'custom', this is the place where you
 set the 'id' of the test case to desired value.
 """
 
-import copy
 import logging
 import re
 
@@ -26,7 +25,7 @@ def get_xunit_transform_default(config):
         if not verdict:
             return None
 
-        result = copy.deepcopy(result)
+        result = transform.CopyOnWriteRecord(result)
 
         transform.setup_parametrization(result, parametrize)
         transform.include_class_in_title(result)
@@ -46,7 +45,7 @@ def get_testcases_transform_default(config):
 
     def testcase_transform(testcase):
         """Transform test cases."""
-        testcase = copy.deepcopy(testcase)
+        testcase = transform.CopyOnWriteRecord(testcase)
 
         transform.setup_parametrization(testcase, parametrize)
         transform.fill_automation_repo(repo_address, testcase)
@@ -110,7 +109,7 @@ def get_xunit_transform_cfme(config):
         if not verdict:
             return None
 
-        result = copy.deepcopy(result)
+        result = transform.CopyOnWriteRecord(result)
 
         transform.setup_parametrization(result, parametrize)
         transform.include_class_in_title(result)
@@ -148,7 +147,7 @@ def get_testcases_transform_cfme(config):
 
     def testcase_transform(testcase):
         """Transform test cases for CFME."""
-        testcase = copy.deepcopy(testcase)
+        testcase = transform.CopyOnWriteRecord(testcase)
 
         transform.setup_parametrization(testcase, parametrize)
         set_cfme_caselevel(testcase, caselevels)
@@ -169,7 +168,7 @@ def get_requirements_transform_cfme(config):  # noqa: D202
 
     def requirement_transform(requirement):
         """Transform requirements for CFME."""
-        requirement = copy.deepcopy(requirement)
+        requirement = transform.CopyOnWriteRecord(requirement)
 
         if "id" in requirement:
             del requirement["id"]
@@ -185,7 +184,7 @@ def get_requirements_transform_cloudtp(config):  # noqa: D202
 
     def requirement_transform(requirement):
         """Transform requirements for CLOUDTP."""
-        requirement = copy.deepcopy(requirement)
+        requirement = transform.CopyOnWriteRecord(requirement)
 
         if "id" in requirement:
             del requirement["id"]
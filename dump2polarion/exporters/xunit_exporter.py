@@ -15,23 +15,98 @@ tests_records = ImportedData(
     ],
     testrun=None,
 )
+
+The `results` can be also a lazy iterable (e.g. generator). The results are then consumed
+in one pass while the XML is being built, so they can be exported only once.
 """
 
+import collections
 import datetime
+import itertools
 import logging
-from typing import Callable, List, NamedTuple, Optional
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import types
+from collections.abc import MutableMapping
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 from lxml import etree
 
-from dump2polarion import utils
+from dump2polarion import profiling, utils
 from dump2polarion.exceptions import Dump2PolarionException, NothingToDoException
-from dump2polarion.exporters import transform_projects
+from dump2polarion.exporters import transform, transform_projects
 from dump2polarion.exporters.verdicts import Verdicts
 
 LOGGER = logging.getLogger(__name__)
 
 
-ImportedData = NamedTuple("ImportedData", [("results", List[dict]), ("testrun", Optional[str])])
+ImportedData = NamedTuple("ImportedData", [("results", Iterable[dict]), ("testrun", Optional[str])])
+
+VerdictLayout = NamedTuple(
+    "VerdictLayout", [("counter", str), ("tag", Optional[str]), ("type", Optional[str])]
+)
+
+ExportPlan = NamedTuple("ExportPlan", [("verdicts", Mapping[str, VerdictLayout])])
+
+
+def compile_export_plan() -> ExportPlan:
+    """Return the export plan with frozen table of verdict -> (counter, element tag, type)."""
+    verdicts = {}
+    for names, layout in (
+        # XUnit Pass maps to Passed in Polarion
+        (Verdicts.PASS, VerdictLayout("passed", None, None)),
+        # XUnit Failure maps to Failed in Polarion
+        (Verdicts.FAIL, VerdictLayout("failures", "failure", "failure")),
+        # XUnit Error maps to Blocked in Polarion
+        (Verdicts.SKIP, VerdictLayout("skipped", "error", "error")),
+        # XUnit Skipped maps to Waiting in Polarion
+        (Verdicts.WAIT, VerdictLayout("waiting", "skipped", "skipped")),
+    ):
+        verdicts.update(dict.fromkeys(names, layout))
+    return ExportPlan(verdicts=types.MappingProxyType(verdicts))
+
+
+# number of results sent to a worker process at once
+_TRANSFORM_CHUNKSIZE = 500
+# number of windows of `jobs * _TRANSFORM_CHUNKSIZE` results submitted to the pool at once
+_TRANSFORM_WINDOWS = 2
+
+# transform function used in the worker process
+_WORKER_TRANSFORM = None  # type: Optional[Callable]
+
+
+def _run_transform(transform_func: Callable, result: Mapping) -> dict:
+    """Call transform function on result."""
+    if not isinstance(result, MutableMapping):
+        # imported records can be read-only, the transform function is allowed to modify them
+        result = transform.CopyOnWriteRecord(result)
+    return transform_func(result) or {}
+
+
+def _init_transform_worker(config: dict, transform_func: Optional[Callable]) -> None:
+    """Set the transform function in the worker process."""
+    # pylint: disable=global-statement
+    global _WORKER_TRANSFORM
+    _WORKER_TRANSFORM = transform_func or transform_projects.get_xunit_transform(config)
+
+
+def _transform_in_worker(result: dict) -> dict:
+    """Call transform function on result in the worker process."""
+    assert _WORKER_TRANSFORM
+    return _run_transform(_WORKER_TRANSFORM, result)
 
 
 class XunitExport:
@@ -43,12 +118,19 @@ class XunitExport:
         tests_records: ImportedData,
         config: dict,
         transform_func: Optional[Callable] = None,
+        jobs: int = 1,
+        exported_callback: Optional[Callable[[Mapping], None]] = None,
     ) -> None:
         self.testrun_id = testrun_id
         self.tests_records = tests_records
         self.config = config or {}
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
         self._lookup_prop = ""
+        self._plan = compile_export_plan()
+        self._custom_transform_func = transform_func
         self._transform_func = transform_func or transform_projects.get_xunit_transform(config)
+        # called with the original (not transformed) result of every exported testcase
+        self._exported_callback = exported_callback
 
     def _top_element(self) -> etree.Element:
         """Return top XML element."""
@@ -116,47 +198,91 @@ class XunitExport:
         )
         return testsuite
 
-    @staticmethod
-    def _fill_verdict(verdict: str, result: dict, testcase: etree.Element, records: dict) -> None:
-        # XUnit Pass maps to Passed in Polarion
-        if verdict in Verdicts.PASS:
-            records["passed"] += 1
-        # XUnit Failure maps to Failed in Polarion
-        elif verdict in Verdicts.FAIL:
-            records["failures"] += 1
-            verdict_data = {"type": "failure"}
-            if result.get("comment"):
-                verdict_data["message"] = utils.get_unicode_str(result["comment"])
-            etree.SubElement(testcase, "failure", utils.sorted_dict(verdict_data))
-        # XUnit Error maps to Blocked in Polarion
-        elif verdict in Verdicts.SKIP:
-            records["skipped"] += 1
-            verdict_data = {"type": "error"}
-            if result.get("comment"):
-                verdict_data["message"] = utils.get_unicode_str(result["comment"])
-            etree.SubElement(testcase, "error", utils.sorted_dict(verdict_data))
-        # XUnit Skipped maps to Waiting in Polarion
-        elif verdict in Verdicts.WAIT:
-            records["waiting"] += 1
-            verdict_data = {"type": "skipped"}
-            if result.get("comment"):
-                verdict_data["message"] = utils.get_unicode_str(result["comment"])
-            etree.SubElement(testcase, "skipped", utils.sorted_dict(verdict_data))
+    def _fill_verdict(self, verdict: str, result: dict, testcase: etree.Element, records: dict):
+        layout = self._plan.verdicts[verdict]
+        records[layout.counter] += 1
+        if not layout.tag:
+            return
+        verdict_element = etree.SubElement(testcase, layout.tag)
+        # attributes are set in sorted order
+        comment = result.get("comment")
+        if comment:
+            verdict_element.set("message", utils.get_unicode_str(comment))
+        verdict_element.set("type", layout.type)
 
     def _transform_result(self, result: dict) -> dict:
         """Call transform function on result."""
         if self._transform_func:
-            result = self._transform_func(result)
+            return _run_transform(self._transform_func, result)
         return result or {}
 
-    @staticmethod
-    def _get_verdict(result: dict):
+    def _can_transform_in_pool(self) -> bool:
+        """Check that the transform function can be passed to worker processes."""
+        if self.jobs < 2:
+            return False
+        if self._custom_transform_func is None:
+            # the default transform function is created in every worker process
+            return True
+        try:
+            pickle.dumps(self._custom_transform_func)
+        # pylint: disable=broad-except
+        except Exception:
+            LOGGER.warning(
+                "The transform function can't be passed to worker processes, "
+                "transforming results serially"
+            )
+            return False
+        return True
+
+    def _transformed_results(self) -> Iterator[Tuple[Mapping, dict]]:
+        """Yield original and transformed results in the original order.
+
+        When more jobs are requested, the transform function runs in a pool of processes
+        over batches of results.
+        """
+        if not self._can_transform_in_pool():
+            for result in self.tests_records.results:
+                yield result, self._transform_result(result)
+            return
+
+        results = iter(self.tests_records.results)
+        window_size = self.jobs * _TRANSFORM_CHUNKSIZE
+        # windows of results that were sent to the pool, only the next window is transformed
+        # while the current one is consumed so the lazily imported results are not all read
+        in_flight = collections.deque()  # type: collections.deque
+
+        LOGGER.debug("Transforming results using %d processes", self.jobs)
+        with multiprocessing.Pool(
+            self.jobs,
+            initializer=_init_transform_worker,
+            initargs=(self.config, self._custom_transform_func),
+        ) as pool:
+            while True:
+                while len(in_flight) < _TRANSFORM_WINDOWS:
+                    window = list(itertools.islice(results, window_size))
+                    if not window:
+                        break
+                    transformed = pool.map_async(
+                        _transform_in_worker, window, chunksize=_TRANSFORM_CHUNKSIZE
+                    )
+                    in_flight.append((window, transformed))
+                if not in_flight:
+                    return
+                window, transformed = in_flight.popleft()
+                yield from zip(window, transformed.get())
+
+    def _report_exported(self, result: Mapping) -> None:
+        """Report that the testcase was created for the original result."""
+        if self._exported_callback:
+            self._exported_callback(result)
+
+    def _get_verdict(self, result: dict):
         """Get verdict of the testcase."""
         verdict = result.get("verdict")
         if not verdict:
             return None
         verdict = verdict.strip().lower()
-        if verdict not in Verdicts.PASS + Verdicts.FAIL + Verdicts.SKIP + Verdicts.WAIT:
+        if verdict not in self._plan.verdicts:
             return None
         return verdict
 
@@ -202,10 +328,13 @@ class XunitExport:
         testcase_time = float(result.get("time") or result.get("duration") or 0)
         records["time"] += testcase_time
 
-        testcase_data = {"name": name, "time": str(testcase_time)}
-        if result.get("classname"):
-            testcase_data["classname"] = result["classname"]
-        testcase = etree.SubElement(parent_element, "testcase", utils.sorted_dict(testcase_data))
+        testcase = etree.SubElement(parent_element, "testcase")
+        # attributes are set in sorted order
+        classname = result.get("classname")
+        if classname:
+            testcase.set("classname", classname)
+        testcase.set("name", name)
+        testcase.set("time", str(testcase_time))
         return testcase
 
     @staticmethod
@@ -219,8 +348,8 @@ class XunitExport:
             system_err = etree.SubElement(testcase, "system-err")
             system_err.text = utils.get_unicode_str(result["stderr"])
 
-    @staticmethod
     def _fill_properties(
+        self,
         verdict: str,
         result: dict,
         testcase: etree.Element,
@@ -237,7 +366,7 @@ class XunitExport:
         etree.SubElement(
             properties, "property", {"name": "polarion-testcase-id", "value": id_value}
         )
-        if verdict in Verdicts.PASS and result.get("comment"):
+        if self._plan.verdicts[verdict].counter == "passed" and result.get("comment"):
             etree.SubElement(
                 properties,
                 "property",
@@ -258,20 +387,21 @@ class XunitExport:
                 },
             )
 
-    def _gen_testcase(self, parent_element: etree.Element, result: dict, records: dict) -> None:
-        """Create record for given testcase result."""
-        result = self._transform_result(result)
+    def _gen_testcase(
+        self, parent_element: etree.Element, result: dict, records: dict
+    ) -> Optional[etree.Element]:
+        """Create record for given transformed testcase result."""
         if not result:
-            return
+            return None
 
         if result.get("ignored"):
             LOGGER.debug("Skipping ignored testcase")
-            return
+            return None
 
         verdict = self._get_verdict(result)
         if not verdict:
             LOGGER.warning("Skipping testcase, verdict is missing or invalid")
-            return
+            return None
 
         testcase_id = result.get("id")
         testcase_title = result.get("title")
@@ -282,7 +412,7 @@ class XunitExport:
                 "Skipping testcase `%s`, data missing for selected lookup method",
                 testcase_id or testcase_title,
             )
-            return
+            return None
 
         testcase = self._testcase_element(
             parent_element, result, records, testcase_id, testcase_title
@@ -291,16 +421,16 @@ class XunitExport:
         self._fill_verdict(verdict, result, testcase, records)
         self._fill_out_err(result, testcase)
         self._fill_properties(verdict, result, testcase, testcase_id, testcase_title)
+        return testcase
 
-    def _fill_tests_results(self, testsuite_element: etree.Element) -> None:
-        """Create records for all testcases results."""
-        if not self.tests_records.results:
-            raise NothingToDoException("Nothing to export")
-
-        records = {"passed": 0, "skipped": 0, "failures": 0, "waiting": 0, "time": 0.0}
-        for testcase_result in self.tests_records.results:
-            self._gen_testcase(testsuite_element, testcase_result, records)
+    @staticmethod
+    def _new_records() -> dict:
+        """Return initial testcases records."""
+        return {"passed": 0, "skipped": 0, "failures": 0, "waiting": 0, "time": 0.0}
 
+    @staticmethod
+    def _fill_testsuite_counters(testsuite_element: etree.Element, records: dict) -> None:
+        """Set testsuite counters based on testcases records."""
         tests_num = (
             records["passed"] + records["skipped"] + records["failures"] + records["waiting"]
         )
@@ -314,18 +444,238 @@ class XunitExport:
         testsuite_element.set("time", "{:.4f}".format(records["time"]))
         testsuite_element.set("tests", str(tests_num))
 
+    def _fill_tests_results(self, testsuite_element: etree.Element) -> None:
+        """Create records for all testcases results."""
+        if not self.tests_records.results:
+            raise NothingToDoException("Nothing to export")
+
+        records = self._new_records()
+        for result, testcase_result in self._transformed_results():
+            if self._gen_testcase(testsuite_element, testcase_result, records) is not None:
+                self._report_exported(result)
+
+        self._fill_testsuite_counters(testsuite_element, records)
+
+    def _spool_tests_results(self, spool: BinaryIO, pretty_print: bool = True) -> dict:
+        """Write all testcases results into the spool file, one testcase at a time."""
+        if not self.tests_records.results:
+            raise NothingToDoException("Nothing to export")
+
+        records = self._new_records()
+        # testcases are created one by one in this element and removed once serialized
+        scratch_element = etree.Element("testsuite")
+        for result, testcase_result in self._transformed_results():
+            testcase = self._gen_testcase(scratch_element, testcase_result, records)
+            if testcase is None:
+                continue
+            self._report_exported(result)
+            if pretty_print:
+                # indent the same way as pretty-printed testcase nested in testsuite
+                etree.indent(testcase, space="  ", level=2)
+                spool.write(b"    ")
+            spool.write(etree.tostring(testcase, encoding="utf-8", with_tail=False))
+            if pretty_print:
+                spool.write(b"\n")
+            scratch_element.remove(testcase)
+
+        return records
+
+    @staticmethod
+    def _split_document(
+        top: etree.Element, testsuite: etree.Element, pretty_print: bool = True
+    ) -> Tuple[bytes, bytes]:
+        """Return serialized document head and tail surrounding the testcases."""
+        marker = etree.Comment("dump2polarion-testcases")
+        testsuite.append(marker)
+        xml_bytes = etree.tostring(
+            top, encoding="utf-8", xml_declaration=True, pretty_print=pretty_print
+        )
+        testsuite.remove(marker)
+        marker_bytes = b"<!--dump2polarion-testcases-->"
+        if pretty_print:
+            marker_bytes = b"    " + marker_bytes + b"\n"
+        head, tail = xml_bytes.split(marker_bytes)
+        return head, tail
+
+    def export_xml_root(self) -> etree.Element:
+        """Return root element of the XUnit XML."""
+        with profiling.stage("export") as stats:
+            top = self._top_element()
+            properties = self._properties_element(top)
+            testsuite = self._testsuite_element(top)
+            self._fill_tests_results(testsuite)
+            self._fill_lookup_prop(properties)
+            stats.records = int(testsuite.get("tests"))
+        return top
+
     def export(self) -> str:
         """Return XUnit XML."""
+        xml_root = self.export_xml_root()
+        with profiling.stage("serialize"):
+            return utils.prettify_xml(xml_root)
+
+    def _finalize_shard(
+        self, top: etree.Element, testsuite: etree.Element, records: dict
+    ) -> etree.Element:
+        """Fill testsuite counters and lookup method of the shard."""
+        self._fill_testsuite_counters(testsuite, records)
+        self._fill_lookup_prop(top.find("properties"))
+        return top
+
+    def export_shards_xml_roots(
+        self, max_records: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> List[etree.Element]:
+        """Return root elements of XUnit XML split into several documents.
+
+        Every document contains at most `max_records` testcases and the size of its
+        testcases is at most `max_bytes` (estimated from their serialized size). A testcase
+        bigger than `max_bytes` gets its own document. All the documents share the same
+        testrun id, lookup method and properties.
+        """
+        with profiling.stage("export") as stats:
+            shards = self._export_shards(max_records, max_bytes)
+            stats.records = sum(int(shard.find("testsuite").get("tests")) for shard in shards)
+        return shards
+
+    def _export_shards(
+        self, max_records: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> List[etree.Element]:
+        if not self.tests_records.results:
+            raise NothingToDoException("Nothing to export")
+
+        shards = []
+        scratch_element = etree.Element("testsuite")
+        top = self._top_element()
+        self._properties_element(top)
+        testsuite = self._testsuite_element(top)
+        records = self._new_records()
+        shard_records = shard_bytes = 0
+        for result, testcase_result in self._transformed_results():
+            testcase_records = self._new_records()
+            testcase = self._gen_testcase(scratch_element, testcase_result, testcase_records)
+            if testcase is None:
+                continue
+            self._report_exported(result)
+            testcase_bytes = len(etree.tostring(testcase, encoding="utf-8")) if max_bytes else 0
+
+            if shard_records and (
+                (max_records and shard_records >= max_records)
+                or (max_bytes and shard_bytes + testcase_bytes > max_bytes)
+            ):
+                shards.append(self._finalize_shard(top, testsuite, records))
+                top = self._top_element()
+                self._properties_element(top)
+                testsuite = self._testsuite_element(top)
+                records = self._new_records()
+                shard_records = shard_bytes = 0
+
+            # moves the testcase from the scratch element
+            testsuite.append(testcase)
+            for key, value in testcase_records.items():
+                records[key] += value
+            shard_records += 1
+            shard_bytes += testcase_bytes
+
+        if shard_records:
+            shards.append(self._finalize_shard(top, testsuite, records))
+        if not shards:
+            raise NothingToDoException("Nothing to export")
+
+        LOGGER.debug("Testrun %s exported into %d shards", self.testrun_id, len(shards))
+        return shards
+
+    def export_shards(
+        self, max_records: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> List[str]:
+        """Return XUnit XML split into several documents.
+
+        See `export_shards_xml_roots` for description of the arguments.
+        """
+        return [
+            utils.prettify_xml(xml_root)
+            for xml_root in self.export_shards_xml_roots(max_records, max_bytes)
+        ]
+
+    def export_stream(self, output: BinaryIO, pretty_print: bool = True) -> None:
+        """Write XUnit XML into binary file object.
+
+        Testcases are serialized as they are generated, so the memory usage doesn't grow
+        with number of results. The testsuite counters are known only after all results
+        are processed, so the testcases are spooled to a temporary file and the document
+        is assembled once the counters are filled in.
+        """
         top = self._top_element()
         properties = self._properties_element(top)
         testsuite = self._testsuite_element(top)
-        self._fill_tests_results(testsuite)
-        self._fill_lookup_prop(properties)
-        return utils.prettify_xml(top)
+        with tempfile.TemporaryFile() as spool, profiling.stage("export") as stats:
+            records = self._spool_tests_results(spool, pretty_print=pretty_print)
+            self._fill_testsuite_counters(testsuite, records)
+            self._fill_lookup_prop(properties)
+            head, tail = self._split_document(top, testsuite, pretty_print=pretty_print)
+
+            output.write(head)
+            spool.seek(0)
+            shutil.copyfileobj(spool, output)
+            output.write(tail)
+            stats.records = int(testsuite.get("tests"))
+
+    def _gen_filename(self, shard: Optional[int] = None) -> str:
+        shard_str = "-{:03d}".format(shard) if shard is not None else ""
+        return "testrun_{}-{:%Y%m%d%H%M%S}{}.xml".format(
+            self.testrun_id, datetime.datetime.now(), shard_str
+        )
+
+    def write_xml_stream(self, output_file: Optional[str] = None, pretty_print: bool = True) -> str:
+        """Stream the XUnit XML into a file and return the file name.
+
+        The file is compressed with gzip when its name ends with ".gz".
+        """
+        return utils.write_xml_stream(
+            lambda xml_file: self.export_stream(xml_file, pretty_print=pretty_print),
+            output_loc=output_file,
+            filename=self._gen_filename(),
+        )
 
     def write_xml(self, xml_str: str, output_file: Optional[str] = None) -> None:
-        """Output the XML content into a file."""
-        gen_filename = "testrun_{}-{:%Y%m%d%H%M%S}.xml".format(
-            self.testrun_id, datetime.datetime.now()
+        """Output the XML content produced by `export` into a file."""
+        utils.write_xml(
+            xml_str, output_loc=output_file, filename=self._gen_filename(), sanitize=False
+        )
+
+    def write_xml_root(
+        self, xml_root: etree.Element, output_file: Optional[str] = None, pretty_print: bool = True
+    ) -> None:
+        """Output the XML content produced by `export_xml_root` into a file."""
+        utils.write_xml_root(
+            xml_root,
+            output_loc=output_file,
+            filename=self._gen_filename(),
+            pretty_print=pretty_print,
         )
-        utils.write_xml(xml_str, output_loc=output_file, filename=gen_filename)
+
+    def write_xml_shards(
+        self, xml_shards: list, output_file: Optional[str] = None, pretty_print: bool = True
+    ) -> None:
+        """Output the XML shards (strings or root elements) into numbered files."""
+        for index, xml_shard in enumerate(xml_shards, 1):
+            shard_file = output_file
+            if output_file and not os.path.isdir(os.path.expanduser(output_file)):
+                root, ext = os.path.splitext(output_file)
+                if ext.lower() == ".gz":
+                    root, inner_ext = os.path.splitext(root)
+                    ext = inner_ext + ext
+                shard_file = "{}-{:03d}{}".format(root, index, ext)
+            if etree.iselement(xml_shard):
+                utils.write_xml_root(
+                    xml_shard,
+                    output_loc=shard_file,
+                    filename=self._gen_filename(index),
+                    pretty_print=pretty_print,
+                )
+            else:
+                utils.write_xml(
+                    xml_shard,
+                    output_loc=shard_file,
+                    filename=self._gen_filename(index),
+                    sanitize=False,
+                )
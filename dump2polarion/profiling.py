@@ -0,0 +1,194 @@
+"""Per-stage timing and memory instrumentation.
+
+The stages of the dumper pipeline (import, export, serialization, submit, verification)
+are measured only when a report is being collected or when a hook is registered,
+otherwise the instrumentation has negligible overhead.
+
+Example:
+    >>> with profile() as report:
+    ...     with stage("import") as stats:
+    ...         stats.records = 10
+    >>> [(stage["name"], stage["records"]) for stage in report.to_dict()["stages"]]
+    [('import', 10)]
+"""
+
+import contextlib
+import json
+import logging
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # not available on Windows
+    resource = None
+
+# pylint: disable=invalid-name
+logger = logging.getLogger(__name__)
+
+_HOOKS = []
+_REPORTS = []
+_STACK = []
+
+
+class StageStats:
+    """Measurements of single stage."""
+
+    __slots__ = (
+        "name",
+        "parent",
+        "records",
+        "wall_time",
+        "cpu_time",
+        "max_rss",
+        "tracemalloc_peak",
+        "_start_wall",
+        "_start_cpu",
+        "_child_peak",
+    )
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.records = None
+        self.wall_time = None
+        self.cpu_time = None
+        self.max_rss = None
+        self.tracemalloc_peak = None
+        self._start_wall = None
+        self._start_cpu = None
+        self._child_peak = 0
+
+    def _record_child_peak(self, peak):
+        self._child_peak = max(self._child_peak, peak)
+
+    def start(self, parent=None):
+        """Start the measurements."""
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, "reset_peak"):
+            # the peak is reset for each stage, keep the peak reached so far by the parent
+            if parent is not None:
+                parent._record_child_peak(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def finish(self, parent=None):
+        """Finish the measurements."""
+        self.cpu_time = time.process_time() - self._start_cpu
+        self.wall_time = time.perf_counter() - self._start_wall
+        self.max_rss = _get_max_rss()
+        if tracemalloc.is_tracing():
+            self.tracemalloc_peak = max(self._child_peak, tracemalloc.get_traced_memory()[1])
+            if parent is not None:
+                parent._record_child_peak(self.tracemalloc_peak)
+
+    def to_dict(self):
+        """Return dict representation of the measurements."""
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "records": self.records,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "max_rss": self.max_rss,
+            "tracemalloc_peak": self.tracemalloc_peak,
+        }
+
+    def __repr__(self):
+        return "<StageStats {}>".format(self.to_dict())
+
+
+class ProfileReport:
+    """Collection of stages measurements."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    def to_dict(self):
+        """Return dict representation of the report."""
+        return {
+            "trace_memory": self.trace_memory,
+            "stages": [stats.to_dict() for stats in self.stages],
+        }
+
+    def write_json(self, output_file):
+        """Write the report into a JSON file."""
+        with open(output_file, "w", encoding="utf-8") as out_json:
+            json.dump(self.to_dict(), out_json, indent=2)
+        logger.info("Profile report written to '%s'", output_file)
+
+
+class _NullStats:
+    """Placeholder for stage stats when nothing is measured."""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STATS = _NullStats()
+
+
+def add_hook(func):
+    """Register function that is called with `StageStats` when a stage finishes."""
+    _HOOKS.append(func)
+
+
+def remove_hook(func):
+    """Unregister the hook function."""
+    _HOOKS.remove(func)
+
+
+def _get_max_rss():
+    """Return peak resident set size of the process in kilobytes."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Measure the stage of the pipeline.
+
+    The yielded `StageStats` object can be used for recording number of processed records.
+    """
+    if not (_REPORTS or _HOOKS):
+        yield _NULL_STATS
+        return
+
+    parent = _STACK[-1] if _STACK else None
+    stats = StageStats(name, parent=parent.name if parent else None)
+    stats.start(parent)
+    _STACK.append(stats)
+    try:
+        yield stats
+    finally:
+        _STACK.pop()
+        stats.finish(parent)
+        for report in _REPORTS:
+            report.stages.append(stats)
+        for hook in _HOOKS:
+            hook(stats)
+
+
+@contextlib.contextmanager
+def profile(trace_memory=False):
+    """Collect measurements of all stages into `ProfileReport`.
+
+    When `trace_memory` is set, memory allocations are traced with `tracemalloc`.
+    This slows down the processing considerably.
+    """
+    report = ProfileReport(trace_memory=trace_memory)
+    start_tracing = trace_memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    _REPORTS.append(report)
+    try:
+        yield report
+    finally:
+        _REPORTS.remove(report)
+        if start_tracing:
+            tracemalloc.stop()
@@ -1,137 +1,164 @@
 """Helper functions for handling data in CSV format."""
 
 import csv
-import os
+import io
+import itertools
 import re
-from collections import OrderedDict
 
-from dump2polarion import csv_unicode
+from dump2polarion import csv_unicode, utils
 from dump2polarion.exceptions import Dump2PolarionException
 from dump2polarion.exporters import xunit_exporter
+from dump2polarion.results.records import RowRecord, get_fields_index
 
+_TESTRUN_RE = re.compile(r'TEST_RECORDS:\("[^/]+/([^"]+)"')
 
-def _get_csv_fieldnames(csv_reader):
-    """Find fieldnames in Polarion exported csv file."""
-    fieldnames = []
-    for row in csv_reader:
-        for col in row:
-            field = (
-                col.strip()
-                .replace('"', "")
-                .replace(" ", "")
-                .replace("(", "")
-                .replace(")", "")
-                .lower()
-            )
-            fieldnames.append(field)
-        if "id" in fieldnames:
-            break
-        # this is not a row with fieldnames
-        del fieldnames[:]
-    if not fieldnames:
-        return None
-    # remove trailing unannotated fields
-    while True:
-        field = fieldnames.pop()
-        if field:
-            fieldnames.append(field)
-            break
-    # name unannotated fields
+
+def _normalize_fieldname(col):
+    return col.strip().replace('"', "").replace(" ", "").replace("(", "").replace(")", "").lower()
+
+
+def _search_testrun(row):
+    """Search for the testrun id in the row, stop at the "id" column."""
+    for col in row:
+        if not col:
+            continue
+        if col.strip().replace('"', "").replace(" ", "").lower() == "id":
+            # tests results start here
+            return None
+        search = _TESTRUN_RE.search(col)
+        if search:
+            return search.group(1)
+    return None
+
+
+def _finalize_fieldnames(fieldnames):
+    """Remove trailing unannotated fields and name the remaining unannotated fields."""
+    while not fieldnames[-1]:
+        fieldnames.pop()
     suffix = 1
     for index, field in enumerate(fieldnames):
         if not field:
             fieldnames[index] = "field{}".format(suffix)
             suffix += 1
-
     return fieldnames
 
 
-def _get_testrun_from_csv(file_obj, csv_reader):
-    """Try to find the testrun id in Polarion exported csv file."""
-    file_obj.seek(0)
-    search_str = r'TEST_RECORDS:\("[^/]+/([^"]+)"'
+def _get_csv_header(csv_reader):
+    """Find fieldnames and testrun id in Polarion exported csv file.
+
+    The rows are read only until the row with fieldnames is found. The testrun id
+    is searched for in the rows preceding the fieldnames. The reader is left at
+    position after fieldnames, before the results data.
+    """
     testrun_id = None
-    too_far = False
     for row in csv_reader:
-        for col in row:
-            if not col:
-                continue
-            field = col.strip().replace('"', "").replace(" ", "").lower()
-            if field == "id":
-                # we are too far, tests results start here
-                too_far = True
-                break
-            search = re.search(search_str, col)
-            try:
-                testrun_id = search.group(1)
-            except AttributeError:
-                continue
-            else:
-                break
-        if testrun_id or too_far:
-            break
-
-    return testrun_id
+        if testrun_id is None:
+            testrun_id = _search_testrun(row)
+        fieldnames = [_normalize_fieldname(col) for col in row]
+        if "id" in fieldnames:
+            return _finalize_fieldnames(fieldnames), testrun_id
+    return None, testrun_id
 
 
-def _get_results(csv_reader, fieldnames):
-    """Map data to fieldnames.
+def _iter_results(csv_reader, fieldnames):
+    """Map data to fieldnames, yield one record at a time.
 
     The reader needs to be at position after fieldnames, before the results data.
     """
-    fieldnames_count = len(fieldnames)
-    results = []
+    fields = get_fields_index(fieldnames)
+    exported_index = fields.get("exported")
     for row in csv_reader:
-        for col in row:
-            if col:
-                break
-        else:
+        if not any(row):
             # empty row, skip it
             continue
-        record = OrderedDict(list(zip(fieldnames, row)))
         # skip rows that were already exported
-        if record.get("exported") == "yes":
+        if (
+            exported_index is not None
+            and exported_index < len(row)
+            and row[exported_index] == "yes"
+        ):
             continue
-        row_len = len(row)
-        if fieldnames_count > row_len:
-            for key in fieldnames[row_len:]:
-                record[key] = None
-        results.append(record)
+        yield RowRecord(fields, row)
 
-    return results
 
+def _get_results(csv_reader, fieldnames):
+    """Map data to fieldnames.
 
-def _get_csv_reader(input_file):
-    """Return csv reader."""
-    dialect = csv.Sniffer().sniff(input_file.read(2048))
-    input_file.seek(0)
-    return csv_unicode.get_csv_reader(input_file, dialect)
+    The reader needs to be at position after fieldnames, before the results data.
+    """
+    return list(_iter_results(csv_reader, fieldnames))
 
 
-# pylint: disable=unused-argument
-def get_imported_data(csv_file, **kwargs):
-    """Read the content of the Polarion exported csv file and return imported data."""
-    with open(os.path.expanduser(csv_file), encoding="utf-8") as input_file:
-        reader = _get_csv_reader(input_file)
+def _get_csv_reader(input_file):
+    """Return csv reader.
 
-        fieldnames = _get_csv_fieldnames(reader)
+    The dialect is sniffed from the beginning of the file. The sample is not read again
+    from the file, so non-seekable inputs (e.g. pipes) are supported.
+    """
+    sample = input_file.read(2048)
+    dialect = csv.Sniffer().sniff(sample)
+    # complete the last line of the sample
+    sample += input_file.readline()
+    lines = itertools.chain(io.StringIO(sample), input_file)
+    return csv_unicode.get_csv_reader(lines, dialect)
+
+
+def _open_csv(csv_file):
+    """Open the csv file, return it together with csv reader, fieldnames and testrun id."""
+    if hasattr(csv_file, "read"):
+        input_file = csv_file
+    else:
+        input_file = utils.open_input(csv_file)
+    try:
+        reader = _get_csv_reader(input_file)
+        fieldnames, testrun = _get_csv_header(reader)
         if not fieldnames:
             raise Dump2PolarionException(
                 "Cannot find field names in CSV file '{}'".format(csv_file)
             )
+    except Exception:
+        if input_file is not csv_file:
+            input_file.close()
+        raise
+    return input_file, reader, fieldnames, testrun
+
 
-        results = _get_results(reader, fieldnames)
-        if not results:
-            raise Dump2PolarionException("No results read from CSV file '{}'".format(csv_file))
+def _iter_csv_records(csv_file, input_file, reader, fieldnames):
+    """Yield records from the csv file one at a time, close the file when done."""
+    try:
+        yield from _iter_results(reader, fieldnames)
+    finally:
+        if input_file is not csv_file:
+            input_file.close()
 
-        testrun = _get_testrun_from_csv(input_file, reader)
+
+def _peek(iterator):
+    """Return the first item and iterator over all the items, or `None` when there's no item."""
+    for first in iterator:
+        return first, itertools.chain((first,), iterator)
+    return None
+
+
+# pylint: disable=unused-argument
+def get_imported_data(csv_file, lazy=False, **kwargs):
+    """Read the content of the Polarion exported csv file and return imported data.
+
+    The `csv_file` is path to the file or file object. The file is read in one pass.
+    When `lazy` is set, the results are read from the file as they are consumed.
+    """
+    input_file, reader, fieldnames, testrun = _open_csv(csv_file)
+    results = _iter_csv_records(csv_file, input_file, reader, fieldnames)
+    peeked = _peek(results)
+    if not peeked:
+        raise Dump2PolarionException("No results read from CSV file '{}'".format(csv_file))
+    results = peeked[1] if lazy else list(peeked[1])
 
     return xunit_exporter.ImportedData(results=results, testrun=testrun)
 
 
-def _check_required_columns(csv_file, results):
+def _check_required_columns(csv_file, record):
     required_columns = {"verdict": "Verdict"}
-    missing_columns = [required_columns[k] for k in required_columns if k not in results[0]]
+    missing_columns = [required_columns[k] for k in required_columns if k not in record]
     if missing_columns:
         raise Dump2PolarionException(
             "The input file '{}' is missing following columns: {}".format(
@@ -143,5 +170,10 @@ def _check_required_columns(csv_file, results):
 def import_csv(csv_file, **kwargs):
     """Import data and checks that all required columns are there."""
     records = get_imported_data(csv_file, **kwargs)
-    _check_required_columns(csv_file, records.results)
-    return records
+    if isinstance(records.results, list):
+        _check_required_columns(csv_file, records.results[0])
+        return records
+
+    first_record, results = _peek(records.results)
+    _check_required_columns(csv_file, first_record)
+    return records._replace(results=results)
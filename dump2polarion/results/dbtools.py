@@ -1,18 +1,47 @@
 """Helper functions for handling data in sqlite3."""
 
+import itertools
 import logging
 import os
+import socket
 import sqlite3
-from collections import OrderedDict
+import time
 
 from dump2polarion.exceptions import Dump2PolarionException
 from dump2polarion.exporters import xunit_exporter
+from dump2polarion.results.records import (  # noqa: F401, ExportedRows is re-exported
+    ExportedRows,
+    RowRecord,
+    get_fields_index,
+)
+from dump2polarion.results.registry import SQLITE_EXT  # noqa: F401, re-exported
 
 # pylint: disable=invalid-name
 logger = logging.getLogger(__name__)
 
 
-SQLITE_EXT = (".sqlite", ".sqlite3", ".db", ".db3")
+# number of rows fetched from database at once
+_FETCH_SIZE = 1000
+# number of rows marked as exported in single transaction
+_MARK_CHUNK_SIZE = 5000
+# how long to wait (in seconds) for lock held by another process writing to the database
+_BUSY_TIMEOUT = 30
+# how long to wait (in seconds) before trying to switch the journal mode again
+_WAL_RETRY_INTERVAL = 0.05
+
+
+class SqliteRecord(RowRecord):
+    """Record of database row, remembers the database file and rowid of the row."""
+
+    __slots__ = ("db_file", "rowid")
+
+    def __init__(self, fields, values, db_file=None, rowid=None):
+        super().__init__(fields, values)
+        self.db_file = db_file
+        self.rowid = rowid
+
+    def __reduce__(self):
+        return (self.__class__, (self._fields, self._values, self.db_file, self.rowid))
 
 
 def _get_testrun_from_sqlite(conn):
@@ -25,54 +54,249 @@ def _get_testrun_from_sqlite(conn):
         return None
 
 
-def _open_sqlite(db_file):
+def _open_sqlite(db_file, check_same_thread=True):
     """Open database connection."""
     db_file = os.path.expanduser(db_file)
     try:
         with open(db_file):
             # test that the file can be accessed
             pass
-        return sqlite3.connect(db_file, detect_types=sqlite3.PARSE_DECLTYPES)
+        return sqlite3.connect(
+            db_file,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=check_same_thread,
+            timeout=_BUSY_TIMEOUT,
+        )
     except (OSError, sqlite3.Error) as err:
         raise Dump2PolarionException("{}".format(err))
 
 
-# pylint: disable=unused-argument
-def import_sqlite(db_file, older_than=None, **kwargs):
-    """Read the content of the database file and return imported data."""
-    conn = _open_sqlite(db_file)
+def create_indexes(conn):
+    """Create indexes that speed up selecting of rows that were not exported yet."""
+    try:
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS testcases_not_exported ON testcases (sqltime) "
+            "WHERE exported != 'yes'"
+        )
+        conn.commit()
+    except sqlite3.Error as err:
+        logger.debug("Failed to create index: %s", err)
+
+
+def _switch_to_wal(conn):
+    mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    if mode.lower() == "wal":
+        # already switched, possibly by another process
+        return mode
+    return conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+
+
+def enable_wal(conn, timeout=_BUSY_TIMEOUT):
+    """Switch the database to write-ahead logging.
+
+    Readers then don't block writers (e.g. running tests) and vice versa.
+    The journal mode is persistent, it's stored in the database file.
+
+    Changing the journal mode fails immediately when another connection holds a lock,
+    the busy timeout doesn't apply, so it is retried for up to `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            mode = _switch_to_wal(conn)
+            break
+        except sqlite3.OperationalError as err:
+            if "locked" not in str(err) or time.monotonic() > deadline:
+                raise
+            time.sleep(_WAL_RETRY_INTERVAL)
+    if mode.lower() != "wal":
+        logger.warning("Failed to switch database to WAL mode, using '%s' journal mode", mode)
+
+
+def get_worker_id():
+    """Return identification of this process used for claiming rows."""
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+def _has_claimed_by_column(conn):
+    return any(row[1] == "claimed_by" for row in conn.execute("PRAGMA table_info(testcases)"))
+
+
+def _add_claimed_by_column(conn):
+    """Add the column with identification of process that claimed the row."""
+    if _has_claimed_by_column(conn):
+        return
+    try:
+        conn.execute("ALTER TABLE testcases ADD COLUMN claimed_by TEXT")
+        conn.commit()
+    except sqlite3.OperationalError as err:
+        # the column was added concurrently by another process
+        if "duplicate column" not in str(err):
+            raise
+
+
+def _claim_rows(conn, claimed_by, claim_batch, older_than=None):
+    """Claim at most `claim_batch` rows that were not exported or claimed yet.
+
+    Return number of claimed rows.
+    """
+    enable_wal(conn)
+    _add_claimed_by_column(conn)
+    select = "SELECT rowid FROM testcases WHERE exported != 'yes' AND claimed_by IS NULL"
+    params = [claimed_by]
+    if older_than:
+        select = " ".join((select, "AND sqltime < ?"))
+        params.append(older_than)
+    params.append(claim_batch)
+    # the write lock is acquired at the beginning of the transaction,
+    # so concurrent claims are serialized and every row is claimed only once
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.execute(
+            "UPDATE testcases SET claimed_by = ? WHERE rowid IN ({} LIMIT ?)".format(select),
+            params,
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    logger.debug("Claimed %d rows as '%s'", cur.rowcount, claimed_by)
+    return cur.rowcount
+
+
+def _select_not_exported(conn, older_than=None, claimed_by=None):
+    """Return cursor over rows that were not exported yet.
+
+    When `claimed_by` is specified, only the rows claimed by the process are selected.
+    """
     cur = conn.cursor()
-    # get rows that were not exported yet
-    select = "SELECT * FROM testcases WHERE exported != 'yes'"
+    select = "SELECT rowid, * FROM testcases WHERE exported != 'yes'"
+    params = []
+    if claimed_by:
+        select = " ".join((select, "AND claimed_by = ?"))
+        params.append(claimed_by)
     if older_than:
-        cur.execute(" ".join((select, "AND sqltime < ?")), (older_than,))
-    else:
-        cur.execute(select)
-    columns = [description[0] for description in cur.description]
-    rows = cur.fetchall()
+        select = " ".join((select, "AND sqltime < ?"))
+        params.append(older_than)
+    cur.execute(select, params)
+    return cur
 
-    # map data to columns
-    results = []
-    for row in rows:
-        record = OrderedDict(list(zip(columns, row)))
-        results.append(record)
 
-    testrun = _get_testrun_from_sqlite(conn)
+def _iter_records(conn, cur, db_file=None):
+    """Map rows to columns, yield one record at a time and close the connection when done.
+
+    The first selected column is the rowid. The rows are fetched in batches.
+    """
+    try:
+        fields = get_fields_index(description[0] for description in cur.description[1:])
+        while True:
+            rows = cur.fetchmany(_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield SqliteRecord(fields, row[1:], db_file=db_file, rowid=row[0])
+    finally:
+        conn.close()
+
+
+# pylint: disable=unused-argument,too-many-arguments
+def import_sqlite(
+    db_file, older_than=None, lazy=False, claim_batch=None, claimed_by=None, **kwargs
+):
+    """Read the content of the database file and return imported data.
 
-    conn.close()
+    When `lazy` is set, the results are fetched from the database as they are consumed.
+    The records remember rowids of the rows, see `ExportedRows`.
+
+    When `claim_batch` is set, at most `claim_batch` rows that are not claimed by any other
+    process are claimed for `claimed_by` (`get_worker_id()` by default) and only these rows
+    are imported. Several processes can then export the same database concurrently.
+    The claim is released by `release_claimed_sqlite`.
+    """
+    # lazily read records can be consumed in another thread (e.g. by multiprocessing pool),
+    # the connection is never used by more than one thread at a time
+    conn = _open_sqlite(db_file, check_same_thread=not lazy)
+    if claim_batch:
+        claimed_by = claimed_by or get_worker_id()
+        try:
+            _claim_rows(conn, claimed_by, claim_batch, older_than)
+        except sqlite3.Error as err:
+            conn.close()
+            raise Dump2PolarionException(
+                "Failed to claim rows in database '{}': {}".format(db_file, err)
+            )
+    else:
+        claimed_by = None
+    testrun = _get_testrun_from_sqlite(conn)
+    cur = _select_not_exported(conn, older_than, claimed_by)
+    results = _iter_records(conn, cur, db_file=db_file)
+    if not lazy:
+        results = list(results)
 
     return xunit_exporter.ImportedData(results=results, testrun=testrun)
 
 
-def mark_exported_sqlite(db_file, older_than=None):
-    """Mark rows with verdict as exported."""
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def mark_exported_sqlite(db_file, older_than=None, rowids=None):
+    """Mark rows as exported.
+
+    When `rowids` are specified, exactly these rows are marked, in chunked transactions,
+    and `older_than` is ignored. Otherwise all the rows with verdict are marked.
+    """
     logger.debug("Marking rows in database as exported")
     conn = _open_sqlite(db_file)
-    cur = conn.cursor()
-    update = "UPDATE testcases SET exported = 'yes' WHERE verdict IS NOT null AND verdict != ''"
-    if older_than:
-        cur.execute(" ".join((update, "AND sqltime < ?")), (older_than,))
-    else:
-        cur.execute(update)
-    conn.commit()
-    conn.close()
+    try:
+        if rowids is not None:
+            for chunk in _chunks(rowids, _MARK_CHUNK_SIZE):
+                with conn:
+                    conn.executemany(
+                        "UPDATE testcases SET exported = 'yes' WHERE rowid = ?",
+                        ((rowid,) for rowid in chunk),
+                    )
+        else:
+            cur = conn.cursor()
+            update = (
+                "UPDATE testcases SET exported = 'yes' WHERE verdict IS NOT null AND verdict != ''"
+            )
+            if older_than:
+                cur.execute(" ".join((update, "AND sqltime < ?")), (older_than,))
+            else:
+                cur.execute(update)
+            conn.commit()
+        # the database is being used for incremental exports, speed up the next one
+        create_indexes(conn)
+    finally:
+        conn.close()
+
+
+def release_claimed_sqlite(db_file, claimed_by=None):
+    """Release claim of rows that were not exported, so they can be claimed again.
+
+    When `claimed_by` is not specified, claims of all processes are released
+    (e.g. claims left behind by processes that were killed).
+    """
+    logger.debug("Releasing claimed rows in database")
+    conn = _open_sqlite(db_file)
+    try:
+        if not _has_claimed_by_column(conn):
+            return
+        update = "UPDATE testcases SET claimed_by = NULL WHERE exported != 'yes'"
+        with conn:
+            if claimed_by:
+                conn.execute(" ".join((update, "AND claimed_by = ?")), (claimed_by,))
+            else:
+                conn.execute(" ".join((update, "AND claimed_by IS NOT NULL")))
+    except sqlite3.Error as err:
+        raise Dump2PolarionException(
+            "Failed to release claimed rows in database '{}': {}".format(db_file, err)
+        )
+    finally:
+        conn.close()
@@ -0,0 +1,175 @@
+"""On-disk cache of imported data.
+
+Parsing of big input files is expensive, when the same file is imported again (e.g. when
+retrying failed submission), the imported data are loaded from the cache instead.
+
+The cache entries are keyed by size, modification time and content hash of the input file
+and by the importer arguments. The imported data are stored as gzip compressed pickles.
+Old entries are evicted when the cache grows over the size limit or exceed the age limit.
+
+SQLite databases are never cached, the rows change as they are exported. Remote Ostriz
+data are cached and revalidated by `ostriztools` already.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import time
+
+from dump2polarion.exporters import xunit_exporter
+
+# pylint: disable=invalid-name
+logger = logging.getLogger(__name__)
+
+
+# bump when format of the imported data changes
+_CACHE_VERSION = 1
+_CACHE_EXT = ".pickle.gz"
+
+# the entries are evicted when total size of the cache exceeds this (in bytes)
+MAX_SIZE = 1024**3
+# or when they were not used for this long (in seconds)
+MAX_AGE = 7 * 24 * 60 * 60
+
+# arguments that don't change results of the cacheable importers
+_IGNORED_KWARGS = {"lazy", "older_than", "claim_batch", "claimed_by"}
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def get_cache_dir():
+    """Return default directory where imported data are cached."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "dump2polarion", "imports")
+
+
+def is_cacheable(input_file, spec):
+    """Check if data imported from the input can be cached.
+
+    The `spec` describes the importer selected for the input (see `registry`). The type
+    of input is recognized by content, so SQLite database can have any file extension.
+    """
+    if not isinstance(input_file, str) or "://" in input_file:
+        return False
+    return spec.name != "sqlite" and os.path.isfile(os.path.expanduser(input_file))
+
+
+def _hash_file(input_file):
+    digest = hashlib.sha256()
+    with open(input_file, "rb") as input_data:
+        for chunk in iter(lambda: input_data.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_key(importer, input_file, kwargs):
+    """Return cache key of data imported from the input file by the importer."""
+    input_file = os.path.expanduser(input_file)
+    stat = os.stat(input_file)
+    key_kwargs = sorted(
+        (name, repr(value)) for name, value in kwargs.items() if name not in _IGNORED_KWARGS
+    )
+    key = repr(
+        (
+            _CACHE_VERSION,
+            "{}.{}".format(importer.__module__, importer.__name__),
+            stat.st_size,
+            stat.st_mtime_ns,
+            _hash_file(input_file),
+            key_kwargs,
+        )
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _load_entry(entry_file):
+    """Return imported data stored in the cache entry, `None` when not found."""
+    try:
+        with gzip.open(entry_file, "rb") as entry:
+            imported_data = pickle.load(entry)
+    except FileNotFoundError:
+        return None
+    # pylint: disable=broad-except
+    except Exception as err:
+        logger.debug("Failed to load cached data from %s: %s", entry_file, err)
+        _remove(entry_file)
+        return None
+    # mark the entry as recently used
+    os.utime(entry_file)
+    return imported_data
+
+
+def _save_entry(entry_file, imported_data):
+    """Store imported data, the entry is replaced only when it is written completely."""
+    out_fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(entry_file), suffix=".tmp")
+    try:
+        with os.fdopen(out_fd, "wb") as out_file, gzip.GzipFile(
+            fileobj=out_file, mode="wb", compresslevel=1
+        ) as entry:
+            pickle.dump(imported_data, entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, entry_file)
+    except BaseException:
+        _remove(tmp_file)
+        raise
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict(cache_dir, max_size=MAX_SIZE, max_age=MAX_AGE):
+    """Remove cache entries that were not used recently.
+
+    The entries older than `max_age` are removed first and then the least recently used
+    ones until the cache fits into `max_size`.
+    """
+    entries = []
+    for fname in os.listdir(cache_dir):
+        if not fname.endswith(_CACHE_EXT):
+            continue
+        entry_file = os.path.join(cache_dir, fname)
+        try:
+            stat = os.stat(entry_file)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry_file))
+
+    oldest = time.time() - max_age
+    total_size = sum(size for __, size, __ in entries)
+    for mtime, size, entry_file in sorted(entries):
+        if mtime >= oldest and total_size <= max_size:
+            break
+        logger.debug("Evicting cached data %s", entry_file)
+        _remove(entry_file)
+        total_size -= size
+
+
+def import_cached(importer, input_file, cache_dir, **kwargs):
+    """Import the input file using the importer, or load the imported data from cache.
+
+    The imported results are always loaded into memory, `lazy` is ignored.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_file = os.path.join(cache_dir, _get_key(importer, input_file, kwargs) + _CACHE_EXT)
+    imported_data = _load_entry(entry_file)
+    if imported_data is not None:
+        logger.info("Using cached data imported from %s", input_file)
+        return imported_data
+
+    kwargs.pop("lazy", None)
+    imported_data = importer(input_file, **kwargs)
+    imported_data = xunit_exporter.ImportedData(
+        results=list(imported_data.results), testrun=imported_data.testrun
+    )
+    try:
+        _save_entry(entry_file, imported_data)
+        evict(cache_dir)
+    except (OSError, pickle.PicklingError) as err:
+        logger.warning("Failed to cache data imported from %s: %s", input_file, err)
+    return imported_data
@@ -1,41 +1,281 @@
-"""Import data using correct tools."""
+"""Import data using correct tools.
 
+The importer is selected by sniffing the beginning of the input data, see `registry`.
+"""
+
+import collections.abc
+import glob
+import io
+import logging
+import multiprocessing
 import os
+import sys
 
-from dump2polarion.results import dbtools
+from dump2polarion import profiling, utils
+from dump2polarion.results import importcache, registry
 from dump2polarion.exceptions import Dump2PolarionException
+from dump2polarion.exporters import xunit_exporter
 
+# pylint: disable=invalid-name
+logger = logging.getLogger(__name__)
+
+# extensions of files imported from a directory
+INPUT_EXT = (".xml", ".csv", ".json") + registry.SQLITE_EXT
+
+# input file name used for standard input
+STDIN = "-"
+
+
+def _get_input_ext(input_file):
+    """Return extension of the input file, extension of compressed file (e.g. '.gz') is skipped."""
+    __, ext = os.path.splitext(utils.strip_compressed_ext(input_file))
+    return ext.lower()
 
-def _get_importer(input_file):
-    """Select importer based on input file type."""
-    __, ext = os.path.splitext(input_file)
-    ext = ext.lower()
 
+def _read_head(input_file):
+    """Read the beginning of the (decompressed) file for sniffing, `None` when not readable."""
+    try:
+        with utils.open_input(input_file, binary=True) as input_data:
+            return input_data.read(registry.SNIFF_SIZE)
+    # pylint: disable=broad-except
+    except Exception as err:
+        logger.debug("Failed to read '%s': %s", input_file, err)
+        return None
+
+
+def _get_spec_by_name(input_file):
+    """Select importer by the file name when the data can't be sniffed."""
     if "ostriz" in input_file:
+        return registry.get_spec("ostriz")
+    return registry.get_spec_by_ext(_get_input_ext(input_file))
+
+
+def _is_compressed(input_file):
+    if utils.strip_compressed_ext(input_file) != input_file:
+        return True
+    return os.path.isfile(input_file) and utils.is_compressed(input_file)
+
+
+def _get_spec(input_file):
+    """Select importer based on input data type.
+
+    Remote locations are Ostriz data. Local files are recognized by their content,
+    when it can't be recognized, by the file name.
+    """
+    if "://" in input_file:
+        return registry.get_spec("ostriz")
+
+    spec = None
+    expanded = os.path.expanduser(input_file)
+    if os.path.isfile(expanded):
+        head = _read_head(expanded)
+        spec = registry.sniff(head) if head else None
+    spec = spec or _get_spec_by_name(input_file)
+    if spec is None:
+        raise Dump2PolarionException("Cannot recognize type of input data, add file extension.")
+
+    if not spec.stream and _is_compressed(expanded):
+        raise Dump2PolarionException("Compressed SQLite database is not supported.")
+    return spec
+
+
+def _is_ostriz(input_file):
+    return _get_spec(input_file).name == "ostriz"
+
+
+def is_sqlite(input_file):
+    """Check if the input file is SQLite database, the database is recognized by content."""
+    if input_file == STDIN:
+        return False
+    try:
+        return _get_spec(input_file).name == "sqlite"
+    except Dump2PolarionException:
+        return False
+
+
+def _get_importer(input_file):
+    """Select importer based on input data type, the importer module is imported lazily.
+
+    Compressed files (e.g. 'junit-report.xml.gz') are decompressed as they are imported.
+    """
+    return registry.load_parser(_get_spec(input_file))
+
+
+def _open_stdin():
+    """Return binary standard input, decompressed when it is compressed."""
+    stream = sys.stdin.buffer
+    decompressor = utils.get_magic_decompressor(stream.peek(6))
+    if decompressor:
+        stream = io.BufferedReader(decompressor.open(stream, "rb"))
+    return stream
+
+
+def _import_stdin(**kwargs):
+    """Import data from standard input, the data type is sniffed from the buffered data."""
+    stream = _open_stdin()
+    spec = registry.sniff(stream.peek(registry.SNIFF_SIZE)[: registry.SNIFF_SIZE])
+    if spec is None:
+        raise Dump2PolarionException("Cannot recognize type of input data on standard input.")
+    if not spec.stream:
+        raise Dump2PolarionException(
+            "The '{}' input data can't be read from standard input.".format(spec.name)
+        )
+    input_data = stream if spec.binary else io.TextIOWrapper(stream, encoding="utf-8")
+    return registry.load_parser(spec)(input_data, **kwargs)
+
+
+def _expand_input(input_file):
+    """Return list of files for directory, glob or single path."""
+    if "://" in input_file:
+        # remote location
+        return [input_file]
+    expanded = os.path.expanduser(input_file)
+    if os.path.isdir(expanded):
+        extensions = set(INPUT_EXT).union(registry.iter_extensions())
+        return sorted(
+            os.path.join(expanded, fname)
+            for fname in os.listdir(expanded)
+            if _get_input_ext(fname) in extensions and os.path.isfile(os.path.join(expanded, fname))
+        )
+    if glob.has_magic(expanded):
+        return sorted(glob.glob(expanded))
+    return [input_file]
+
+
+def expand_input_files(input_files):
+    """Return list of input files for path, directory, glob or list of these."""
+    if isinstance(input_files, str):
+        input_files = [input_files]
+    expanded = []
+    for input_file in input_files:
+        expanded.extend(_expand_input(input_file))
+    if not expanded:
+        raise Dump2PolarionException(
+            "No input files found in '{}'".format("', '".join(input_files))
+        )
+    return expanded
+
+
+def _get_import_inputs(input_files):
+    """Return inputs of import tasks, all the Ostriz sources are imported in single task."""
+    inputs = []
+    ostriz_sources = []
+    for input_file in input_files:
+        if not _is_ostriz(input_file):
+            inputs.append(input_file)
+            continue
+        if not ostriz_sources:
+            inputs.append(ostriz_sources)
+        ostriz_sources.append(input_file)
+    return inputs
+
+
+def _import_single(input_file, cache_dir=None, **kwargs):
+    """Import single file, the imported data are cached in `cache_dir` when it is set."""
+    if input_file == STDIN:
+        return _import_stdin(**kwargs)
+    spec = _get_spec(input_file)
+    importer = registry.load_parser(spec)
+    if cache_dir and importcache.is_cacheable(input_file, spec):
+        return importcache.import_cached(importer, input_file, cache_dir, **kwargs)
+    return importer(input_file, **kwargs)
+
+
+def _import_file(input_file_kwargs):
+    """Import single file or list of Ostriz sources, runs in a worker process."""
+    input_file, kwargs = input_file_kwargs
+    if isinstance(input_file, list):
         from dump2polarion.results import ostriztools
 
-        importer = ostriztools.import_ostriz
-    elif ext == ".xml":
-        # expect junit-report from pytest
-        from dump2polarion.results import junittools
+        kwargs = {name: value for name, value in kwargs.items() if name != "cache_dir"}
+        # the sources are loaded concurrently and results of one build are merged
+        return ostriztools.import_ostriz(input_file, **kwargs)
+    return _import_single(input_file, **kwargs)
+
 
-        importer = junittools.import_junit
-    elif ext == ".csv":
-        from dump2polarion.results import csvtools
+def _merge_testruns(input_files, imported, force=False):
+    """Return testrun id common for all the imported files."""
+    testruns = [data.testrun for data in imported if data.testrun]
+    if not testruns:
+        return None
 
-        importer = csvtools.import_csv
-    elif ext in dbtools.SQLITE_EXT:
-        importer = dbtools.import_sqlite
-    elif ext == ".json":
-        from dump2polarion.results import jsontools
+    found_testrun = testruns[0]
+    if any(testrun != found_testrun for testrun in testruns):
+        found = ", ".join(
+            "'{}' ({})".format(data.testrun, input_file)
+            for input_file, data in zip(input_files, imported)
+            if data.testrun
+        )
+        if not force:
+            raise Dump2PolarionException(
+                "The test run ids found in input files differ: {}. If you really want "
+                "to proceed, add '-f' and test run id '{}' will be used.".format(
+                    found, found_testrun
+                )
+            )
+        logger.warning("The test run ids found in input files differ: %s", found)
 
-        importer = jsontools.import_json
+    return found_testrun
+
+
+def _import_files(input_files, jobs=None, force=False, **kwargs):
+    """Import several files concurrently and merge the imported data."""
+    if STDIN in input_files:
+        raise Dump2PolarionException("Standard input can't be combined with other input files.")
+    # results are passed from worker processes, lazy reading is not possible
+    kwargs.pop("lazy", None)
+    input_files = _get_import_inputs(input_files)
+    jobs = jobs if jobs and jobs > 0 else multiprocessing.cpu_count()
+    jobs = min(jobs, len(input_files))
+    tasks = [(input_file, kwargs) for input_file in input_files]
+    if jobs > 1:
+        with multiprocessing.Pool(processes=jobs) as pool:
+            imported = pool.map(_import_file, tasks)
     else:
-        raise Dump2PolarionException("Cannot recognize type of input data, add file extension.")
+        imported = [_import_file(task) for task in tasks]
+
+    results = []
+    for data in imported:
+        results.extend(data.results)
+    testrun = _merge_testruns(input_files, imported, force=force)
+    return xunit_exporter.ImportedData(results=results, testrun=testrun)
+
+
+def _count_records(results, stats):
+    """Record number of lazily imported records once they are consumed."""
+    stats.records = 0
+    for record in results:
+        stats.records += 1
+        yield record
+
+
+def import_results(input_file, jobs=None, force=False, **kwargs):
+    """Import the input file.
 
-    return importer
+    The `input_file` can be also a directory, a glob or list of paths. The files are
+    then imported in `jobs` processes (number of CPUs by default) and the imported data
+    are merged. Differing test run ids are an error unless `force` is set. Several Ostriz
+    sources are loaded concurrently in single task and their results are merged.
+    The `input_file` '-' is standard input.
 
+    With the `lazy=True` keyword argument, the importers that support it return results
+    as iterator that reads the records from the input file as they are consumed.
 
-def import_results(input_file, **kwargs):
-    """Import the input file."""
-    return _get_importer(input_file)(input_file, **kwargs)
+    With the `cache_dir` keyword argument, the data imported from local files are cached
+    in the directory and loaded from there when the same file is imported again,
+    see `importcache`.
+    """
+    input_files = expand_input_files(input_file)
+    with profiling.stage("import") as stats:
+        if len(input_files) == 1:
+            imported_data = _import_single(input_files[0], **kwargs)
+        else:
+            imported_data = _import_files(input_files, jobs=jobs, force=force, **kwargs)
+        if isinstance(imported_data.results, collections.abc.Sized):
+            stats.records = len(imported_data.results)
+        elif isinstance(stats, profiling.StageStats):
+            # the results are read later, during export
+            imported_data = imported_data._replace(
+                results=_count_records(imported_data.results, stats)
+            )
+    return imported_data
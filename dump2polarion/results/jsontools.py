@@ -1,28 +1,163 @@
 """Helper functions for handling JSON data."""
 
 import json
+import re
 
+from dump2polarion import utils
 from dump2polarion.exceptions import Dump2PolarionException
 from dump2polarion.exporters import xunit_exporter
 
+# size of the chunks of JSON text read at once
+_CHUNK_SIZE = 64 * 1024
 
-def _load_json(json_filename):
-    with open(json_filename, encoding="utf-8") as input_json:
-        return json.load(input_json)
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+# characters that can continue a number
+_NUMBER_TAIL_RE = re.compile(r"[0-9.eE+-]*")
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
 
 
-def import_pytest_collect(json_filename):
-    """Read the content of the JSON file produced by pytest-polarion-collect file."""
+def _is_truncated(err, text):
+    """Check if decoding of the text failed only because the text ends too early."""
+    pos = getattr(err, "pos", len(text))
+    if pos >= len(text):
+        return True
+    msg = getattr(err, "msg", "")
+    # the error is reported at the beginning of the string or the escape sequence
+    if msg.startswith("Unterminated string"):
+        return True
+    tail = text[pos:]
+    if msg.startswith("Invalid \\uXXXX escape"):
+        return len(tail) < 6
+    if msg == "Expecting value":
+        return any(literal.startswith(tail) for literal in _LITERALS)
+    return False
+
+
+class _JSONReader:
+    """Decode JSON values from text file one at a time.
+
+    Only the text of the value being decoded is kept in memory.
+    """
+
+    def __init__(self, input_file, chunk_size=_CHUNK_SIZE):
+        self._input_file = input_file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self, size=None):
+        """Append next chunk of text to the unprocessed part of the buffer."""
+        if self._eof:
+            return False
+        chunk = self._input_file.read(size or self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        processed = self._pos
+        self._buffer = self._buffer[processed:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return next character without consuming it, '' at the end."""
+        while True:
+            self._pos = _WHITESPACE_RE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, chars):
+        """Consume next character, it must be one of `chars`."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError("Expecting one of '{}', got '{}'".format(chars, char or "end of file"))
+        self._pos += 1
+        return char
+
+    def decode(self):
+        """Decode next value.
+
+        The value is decoded again from its beginning after more text is read, the size
+        of the read doubles every time so big values are decoded in linear time.
+        """
+        self.peek()
+        read_size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError as err:
+                # the value can be incomplete, malformed value is reported right away
+                if _is_truncated(err, self._buffer) and self._read_more(read_size):
+                    read_size *= 2
+                    continue
+                raise
+            # the number can continue in next chunk
+            at_end = _NUMBER_TAIL_RE.match(self._buffer, end).end() == len(self._buffer)
+            if at_end and self._read_more(read_size):
+                read_size *= 2
+                continue
+            self._pos = end
+            return value
+
+
+def _iter_json_array(input_file, key, chunk_size=_CHUNK_SIZE):
+    """Yield items of array stored under `key` in top-level JSON object one at a time."""
+    reader = _JSONReader(input_file, chunk_size=chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        raise KeyError(key)
+    while True:
+        name = reader.decode()
+        reader.expect(":")
+        if name == key:
+            break
+        # skip value of other key
+        reader.decode()
+        if reader.expect(",}") == "}":
+            raise KeyError(key)
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.decode()
+        if reader.expect(",]") == "]":
+            return
+
+
+def iter_pytest_collect_records(json_filename):
+    """Yield records from the JSON file produced by pytest-polarion-collect one at a time.
+
+    The `json_filename` is path to the file or file object. The file is read incrementally,
+    the whole document is never loaded into memory.
+    """
     try:
-        results = _load_json(json_filename)["results"]
+        if hasattr(json_filename, "read"):
+            yield from _iter_json_array(json_filename, "results")
+            return
+        with utils.open_input(json_filename) as input_json:
+            yield from _iter_json_array(input_json, "results")
     except Exception as err:
         raise Dump2PolarionException("Cannot load results from {}: {}".format(json_filename, err))
 
+
+def import_pytest_collect(json_filename, lazy=False):
+    """Read the content of the JSON file produced by pytest-polarion-collect file.
+
+    When `lazy` is set, the results are read from the file as they are consumed.
+    """
+    results = iter_pytest_collect_records(json_filename)
+    if not lazy:
+        results = list(results)
+
     return xunit_exporter.ImportedData(results=results, testrun=None)
 
 
 # pylint: disable=unused-argument
-def import_json(json_filename, **kwargs):
+def import_json(json_filename, lazy=False, **kwargs):
     """Read the content of the JSON file."""
     # results from pytest-polarion-collect are the only ones supported so far
-    return import_pytest_collect(json_filename)
+    return import_pytest_collect(json_filename, lazy=lazy)
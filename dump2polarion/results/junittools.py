@@ -1,7 +1,5 @@
 """Helper functions for handling data in pytest junit format."""
 
-import os
-
 from lxml import etree
 
 from dump2polarion import utils
@@ -11,13 +9,38 @@ from dump2polarion.exporters import xunit_exporter
 _PARAMETER_PREFIX = "polarion-parameter-"
 
 
-def _get_xml_root(junit_file):
+def _iter_testcases(junit_file):
+    """Yield the <testcase> elements one by one, processed elements are discarded.
+
+    Each element is yielded on its `end` event. The already processed siblings are
+    removed from the tree and the element itself is cleared once the consumer moves on,
+    so memory usage doesn't grow with the size of the report.
+    """
+    input_file = junit_file
     try:
-        tree = etree.parse(os.path.expanduser(junit_file))
+        if isinstance(junit_file, str):
+            # compressed reports are decompressed as they are parsed
+            input_file = utils.open_input(junit_file, binary=True)
+        # huge_tree is safe here because entities are not resolved and network access is disabled
+        for __, testcase in etree.iterparse(
+            input_file,
+            events=("end",),
+            tag="testcase",
+            huge_tree=True,
+            resolve_entities=False,
+            no_network=True,
+        ):
+            parent = testcase.getparent()
+            while testcase.getprevious() is not None:
+                del parent[0]
+            yield testcase
+            testcase.clear(keep_tail=True)
+    # pylint: disable=broad-except
     except Exception as err:
         raise Dump2PolarionException("Failed to parse XML file '{}': {}".format(junit_file, err))
-
-    return tree.getroot()
+    finally:
+        if input_file is not junit_file:
+            input_file.close()
 
 
 def _parse_testcase_record(testcase_record):
@@ -62,40 +85,44 @@ def _extract_parameters_from_properties(properties):
     return new_properties, parameters
 
 
-# pylint: disable=unused-argument,too-many-locals
-def import_junit(junit_file, **kwargs):
-    """Read the content of the junit-results file produced by pytest and return imported data."""
-    xml_root = _get_xml_root(junit_file)
-
-    testcases = xml_root.xpath(".//testcase")
-    if testcases is None:
-        testcases = ()
-
-    results = []
-    for test_data in testcases:
-        verdict, comment, properties = _parse_testcase_record(test_data)
-        properties, parameters = _extract_parameters_from_properties(properties)
-
-        testcase_id = properties.get("polarion-testcase-id")
-        title = test_data.get("name")
-        classname = test_data.get("classname")
-        time = test_data.get("time", 0)
-        filepath = test_data.get("file")
-
-        data = {
-            "id": testcase_id,
-            "title": title,
-            "classname": classname,
-            "verdict": verdict,
-            "comment": comment,
-            "time": time,
-            "file": filepath,
-        }
-        for key, value in properties.items():
-            data[key] = value
-        if parameters:
-            data["params"] = utils.sorted_dict(parameters)
-
-        results.append(utils.sorted_dict(data))
+def _testcase_to_record(test_data):
+    """Convert the <testcase> element to a result record."""
+    verdict, comment, properties = _parse_testcase_record(test_data)
+    properties, parameters = _extract_parameters_from_properties(properties)
+
+    data = {
+        "id": properties.get("polarion-testcase-id"),
+        "title": test_data.get("name"),
+        "classname": test_data.get("classname"),
+        "verdict": verdict,
+        "comment": comment,
+        "time": test_data.get("time", 0),
+        "file": test_data.get("file"),
+    }
+    for key, value in properties.items():
+        data[key] = value
+    if parameters:
+        data["params"] = utils.sorted_dict(parameters)
+
+    return utils.sorted_dict(data)
+
+
+def iter_junit_records(junit_file):
+    """Yield the results records from the junit-results file one at a time.
+
+    The file is parsed incrementally, so the whole report is never kept in memory.
+    """
+    for test_data in _iter_testcases(junit_file):
+        yield _testcase_to_record(test_data)
+
+
+# pylint: disable=unused-argument
+def import_junit(junit_file, lazy=False, **kwargs):
+    """Read the content of the junit-results file produced by pytest and return imported data.
 
+    When `lazy` is set, the results are parsed from the file as they are consumed.
+    """
+    results = iter_junit_records(junit_file)
+    if not lazy:
+        results = list(results)
     return xunit_exporter.ImportedData(results=results, testrun=None)
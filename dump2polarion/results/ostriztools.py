@@ -1,14 +1,22 @@
 """Helper functions for handling JSON data from Ostriz."""
 
+import concurrent.futures
 import datetime
+import functools
+import hashlib
 import json
 import logging
 import os
+import sys
+import tempfile
+import time
 from collections import OrderedDict
 
 import requests
+from requests.adapters import HTTPAdapter
 from packaging.version import InvalidVersion, Version
 
+from dump2polarion import utils
 from dump2polarion.exceptions import Dump2PolarionException, NothingToDoException
 from dump2polarion.exporters import xunit_exporter
 
@@ -18,19 +26,122 @@ logger = logging.getLogger(__name__)
 
 IGNORED_PARAMS = {"browserVersion", "browserPlatform", "browserName"}
 
+# plain dicts preserve insertion order since Python 3.7
+_ORDERED_DICT = dict if sys.version_info >= (3, 7) else OrderedDict
+# any `object_pairs_hook` slows down the decoding, it's needed only on older Pythons
+_JSON_LOAD_KWARGS = {} if sys.version_info >= (3, 7) else {"object_pairs_hook": OrderedDict}
 
-def _get_json(location):
-    """Read JSON data from file or URL."""
+_CHUNK_SIZE = 64 * 1024
+
+# maximal number of sources loaded concurrently
+_MAX_DOWNLOADS = 8
+
+_SESSION = None
+
+
+def _get_session():
+    """Return session shared by all downloads, the connections are kept alive and reused."""
+    # pylint: disable=global-statement
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        _SESSION.mount("http://", adapter)
+        _SESSION.mount("https://", adapter)
+    return _SESSION
+
+
+def get_cache_dir():
+    """Return directory where downloaded Ostriz data are cached."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "dump2polarion", "ostriz")
+
+
+def _get_cache_paths(cache_dir, url):
+    """Return paths of cached data and its metadata for the URL."""
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key + ".json"), os.path.join(cache_dir, key + ".meta")
+
+
+def _load_cache_meta(meta_file, data_file):
+    """Return metadata (ETag, Last-Modified) of cached response."""
+    if not os.path.isfile(data_file):
+        return {}
+    try:
+        with open(meta_file, encoding="utf-8") as input_meta:
+            return json.load(input_meta)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_response(response, data_file):
+    """Stream response body to the file, the file is replaced only when the download finishes."""
+    out_fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(data_file), suffix=".tmp")
+    try:
+        with os.fdopen(out_fd, "wb") as out_file:
+            for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+                out_file.write(chunk)
+        os.replace(tmp_file, data_file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+
+def _download(url, cache_dir):
+    """Download data from URL into the cache directory and return path to the data file.
+
+    The cached data are revalidated using ETag / Last-Modified headers and downloaded
+    again only when they changed.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    data_file, meta_file = _get_cache_paths(cache_dir, url)
+    meta = _load_cache_meta(meta_file, data_file)
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    with _get_session().get(url, headers=headers, stream=True) as response:
+        if response.status_code == 304 and meta:
+            logger.debug("Using cached data for %s", url)
+            return data_file
+        if not response:
+            raise Dump2PolarionException("Failed to download")
+        _save_response(response, data_file)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    with open(meta_file, "w", encoding="utf-8") as out_meta:
+        json.dump(meta, out_meta)
+    return data_file
+
+
+def _load_tests(json_file):
+    with utils.open_input(json_file) as json_data:
+        return json.load(json_data, **_JSON_LOAD_KWARGS).get("tests")
+
+
+def _get_json(location, cache_dir=None):
+    """Read JSON data from file, URL or file object.
+
+    The data downloaded from URL are cached in `cache_dir` (see `get_cache_dir`).
+    """
+    if hasattr(location, "read"):
+        try:
+            return json.load(location, **_JSON_LOAD_KWARGS).get("tests")
+        except Exception as err:
+            raise Dump2PolarionException("Failed to parse JSON from {}: {}".format(location, err))
     location = os.path.expanduser(location)
     try:
         if os.path.isfile(location):
-            with open(location, encoding="utf-8") as json_data:
-                return json.load(json_data, object_pairs_hook=OrderedDict).get("tests")
+            return _load_tests(location)
         elif location.startswith("http"):
-            json_data = requests.get(location)
-            if not json_data:
-                raise Dump2PolarionException("Failed to download")
-            return json.loads(json_data.text, object_pairs_hook=OrderedDict).get("tests")
+            return _load_tests(_download(location, cache_dir or get_cache_dir()))
         else:
             raise Dump2PolarionException("Invalid location")
     except Exception as err:
@@ -82,7 +193,7 @@ def _filter_parameters(parameters):
     """Filter the ignored parameters out."""
     if not parameters:
         return None
-    return OrderedDict(
+    return _ORDERED_DICT(
         (param, value) for param, value in parameters.items() if param not in IGNORED_PARAMS
     )
 
@@ -130,7 +241,7 @@ def _append_record(test_data, results, test_path):
             test_id = test_id[0]
         data.append(("test_id", test_id))
 
-    results.append(OrderedDict(data))
+    results.append(_ORDERED_DICT(data))
 
 
 def _comp_finish_time(test_data, last_finish_time):
@@ -139,42 +250,218 @@ def _comp_finish_time(test_data, last_finish_time):
         last_finish_time[0] = curr_finish_time
 
 
-def _parse_ostriz(ostriz_data):
-    """Read the content of the input JSON and return testcases results."""
-    if not ostriz_data:
-        raise NothingToDoException("No data to import")
+def _get_build_testrun_id(build, testrun_ids):
+    """Return testrun id of the build, `None` when it can't be parsed.
 
-    results = []
+    The `testrun_ids` dict caches the testrun ids of already seen builds.
+    """
+    if build not in testrun_ids:
+        try:
+            testrun_ids[build] = _get_testrun_id(build)
+        except Dump2PolarionException as err:
+            logger.warning(err)
+            testrun_ids[build] = None
+    return testrun_ids[build]
+
+
+def _is_requested_build(curr_build, build, testrun_ids):
+    """Check that the build is the requested build, given as build or testrun id."""
+    return curr_build == build or _get_build_testrun_id(curr_build, testrun_ids) == build
+
+
+def _add_test(tests, test_path, test_data):
+    """Add test data, keep the result that finished last when the test is already there."""
+    prev_data = tests.get(test_path)
+    if prev_data and (prev_data.get("finish_time") or 0) > (test_data.get("finish_time") or 0):
+        return
+    tests[test_path] = test_data
+
+
+def _iter_tests(sources):
+    """Yield test path and test data of all tests in all the sources."""
+    for ostriz_data in sources:
+        if ostriz_data:
+            yield from ostriz_data.items()
+
+
+def _select_tests(sources, build=None):
+    """Return data of tests of the requested build, the build and the last finish time."""
+    tests = OrderedDict()
     found_build = None
+    testrun_ids = {}
     last_finish_time = [0]
-    for test_path, test_data in ostriz_data.items():
+    for test_path, test_data in _iter_tests(sources):
         curr_build = test_data.get("build")
         if not curr_build:
             continue
 
-        # set `found_build` from first record where it's present
-        if not found_build:
-            found_build = curr_build
+        if build:
+            # all builds with the requested testrun id are collected
+            if not _is_requested_build(curr_build, build, testrun_ids):
+                continue
+            found_build = found_build or curr_build
+        else:
+            # set `found_build` from first record where it's present
+            found_build = found_build or curr_build
+            # make sure we are collecting data for the same build
+            if found_build != curr_build:
+                continue
 
-        # make sure we are collecting data for the same build
-        if found_build != curr_build:
+        if not test_data.get("statuses"):
             continue
 
-        if not test_data.get("statuses"):
+        _add_test(tests, test_path, test_data)
+        _comp_finish_time(test_data, last_finish_time)
+
+    return tests, found_build, last_finish_time[0]
+
+
+def _partition_tests(sources):
+    """Return data of tests and the last finish time for each testrun id, in one pass."""
+    partitions = OrderedDict()
+    testrun_ids = {}
+    for test_path, test_data in _iter_tests(sources):
+        curr_build = test_data.get("build")
+        if not (curr_build and test_data.get("statuses")):
             continue
 
-        _append_record(test_data, results, test_path)
+        testrun_id = _get_build_testrun_id(curr_build, testrun_ids)
+        if not testrun_id:
+            continue
+
+        tests, last_finish_time = partitions.setdefault(testrun_id, (OrderedDict(), [0]))
+        _add_test(tests, test_path, test_data)
         _comp_finish_time(test_data, last_finish_time)
 
-    if last_finish_time[0]:
-        logger.info("Last result finished at %s", last_finish_time[0])
+    return partitions
+
+
+def _get_records(tests):
+    """Return results records for the tests data."""
+    results = []
+    for test_path, test_data in tests.items():
+        _append_record(test_data, results, test_path)
+    return results
+
+
+def _get_sources(ostriz_data):
+    sources = ostriz_data if isinstance(ostriz_data, list) else [ostriz_data]
+    if not any(sources):
+        raise NothingToDoException("No data to import")
+    return sources
+
+
+def _parse_ostriz(ostriz_data, build=None):
+    """Read the content of the input JSON and return testcases results.
+
+    The `ostriz_data` can be list of contents of several sources, the results are merged
+    in one pass. When the same test is present in more sources, the result that finished
+    last is used. Only the results of requested `build` are imported. When the `build` is
+    testrun id, results of all builds with this testrun id are imported. By default only
+    the results of the build of the first result where it's present are imported.
+    """
+    sources = _get_sources(ostriz_data)
+    tests, found_build, last_finish_time = _select_tests(sources, build=build)
+    if not found_build:
+        raise NothingToDoException(
+            "No data for build {} found".format(build) if build else "No build found in data"
+        )
+
+    results = _get_records(tests)
+
+    if last_finish_time:
+        logger.info("Last result finished at %s", last_finish_time)
 
     testrun_id = _get_testrun_id(found_build)
     return xunit_exporter.ImportedData(results=results, testrun=testrun_id)
 
 
+def _parse_ostriz_builds(ostriz_data):
+    """Read the content of the input JSON and return testcases results of all builds.
+
+    Return dict of testrun id -> imported data. All the results are processed in one pass.
+    The builds with the same testrun id are merged.
+    """
+    partitions = _partition_tests(_get_sources(ostriz_data))
+    if not partitions:
+        raise NothingToDoException("No build found in data")
+
+    builds = OrderedDict()
+    for testrun_id, (tests, last_finish_time) in partitions.items():
+        logger.info(
+            "Found %d results for testrun %s, last result finished at %s",
+            len(tests),
+            testrun_id,
+            last_finish_time[0],
+        )
+        builds[testrun_id] = xunit_exporter.ImportedData(
+            results=_get_records(tests), testrun=testrun_id
+        )
+    return builds
+
+
+def _load_source(location, cache_dir=None):
+    """Load data of single source, return the data and how long the loading took."""
+    start = time.perf_counter()
+    ostriz_data = _get_json(location, cache_dir=cache_dir)
+    return ostriz_data, time.perf_counter() - start
+
+
+def _load_sources(locations, cache_dir=None):
+    """Load data of all the sources concurrently."""
+    if len(locations) == 1:
+        loaded = [_load_source(locations[0], cache_dir=cache_dir)]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(_MAX_DOWNLOADS, len(locations))
+        ) as executor:
+            loaded = list(
+                executor.map(functools.partial(_load_source, cache_dir=cache_dir), locations)
+            )
+
+    for location, (ostriz_data, load_time) in zip(locations, loaded):
+        logger.info(
+            "Loaded %d tests from %s in %.3f s", len(ostriz_data or ()), location, load_time
+        )
+    return [ostriz_data for ostriz_data, __ in loaded]
+
+
+def _get_locations(location):
+    """Return list of locations, single location is a path, URL or file object."""
+    if isinstance(location, str) or hasattr(location, "read"):
+        return [location]
+    return list(location)
+
+
+# pylint: disable=unused-argument
+def import_ostriz(location, cache_dir=None, build=None, **kwargs):
+    """Read Ostriz's data and return imported data.
+
+    The `location` can be a file, URL, file object or list of these. Several locations are loaded
+    concurrently and the results of the `build` (build or testrun id, by default build
+    of the first result) are merged.
+
+    The data downloaded from URL are cached in `cache_dir` (see `get_cache_dir`).
+    """
+    locations = _get_locations(location)
+    sources = _load_sources(locations, cache_dir=cache_dir)
+    start = time.perf_counter()
+    imported_data = _parse_ostriz(sources, build=build)
+    logger.info(
+        "Merged %d results from %d sources in %.3f s",
+        len(imported_data.results),
+        len(sources),
+        time.perf_counter() - start,
+    )
+    return imported_data
+
+
 # pylint: disable=unused-argument
-def import_ostriz(location, **kwargs):
-    """Read Ostriz's data and return imported data."""
-    ostriz_data = _get_json(location)
-    return _parse_ostriz(ostriz_data)
+def import_ostriz_builds(location, cache_dir=None, **kwargs):
+    """Read Ostriz's data and return imported data of all builds.
+
+    Return dict of testrun id -> imported data. The data are loaded only once,
+    see `import_ostriz` for the description of arguments.
+    """
+    locations = _get_locations(location)
+    return _parse_ostriz_builds(_load_sources(locations, cache_dir=cache_dir))
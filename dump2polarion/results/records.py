@@ -0,0 +1,118 @@
+"""Compact records for tabular results data (CSV, SQLite)."""
+
+import collections
+import copy
+from collections.abc import Mapping
+
+
+class FieldsIndex(dict):
+    """Mapping of field names to positions of values, remembers the number of columns.
+
+    The number of columns (`width`) can be greater than number of field names when
+    the same field name is present more times.
+    """
+
+    def __init__(self, fieldnames):
+        fieldnames = list(fieldnames)
+        super().__init__((name, index) for index, name in enumerate(fieldnames))
+        self.width = len(fieldnames)
+
+
+def get_fields_index(fieldnames):
+    """Return mapping of field names to positions of values, shared by all the records.
+
+    When the same field name is present more times, the last value is used.
+    """
+    return FieldsIndex(fieldnames)
+
+
+def _get_width(fields):
+    """Return number of columns of the table, the fields index can be any mapping."""
+    width = getattr(fields, "width", None)
+    if width is None:
+        width = max(fields.values()) + 1 if fields else 0
+    return width
+
+
+class RowRecord(Mapping):
+    """Read-only record with values of single row.
+
+    All records of a table share the same fields index, each record stores only
+    the tuple of values. Missing trailing values are `None`. The `copy()` method,
+    `copy.copy` and `copy.deepcopy` return mutable dict with the record data.
+
+    >>> fields = get_fields_index(["id", "title", "verdict"])
+    >>> record = RowRecord(fields, ("RHCF3-1", "test_foo"))
+    >>> record["title"], record.get("verdict"), record.get("comment", "")
+    ('test_foo', None, '')
+    >>> list(record.items())
+    [('id', 'RHCF3-1'), ('title', 'test_foo'), ('verdict', None)]
+    """
+
+    __slots__ = ("_fields", "_values")
+
+    def __init__(self, fields, values):
+        # the values are positioned as in the original row, including the columns
+        # with duplicate field names
+        width = _get_width(fields)
+        values_count = len(values)
+        if values_count < width:
+            values = tuple(values) + (None,) * (width - values_count)
+        elif values_count > width or not isinstance(values, tuple):
+            values = tuple(values[:width])
+        self._fields = fields
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._fields[key]]
+
+    def get(self, key, default=None):
+        index = self._fields.get(key)
+        if index is None:
+            return default
+        return self._values[index]
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def copy(self):
+        """Return mutable copy of the record as dict."""
+        return dict(self.items())
+
+    # records are copied to be modified (e.g. in `transform_func`), the copies are mutable
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.copy(), memo)
+
+    def __reduce__(self):
+        return (self.__class__, (self._fields, self._values))
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, dict(self.items()))
+
+
+class ExportedRows:
+    """Collect rowids of exported records, to be used as `exported_callback` of exporter.
+
+    Only records of database rows (records with `db_file` and `rowid`) are collected,
+    so the database backend doesn't need to be imported.
+    """
+
+    def __init__(self):
+        self.rowids = collections.defaultdict(list)
+
+    def __call__(self, record):
+        db_file = getattr(record, "db_file", None)
+        if db_file:
+            self.rowids[db_file].append(record.rowid)
+
+    def get(self, db_file):
+        """Return rowids of records exported from the database file."""
+        return self.rowids.get(db_file, [])
@@ -0,0 +1,186 @@
+"""Registry of importers of results data.
+
+Every importer is described by `ImporterSpec`. The type of input data is recognized by
+the `sniff` function that gets the first bytes of the (decompressed) data, so only one
+small read is needed. The `parser` is a "module:function" string, the module is imported
+only when the importer is really used.
+
+Third-party importers are registered using the `dump2polarion.importers` entry points,
+the entry point needs to refer to an `ImporterSpec`. The entry points are loaded only when
+none of the built-in importers recognizes the input data.
+"""
+
+import collections
+import importlib
+import itertools
+import logging
+import re
+
+# pylint: disable=invalid-name
+logger = logging.getLogger(__name__)
+
+
+ENTRY_POINTS_GROUP = "dump2polarion.importers"
+
+# number of bytes passed to the sniff functions
+SNIFF_SIZE = 4096
+
+SQLITE_EXT = (".sqlite", ".sqlite3", ".db", ".db3")
+
+ImporterSpec = collections.namedtuple(
+    "ImporterSpec", ("name", "sniff", "parser", "extensions", "binary", "stream")
+)
+ImporterSpec.__doc__ = """Description of importer.
+
+`sniff(head)` checks if the importer can import data starting with `head` bytes.
+`parser` is "module:function" string of the importer function, the function is called
+with path to the input file (or file object when `stream` is set) and keyword arguments.
+`extensions` are used when the data can't be sniffed (e.g. the file doesn't exist yet).
+The file objects are opened in binary mode when `binary` is set, text mode otherwise.
+"""
+# binary and stream are optional
+ImporterSpec.__new__.__defaults__ = (False, True)
+
+_XML_RE = re.compile(rb"^\s*(<\?xml[^>]*\?>\s*)?(<!--.*?-->\s*)*<testsuites?[\s>]", re.DOTALL)
+_JSON_KEY_RE = re.compile(rb'^\s*\{\s*"([^"]+)"\s*:')
+_CSV_FIELDS_RE = re.compile(rb"[,;\t]")
+
+
+def _sniff_sqlite(head):
+    return head.startswith(b"SQLite format 3\x00")
+
+
+def _sniff_junit(head):
+    return bool(_XML_RE.match(head))
+
+
+def _get_json_key(head):
+    """Return the first key of JSON object."""
+    match = _JSON_KEY_RE.match(head)
+    return match.group(1) if match else None
+
+
+def _sniff_ostriz(head):
+    return _get_json_key(head) == b"tests"
+
+
+def _sniff_json(head):
+    return _get_json_key(head) == b"results"
+
+
+def _sniff_csv(head):
+    """Look for Polarion export header or for row of fieldnames with the "ID" column."""
+    if b"\x00" in head:
+        return False
+    if head.startswith(b"Exported on"):
+        return True
+    for line in head.splitlines():
+        fields = _CSV_FIELDS_RE.split(line)
+        if len(fields) > 1 and any(field.strip(b' "').lower() == b"id" for field in fields):
+            return True
+    return False
+
+
+_BUILTIN_SPECS = (
+    ImporterSpec(
+        "sqlite",
+        _sniff_sqlite,
+        "dump2polarion.results.dbtools:import_sqlite",
+        SQLITE_EXT,
+        binary=True,
+        stream=False,
+    ),
+    ImporterSpec(
+        "junit",
+        _sniff_junit,
+        "dump2polarion.results.junittools:import_junit",
+        (".xml",),
+        binary=True,
+    ),
+    ImporterSpec("ostriz", _sniff_ostriz, "dump2polarion.results.ostriztools:import_ostriz", ()),
+    ImporterSpec("json", _sniff_json, "dump2polarion.results.jsontools:import_json", (".json",)),
+    ImporterSpec("csv", _sniff_csv, "dump2polarion.results.csvtools:import_csv", (".csv",)),
+)
+
+_registered_specs = []
+_plugin_specs = None
+
+
+def register_importer(spec):
+    """Register importer, it takes precedence over the built-in importers."""
+    _registered_specs.insert(0, spec)
+
+
+def _iter_entry_points():
+    try:
+        from importlib import metadata
+    except ImportError:
+        # python < 3.8
+        return []
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return entry_points.select(group=ENTRY_POINTS_GROUP)
+    return entry_points.get(ENTRY_POINTS_GROUP, [])
+
+
+def _get_plugin_specs():
+    """Load the importers registered using entry points, only once."""
+    # pylint: disable=global-statement
+    global _plugin_specs
+    if _plugin_specs is None:
+        _plugin_specs = []
+        for entry_point in _iter_entry_points():
+            try:
+                _plugin_specs.append(entry_point.load())
+            # pylint: disable=broad-except
+            except Exception as err:
+                logger.warning("Failed to load importer '%s': %s", entry_point.name, err)
+    return _plugin_specs
+
+
+def _iter_specs():
+    yield from _registered_specs
+    yield from _BUILTIN_SPECS
+    # plugins are loaded lazily, only when the built-in importers don't match
+    yield from _get_plugin_specs()
+
+
+def get_spec(name):
+    """Return importer of the given name."""
+    for spec in _iter_specs():
+        if spec.name == name:
+            return spec
+    raise KeyError(name)
+
+
+def sniff(head):
+    """Return importer that recognizes data starting with `head`, `None` when not found."""
+    for spec in _iter_specs():
+        if spec.sniff(head):
+            return spec
+    return None
+
+
+def get_spec_by_ext(ext):
+    """Return importer of files with the extension, `None` when not found."""
+    ext = ext.lower()
+    for spec in _iter_specs():
+        if ext in spec.extensions:
+            return spec
+    return None
+
+
+def iter_extensions():
+    """Yield extensions of the known importers.
+
+    The entry points are not loaded just for listing the extensions, only the plugins
+    that were already loaded are included.
+    """
+    for spec in itertools.chain(_registered_specs, _BUILTIN_SPECS, _plugin_specs or ()):
+        yield from spec.extensions
+
+
+def load_parser(spec):
+    """Import the module of the importer and return the importer function."""
+    module_name, __, func_name = spec.parser.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
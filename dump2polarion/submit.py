@@ -1,15 +1,30 @@
 """Submit data to the Polarion Importer."""
 
+import binascii
+import collections
+import copy
+import gzip
+import itertools
 import logging
 import os
+import zlib
 
-from dump2polarion import configuration, properties, utils
+from lxml import etree
+from urllib3 import encode_multipart_formdata
+
+from dump2polarion import configuration, profiling, properties, utils
 from dump2polarion.exceptions import Dump2PolarionException
 from dump2polarion.verify import verify_submit
 
 # pylint: disable=invalid-name
 logger = logging.getLogger(__name__)
 
+_CHUNK_SIZE = 64 * 1024
+_HEAD_TAGS = ("properties", "response-properties")
+
+# beginning of the XML document (root element with properties) and the encoded document
+_XMLStream = collections.namedtuple("_XMLStream", "head chunks length")
+
 
 class SubmitResponse:
     """Response data from submit to Importer."""
@@ -145,17 +160,176 @@ def _get_xml_root(xml_root, xml_str, xml_file):
     raise Dump2PolarionException("Failed to submit to Polarion - no data supplied")
 
 
-def submit(xml_root, submit_config, session, dry_run=None, **kwargs):
-    """Submit data to the Polarion Importer."""
-    properties.xunit_fill_testrun_id(xml_root, kwargs.get("testrun_id"))
-    if dry_run is not None:
-        properties.set_dry_run(xml_root, dry_run)
-    xml_input = utils.etree_to_string(xml_root)
+class MultipartStream:
+    """Multipart/form-data request body with the XML document streamed from chunks."""
+
+    def __init__(self, chunks, filename="results.xml"):
+        self.boundary = binascii.hexlify(os.urandom(16)).decode("ascii")
+        self.content_type = "multipart/form-data; boundary={}".format(self.boundary)
+        self._head = (
+            "--{}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="{}"\r\n'
+            "Content-Type: application/xml\r\n\r\n".format(self.boundary, filename)
+        ).encode("utf-8")
+        self._tail = "\r\n--{}--\r\n".format(self.boundary).encode("utf-8")
+        self._chunks = chunks
+
+    def __iter__(self):
+        yield self._head
+        yield from self._chunks
+        yield self._tail
+
+
+class SizedMultipartStream(MultipartStream):
+    """Multipart/form-data request body with known length of the XML document.
+
+    The length allows sending the body with "Content-Length" instead of using
+    the chunked transfer encoding.
+    """
+
+    def __init__(self, chunks, length, filename="results.xml"):
+        super().__init__(chunks, filename=filename)
+        self._length = len(self._head) + length + len(self._tail)
+
+    def __len__(self):
+        return self._length
+
+
+def _gzip_chunks(chunks):
+    """Compress the chunks with gzip on the fly."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _iter_file_chunks(xml_file, chunk_size=_CHUNK_SIZE):
+    """Read the file in chunks, compressed file (e.g. '.xml.gz') is decompressed on the fly."""
+    with utils.open_input(xml_file, binary=True) as input_file:
+        while True:
+            chunk = input_file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _iter_xml_events(chunks, read_chunks):
+    """Parse the chunks incrementally, yield the parser events and record the chunks read."""
+    parser = etree.XMLPullParser(events=("start", "end"))
+    for chunk in chunks:
+        read_chunks.append(chunk)
+        try:
+            parser.feed(chunk)
+            events = list(parser.read_events())
+        except etree.XMLSyntaxError as err:
+            raise Dump2PolarionException("Failed to parse XML: {}".format(err))
+        yield from events
+
+
+def _read_xml_head(chunks):
+    """Parse the root element and its properties from the beginning of the XML document.
+
+    Return the root element with copy of the properties elements and list of chunks
+    that were read.
+    """
+    read_chunks = []
+    root = None
+    depth = 0
+    for event, element in _iter_xml_events(chunks, read_chunks):
+        depth += 1 if event == "start" else -1
+        if root is None:
+            root = element
+        elif depth == 0 or (event == "start" and depth == 2 and element.tag not in _HEAD_TAGS):
+            break
+    if root is None:
+        raise Dump2PolarionException("Failed to parse XML: no root element found")
+
+    head = etree.Element(root.tag, root.attrib)
+    for element in root.iterchildren(*_HEAD_TAGS):
+        head.append(copy.deepcopy(element))
+    return head, read_chunks
+
+
+def _needs_patching(xml_head, dry_run):
+    """Check if properties of the document needs to be changed before submitting.
+
+    The test run id needs to be added only when the property is missing. Missing dry-run
+    property means it is not a dry run.
+    """
+    props = {
+        prop.get("name"): prop.get("value") for prop in xml_head.iterfind("properties/property")
+    }
+    dry_run_name = "dry-run"
+    if xml_head.tag == "testsuites":
+        if xml_head.find("properties") is None or "polarion-testrun-id" not in props:
+            return True
+        dry_run_name = "polarion-dry-run"
+    if dry_run is None:
+        return False
+    # the exporters write the value as "False" / "True"
+    return (props.get(dry_run_name) or "false").lower() != str(dry_run).lower()
+
+
+def _get_xml_doc(xml_root, xml_str, xml_file, xml_chunks, dry_run):
+    """Return the XML document for submitting.
+
+    The XML file or iterable of encoded chunks is streamed (as `_XMLStream`) when the
+    document can be submitted as is, otherwise root element of the parsed document is returned.
+    """
+    if xml_root is not None or xml_str or not (xml_file or xml_chunks is not None):
+        return _get_xml_root(xml_root, xml_str, xml_file)
+
+    if xml_file:
+        xml_file = os.path.expanduser(xml_file)
+        try:
+            # the length of decompressed document is not known in advance
+            length = None if utils.is_compressed(xml_file) else os.path.getsize(xml_file)
+        except OSError as err:
+            raise Dump2PolarionException("Failed to read XML file '{}': {}".format(xml_file, err))
+        chunks = _iter_file_chunks(xml_file)
+    else:
+        length = None
+        chunks = iter(xml_chunks)
+
+    xml_head, read_chunks = _read_xml_head(chunks)
+    if not _needs_patching(xml_head, dry_run):
+        return _XMLStream(xml_head, itertools.chain(read_chunks, chunks), length)
 
+    if xml_file:
+        return utils.get_xml_root(xml_file)
+    return utils.get_xml_root_from_str(b"".join(itertools.chain(read_chunks, chunks)))
+
+
+def _post(session, url, data=None, files=None, compress=False):
+    """Post the data, compress the multipart body with gzip if requested."""
+    if data is None and not compress:
+        return session.post(url, files=files)
+    if data is None:
+        body, content_type = encode_multipart_formdata(files)
+        data = gzip.compress(body)
+    else:
+        content_type = data.content_type
+        if compress:
+            data = _gzip_chunks(data)
+    headers = {"Content-Type": content_type}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return session.post(url, data=data, headers=headers)
+
+
+def _post_and_get_response(session, submit_config, data=None, files=None):
     logger.info("Submitting data to %s", submit_config.submit_target)
-    files = {"file": ("results.xml", xml_input)}
     try:
-        response = session.post(submit_config.submit_target, files=files)
+        with profiling.stage("submit"):
+            response = _post(
+                session,
+                submit_config.submit_target,
+                data=data,
+                files=files,
+                compress=bool(submit_config.config.get("compress_upload")),
+            )
     # pylint: disable=broad-except
     except Exception as err:
         logger.error(err)
@@ -164,17 +338,68 @@ def submit(xml_root, submit_config, session, dry_run=None, **kwargs):
     return SubmitResponse(response)
 
 
+def submit(xml_root, submit_config, session, dry_run=None, **kwargs):
+    """Submit data to the Polarion Importer.
+
+    The properties are patched directly in the element tree, the tree is serialized
+    only once and the payload is not pretty-printed. When the `compress_upload`
+    config option is set, the request body is compressed with gzip.
+    """
+    properties.xunit_fill_testrun_id(xml_root, kwargs.get("testrun_id"))
+    if dry_run is not None:
+        properties.set_dry_run(xml_root, dry_run)
+    with profiling.stage("serialize"):
+        xml_input = utils.etree_to_bytes(xml_root)
+
+    files = {"file": ("results.xml", xml_input)}
+    return _post_and_get_response(session, submit_config, files=files)
+
+
+def submit_stream(chunks, submit_config, session, length=None):
+    """Submit XML document to the Polarion Importer as a streamed multipart body.
+
+    The document is passed as iterable of encoded chunks and is submitted as is.
+    When `length` of the document is known, the "Content-Length" header is sent,
+    otherwise chunked transfer encoding is used.
+    """
+    if length is None:
+        data = MultipartStream(chunks)
+    else:
+        data = SizedMultipartStream(chunks, length)
+    return _post_and_get_response(session, submit_config, data=data)
+
+
 # pylint: disable=too-many-arguments
 def submit_and_verify(
-    xml_str=None, xml_file=None, xml_root=None, config=None, session=None, dry_run=None, **kwargs
+    xml_str=None,
+    xml_file=None,
+    xml_root=None,
+    config=None,
+    session=None,
+    dry_run=None,
+    xml_chunks=None,
+    **kwargs
 ):
-    """Submit data to the Polarion Importer and checks that it was imported."""
+    """Submit data to the Polarion Importer and checks that it was imported.
+
+    The data can be passed as root element of the XML tree (`xml_root`), as string or
+    UTF-8 encoded bytes (`xml_str`), as path to XML file (`xml_file`) or as iterable
+    of UTF-8 encoded chunks of the XML document (`xml_chunks`). Passing the element tree
+    avoids parsing of the data. The XML file and chunks are streamed to the Importer
+    without parsing the whole document when no properties need to be changed.
+    """
     try:
         config = config or configuration.get_config()
-        xml_root = _get_xml_root(xml_root, xml_str, xml_file)
-        submit_config = SubmitConfig(xml_root, config, **kwargs)
+        xml_doc = _get_xml_doc(xml_root, xml_str, xml_file, xml_chunks, dry_run)
+        is_stream = isinstance(xml_doc, _XMLStream)
+        submit_config = SubmitConfig(xml_doc.head if is_stream else xml_doc, config, **kwargs)
         session = session or utils.get_session(submit_config.credentials, config)
-        submit_response = submit(xml_root, submit_config, session, dry_run=dry_run, **kwargs)
+        if is_stream:
+            submit_response = submit_stream(
+                xml_doc.chunks, submit_config, session, length=xml_doc.length
+            )
+        else:
+            submit_response = submit(xml_doc, submit_config, session, dry_run=dry_run, **kwargs)
     except Dump2PolarionException as err:
         logger.error(err)
         return None
@@ -193,3 +418,57 @@ def submit_and_verify(
     )
 
     return response
+
+
+# pylint: disable=too-many-arguments
+def submit_shards_and_verify(xml_shards, config=None, session=None, dry_run=None, **kwargs):
+    """Submit several documents to the Polarion Importer and check that all were imported.
+
+    The documents (root elements, strings or encoded bytes) are submitted one by one and
+    the import jobs are verified together. When any of the documents fails to submit,
+    the remaining ones are not submitted and `None` is returned.
+    """
+    if not xml_shards:
+        logger.error("Failed to submit to Polarion - no data supplied")
+        return None
+
+    job_ids = []
+    submit_config = None
+    try:
+        config = config or configuration.get_config()
+        for index, xml_shard in enumerate(xml_shards, 1):
+            if etree.iselement(xml_shard):
+                xml_root = xml_shard
+            else:
+                xml_root = _get_xml_root(None, xml_shard, None)
+            submit_config = SubmitConfig(xml_root, config, **kwargs)
+            session = session or utils.get_session(submit_config.credentials, config)
+            logger.info("Submitting shard %d of %d", index, len(xml_shards))
+            submit_response = submit(xml_root, submit_config, session, dry_run=dry_run, **kwargs)
+            if not submit_response.validate_response():
+                logger.error(
+                    "Failed to submit shard %d, %d of %d shards were submitted",
+                    index,
+                    index - 1,
+                    len(xml_shards),
+                )
+                # the submitted shards are not imported completely, don't report success
+                return None
+            job_ids.extend(submit_response.job_ids)
+    except Dump2PolarionException as err:
+        logger.error(err)
+        return None
+
+    if kwargs.get("no_verify"):
+        return submit_response.response
+
+    response = verify_submit(
+        session,
+        submit_config.queue_url,
+        submit_config.log_url,
+        job_ids,
+        timeout=kwargs.get("verify_timeout"),
+        log_file=kwargs.get("log_file"),
+    )
+
+    return response
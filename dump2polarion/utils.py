@@ -1,7 +1,11 @@
 """Utils for dump2polarion."""
 
+import bz2
 import datetime
+import functools
+import gzip
 import logging
+import lzma
 import os
 import random
 import re
@@ -23,11 +27,38 @@ logger = logging.getLogger(__name__)
 NO_BLANKS_PARSER = etree.XMLParser(remove_blank_text=True)
 # from https://stackoverflow.com/a/25920392
 VALID_XML_RE = re.compile("[^\u0020-\uD7FF\u0009\u000A\u000D\uE000-\uFFFD\U00010000-\U0010FFFF]+")
+# characters not valid in XML when the string contains only ASCII characters
+INVALID_ASCII_XML_RE = re.compile("[\u0000-\u0008\u000B\u000C\u000E-\u001F]")
+# `str.isascii` is available since python 3.7
+_HAS_ISASCII = hasattr(str, "isascii")
+# sanitized strings up to this length are memoized
+_MEMO_MAX_LEN = 128
+
+# extensions and magic bytes of compressed input files and modules that decompress them
+COMPRESSED_EXT = {".gz": gzip, ".xz": lzma, ".bz2": bz2}
+_COMPRESSED_MAGIC = ((b"\x1f\x8b", gzip), (b"\xfd7zXZ\x00", lzma), (b"BZh", bz2))
+
+
+@functools.lru_cache(maxsize=1024)
+def _sanitize_short(text):
+    return VALID_XML_RE.sub("", text)
+
+
+def sanitize_xml_str(text):
+    """Remove characters that are not valid in XML from the string."""
+    # printable string can't contain any character that is not valid in XML
+    if text.isprintable():
+        return text
+    if len(text) <= _MEMO_MAX_LEN:
+        return _sanitize_short(text)
+    if _HAS_ISASCII and text.isascii() and not INVALID_ASCII_XML_RE.search(text):
+        return text
+    return VALID_XML_RE.sub("", text)
 
 
 def get_unicode_str(obj):
     """Make sure obj is a valid XML unicode string."""
-    return VALID_XML_RE.sub("", utils.get_unicode_str(obj))
+    return sanitize_xml_str(utils.get_unicode_str(obj))
 
 
 def init_log(log_level):
@@ -53,48 +84,145 @@ def _get_filename(output_loc=None, filename=None):
     return filename_fin
 
 
-def write_xml(xml_str, output_loc=None, filename=None):
+def _open_output(filename_fin, binary=False):
+    """Open the output file, compress it with gzip when the file name ends with '.gz'."""
+    mode = "wb" if binary else "wt"
+    encoding = None if binary else "utf-8"
+    if filename_fin.lower().endswith(".gz"):
+        return gzip.open(filename_fin, mode, encoding=encoding)
+    return open(filename_fin, mode, encoding=encoding)
+
+
+def strip_compressed_ext(filename):
+    """Return the file name without extension of compressed file (e.g. '.gz')."""
+    base, ext = os.path.splitext(filename)
+    if ext.lower() in COMPRESSED_EXT:
+        return base
+    return filename
+
+
+def get_magic_decompressor(head):
+    """Return module that decompresses data starting with `head`, `None` when not compressed."""
+    for prefix, decompressor in _COMPRESSED_MAGIC:
+        if head.startswith(prefix):
+            return decompressor
+    return None
+
+
+def _get_decompressor(filename):
+    """Return module that decompresses the file, `None` when the file is not compressed.
+
+    The compression is recognized by the file extension or by the magic bytes.
+    """
+    __, ext = os.path.splitext(filename)
+    decompressor = COMPRESSED_EXT.get(ext.lower())
+    if decompressor:
+        return decompressor
+    with open(filename, "rb") as input_file:
+        return get_magic_decompressor(input_file.read(6))
+
+
+def is_compressed(filename):
+    """Check if the input file is compressed."""
+    return _get_decompressor(os.path.expanduser(filename)) is not None
+
+
+def open_input(filename, binary=False):
+    """Open the input file, decompress it on the fly when it is compressed (gzip, xz, bzip2).
+
+    The content is decompressed as it is read, nothing is written to disk.
+    """
+    filename = os.path.expanduser(filename)
+    mode = "rb" if binary else "rt"
+    encoding = None if binary else "utf-8"
+    decompressor = _get_decompressor(filename)
+    if decompressor:
+        return decompressor.open(filename, mode, encoding=encoding)
+    return open(filename, mode, encoding=encoding)
+
+
+def write_xml(xml_str, output_loc=None, filename=None, sanitize=True):
     """Output the XML content (string) into a file.
 
     If `output_loc` is supplied and it's a file (not directory), the output
-    will be saved there and the `filename` is ignored.
+    will be saved there and the `filename` is ignored. The file is compressed
+    with gzip when its name ends with ".gz".
 
     Args:
         xml_str: string with XML document
         output_loc: file or directory for saving the file
         filename: file name that will be used if `output_loc` is directory
             If it is needed and is not supplied, it will be generated
+        sanitize: remove characters not valid in XML; can be disabled when the
+            string was produced by one of the exporters
 
     """
     if not xml_str:
         raise Dump2PolarionException("No data to write.")
     filename_fin = _get_filename(output_loc=output_loc, filename=filename)
 
-    with open(filename_fin, "w", encoding="utf-8") as xml_file:
-        xml_file.write(get_unicode_str(xml_str))
+    with _open_output(filename_fin) as xml_file:
+        xml_file.write(get_unicode_str(xml_str) if sanitize else xml_str)
     logger.info("Data written to '%s'", filename_fin)
 
 
-def write_xml_root(xml_root, output_loc=None, filename=None):
+def write_xml_root(xml_root, output_loc=None, filename=None, pretty_print=True):
     """Output the XML content (from XML element) into a file.
 
     If `output_loc` is supplied and it's a file (not directory), the output
-    will be saved there and the `filename` is ignored.
+    will be saved there and the `filename` is ignored. The file is compressed
+    with gzip when its name ends with ".gz".
 
     Args:
         xml_root: root element ot the XML document
         output_loc: file or directory for saving the file
         filename: file name that will be used if `output_loc` is directory
             If it is needed and is not supplied, it will be generated
+        pretty_print: pretty-print the XML, otherwise write it in compact form
 
     """
     if xml_root is None:
         raise Dump2PolarionException("No data to write.")
     filename_fin = _get_filename(output_loc=output_loc, filename=filename)
 
-    et = etree.ElementTree(xml_root)
-    et.write(filename_fin, xml_declaration=True, pretty_print=True, encoding="utf-8")
+    xml_bytes = etree.tostring(
+        xml_root, encoding="utf-8", xml_declaration=True, pretty_print=pretty_print
+    )
+    with _open_output(filename_fin, binary=True) as xml_file:
+        xml_file.write(xml_bytes)
+    logger.info("Data written to '%s'", filename_fin)
+
+
+def write_xml_stream(write_func, output_loc=None, filename=None):
+    """Output the XML content into a file using the `write_func` callable.
+
+    The `write_func` is called with a file object opened in binary mode. If it fails,
+    the partially written file is removed.
+
+    If `output_loc` is supplied and it's a file (not directory), the output
+    will be saved there and the `filename` is ignored. The file is compressed
+    with gzip when its name ends with ".gz".
+
+    Args:
+        write_func: callable that writes the XML document into passed file object
+        output_loc: file or directory for saving the file
+        filename: file name that will be used if `output_loc` is directory
+            If it is needed and is not supplied, it will be generated
+
+    Returns:
+        name of the written file
+    """
+    filename_fin = _get_filename(output_loc=output_loc, filename=filename)
+
+    try:
+        with _open_output(filename_fin, binary=True) as xml_file:
+            write_func(xml_file)
+    except Exception:
+        if os.path.exists(filename_fin):
+            os.remove(filename_fin)
+        raise
     logger.info("Data written to '%s'", filename_fin)
+    return filename_fin
 
 
 def get_xml_root(xml_file):
@@ -108,9 +236,11 @@ def get_xml_root(xml_file):
 
 
 def get_xml_root_from_str(xml_str):
-    """Return XML root from string."""
+    """Return XML root from string or from UTF-8 encoded bytes."""
+    if isinstance(xml_str, str):
+        xml_str = xml_str.encode("utf-8")
     try:
-        xml_root = etree.fromstring(xml_str.encode("utf-8"), NO_BLANKS_PARSER)
+        xml_root = etree.fromstring(xml_str, NO_BLANKS_PARSER)
     # pylint: disable=broad-except
     except Exception as err:
         raise Dump2PolarionException("Failed to parse XML string: {}".format(err))
@@ -119,13 +249,19 @@ def get_xml_root_from_str(xml_str):
 
 def etree_to_string(xml_root):
     """Return string representation of element tree."""
-    return get_unicode_str(etree.tostring(xml_root, encoding="utf-8"))
+    # lxml doesn't allow characters that are not valid in XML, no need to sanitize
+    return etree.tostring(xml_root, encoding="utf-8").decode("utf-8")
+
+
+def etree_to_bytes(xml_root):
+    """Return UTF-8 encoded compact representation of element tree with XML declaration."""
+    return etree.tostring(xml_root, encoding="utf-8", xml_declaration=True)
 
 
 def prettify_xml(xml_root):
     """Return pretty-printed string representation of element tree."""
     xml_string = etree.tostring(xml_root, encoding="utf-8", xml_declaration=True, pretty_print=True)
-    return get_unicode_str(xml_string)
+    return xml_string.decode("utf-8")
 
 
 def get_session(credentials, config):
@@ -4,6 +4,8 @@ import logging
 import os
 import time
 
+from dump2polarion import profiling
+
 # pylint: disable=invalid-name
 logger = logging.getLogger(__name__)
 
@@ -189,4 +191,6 @@ def verify_submit(
 ):
     """Verify that the results were successfully submitted."""
     verification_queue = get_queue_obj(session=session, queue_url=queue_url, log_url=log_url)
-    return verification_queue.verify_submit(job_ids, timeout, delay, **kwargs)
+    with profiling.stage("verify") as stats:
+        stats.records = len(job_ids) if job_ids else 0
+        return verification_queue.verify_submit(job_ids, timeout, delay, **kwargs)
@@ -24,9 +24,10 @@ setup(
     },
     setup_requires=["setuptools_scm"],
     install_requires=[
-        "lxml",
+        "lxml>=4.5",
         "pyyaml",
         "requests",
+        "urllib3",
         "docutils",
         "packaging",
         "python-box",
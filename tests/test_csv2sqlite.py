@@ -1,11 +1,12 @@
 # pylint: disable=missing-docstring,redefined-outer-name,no-self-use
 
 import os
+import sqlite3
 
 from mock import patch
 
 from dump2polarion import csv2sqlite_cli
-from dump2polarion.exporters.xunit_exporter import XunitExport
+from dump2polarion.exporters.xunit_exporter import ImportedData, XunitExport
 from dump2polarion.results import dbtools
 from tests import conf
 
@@ -16,6 +17,13 @@ class TestCSV2sqliteCLI:
         assert args.input_file == "foo"
         assert args.output_file == "bar"
         assert args.log_level is None
+        assert args.mode == csv2sqlite_cli.MODE_CREATE
+
+    def test_get_args_modes(self):
+        args = csv2sqlite_cli.get_args(["-i", "foo", "-o", "bar", "--append"])
+        assert args.mode == csv2sqlite_cli.MODE_APPEND
+        args = csv2sqlite_cli.get_args(["-i", "foo", "-o", "bar", "--merge"])
+        assert args.mode == csv2sqlite_cli.MODE_MERGE
 
     def test_e2e_ok(self, config_prop, tmpdir):
         input_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
@@ -46,3 +54,68 @@ class TestCSV2sqliteCLI:
         retval = csv2sqlite_cli.main(args)
         assert retval == 1
         assert "is in CSV format" in captured_log.getvalue()
+
+
+def _load_csv(db_file, *extra_args):
+    input_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+    with patch("dump2polarion.csv2sqlite_cli.utils.init_log"):
+        return csv2sqlite_cli.main(["-i", input_file, "-o", db_file] + list(extra_args))
+
+
+def _query(db_file, query):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute(query).fetchall()
+    conn.close()
+    return rows
+
+
+class TestBulkLoad:
+    def test_indexes(self, tmpdir):
+        db_file = os.path.join(str(tmpdir), "workitems.sqlite3")
+        assert _load_csv(db_file) == 0
+        indexes = _query(db_file, "SELECT name FROM sqlite_master WHERE type = 'index'")
+        assert sorted(row[0] for row in indexes) == [
+            "testcases_exported",
+            "testcases_id",
+            "testcases_not_exported",
+            "testcases_verdict",
+        ]
+        assert _query(db_file, "PRAGMA journal_mode") == [("wal",)]
+
+    def test_existing_db(self, tmpdir, captured_log):
+        db_file = os.path.join(str(tmpdir), "workitems.sqlite3")
+        assert _load_csv(db_file) == 0
+        assert _load_csv(db_file) == 1
+        assert "use '--append' or '--merge'" in captured_log.getvalue()
+        assert _query(db_file, "SELECT count(*) FROM testcases") == [(15,)]
+
+    def test_append(self, tmpdir):
+        db_file = os.path.join(str(tmpdir), "workitems.sqlite3")
+        assert _load_csv(db_file, "--append") == 0
+        assert _load_csv(db_file, "--append") == 0
+        assert _query(db_file, "SELECT count(*) FROM testcases") == [(30,)]
+        assert _query(db_file, "SELECT testrun FROM testrun") == [("5_8_0_17",)]
+
+    def test_merge(self, tmpdir):
+        db_file = os.path.join(str(tmpdir), "workitems.sqlite3")
+        assert _load_csv(db_file) == 0
+        dbtools.mark_exported_sqlite(db_file)
+        assert _load_csv(db_file, "--merge") == 0
+        assert _query(db_file, "SELECT count(*) FROM testcases") == [(15,)]
+        # the merged records replaced the exported records
+        assert len(dbtools.import_sqlite(db_file).results) == 15
+
+    def test_merge_new_column(self, tmpdir, captured_log):
+        db_file = os.path.join(str(tmpdir), "workitems.sqlite3")
+        assert _load_csv(db_file) == 0
+        records = ImportedData(
+            results=iter([{"id": "RHCF3-9313", "title": "test_new", "newcol": "value"}]),
+            testrun="other",
+        )
+        csv2sqlite_cli.dump2sqlite(records, db_file, mode=csv2sqlite_cli.MODE_MERGE)
+        assert _query(db_file, "SELECT count(*) FROM testcases") == [(15,)]
+        assert _query(db_file, "SELECT title, newcol FROM testcases WHERE id = 'RHCF3-9313'") == [
+            ("test_new", "value")
+        ]
+        assert _query(db_file, "SELECT testrun FROM testrun") == [("5_8_0_17",)]
+        assert "differs from test run id '5_8_0_17'" in captured_log.getvalue()
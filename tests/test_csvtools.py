@@ -15,7 +15,7 @@ class TestCSVFileldNames:
         csv_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
         with open(csv_file, encoding="utf-8") as input_file:
             reader = csvtools._get_csv_reader(input_file)
-            fieldnames = csvtools._get_csv_fieldnames(reader)
+            fieldnames, __ = csvtools._get_csv_header(reader)
         assert fieldnames == [
             "id",
             "title",
@@ -33,7 +33,7 @@ class TestCSVFileldNames:
         csv_content = ",,ID,Title,Test Case I D,Caseimportance"
         input_file = StringIO(csv_content)
         reader = csvtools._get_csv_reader(input_file)
-        fieldnames = csvtools._get_csv_fieldnames(reader)
+        fieldnames, __ = csvtools._get_csv_header(reader)
         input_file.close()
         assert fieldnames == ["field1", "field2", "id", "title", "testcaseid", "caseimportance"]
 
@@ -41,7 +41,7 @@ class TestCSVFileldNames:
         csv_content = "ID,Title,Test Case I D,Caseimportance,,,"
         input_file = StringIO(csv_content)
         reader = csvtools._get_csv_reader(input_file)
-        fieldnames = csvtools._get_csv_fieldnames(reader)
+        fieldnames, __ = csvtools._get_csv_header(reader)
         input_file.close()
         assert fieldnames == ["id", "title", "testcaseid", "caseimportance"]
 
@@ -49,7 +49,7 @@ class TestCSVFileldNames:
         csv_content = "Title,Test Case I D,Caseimportance,,,"
         input_file = StringIO(csv_content)
         reader = csvtools._get_csv_reader(input_file)
-        fieldnames = csvtools._get_csv_fieldnames(reader)
+        fieldnames, __ = csvtools._get_csv_header(reader)
         input_file.close()
         assert fieldnames is None
 
@@ -59,7 +59,7 @@ class TestCSVTestrunId:
         csv_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
         with open(csv_file, encoding="utf-8") as input_file:
             reader = csvtools._get_csv_reader(input_file)
-            testrun_id = csvtools._get_testrun_from_csv(input_file, reader)
+            __, testrun_id = csvtools._get_csv_header(reader)
         assert testrun_id == "5_8_0_17"
 
     def test_testrun_id_line(self):
@@ -70,7 +70,7 @@ class TestCSVTestrunId:
         )
         input_file = StringIO(csv_content)
         reader = csvtools._get_csv_reader(input_file)
-        testrun_id = csvtools._get_testrun_from_csv(input_file, reader)
+        __, testrun_id = csvtools._get_csv_header(reader)
         assert testrun_id == "5_8_0_17"
 
     def test_testrun_id_far(self):
@@ -81,10 +81,18 @@ class TestCSVTestrunId:
         )
         input_file = StringIO(csv_content)
         reader = csvtools._get_csv_reader(input_file)
-        testrun_id = csvtools._get_testrun_from_csv(input_file, reader)
+        __, testrun_id = csvtools._get_csv_header(reader)
         assert not testrun_id
 
 
+class NonSeekableIO(StringIO):
+    def seekable(self):
+        return False
+
+    def seek(self, *args, **kwargs):
+        raise OSError("not seekable")
+
+
 class TestCSVImport:
     def test_import_orig_data(self):
         csv_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
@@ -95,6 +103,50 @@ class TestCSVImport:
         assert hasattr(data, "testrun")
         assert data.testrun == "5_8_0_17"
 
+    def test_import_lazy(self):
+        csv_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+        data = csvtools.import_csv(csv_file, lazy=True)
+        assert not isinstance(data.results, list)
+        assert data.testrun == "5_8_0_17"
+        assert list(data.results) == csvtools.import_csv(csv_file).results
+
+    @pytest.mark.parametrize("lazy", (False, True), ids=("list", "lazy"))
+    def test_import_nonseekable(self, lazy):
+        csv_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+        with open(csv_file, encoding="utf-8") as input_file:
+            input_obj = NonSeekableIO(input_file.read())
+        data = csvtools.import_csv(input_obj, lazy=lazy)
+        assert data.testrun == "5_8_0_17"
+        assert list(data.results) == csvtools.import_csv(csv_file).results
+
+    def test_import_duplicate_columns(self, tmpdir):
+        csv_file = tmpdir.join("duplicate.csv")
+        csv_file.write("ID,Title,Verdict,Title,Comment\nRHCF3-1,t1,passed,t1b,c\n")
+        data = csvtools.import_csv(str(csv_file))
+        assert dict(data.results[0]) == {
+            "id": "RHCF3-1",
+            "title": "t1b",
+            "verdict": "passed",
+            "comment": "c",
+        }
+
+    def test_header_read_once(self):
+        csv_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+        with open(csv_file, encoding="utf-8") as input_file:
+            reader = csvtools._get_csv_reader(input_file)
+            fieldnames, testrun_id = csvtools._get_csv_header(reader)
+            first_row = next(reader)
+        assert testrun_id == "5_8_0_17"
+        assert fieldnames[0] == "id"
+        assert first_row[0] == "RHCF3-9313"
+
+    def test_import_lazy_no_results(self, tmpdir):
+        csv_file = tmpdir.join("no_results.csv")
+        csv_file.write("ID,Title,Test Case I D,Caseimportance,,,")
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            csvtools.get_imported_data(str(csv_file), lazy=True)
+        assert "No results read from CSV file" in str(excinfo.value)
+
     def test_import_no_results(self, tmpdir):
         csv_content = "ID,Title,Test Case I D,Caseimportance,,,"
         csv_file = tmpdir.join("no_results.csv")
@@ -116,3 +168,7 @@ class TestCSVImport:
         with pytest.raises(Dump2PolarionException) as excinfo:
             csvtools.import_csv(csv_file_path)
         assert "missing following columns: Verdict" in str(excinfo.value)
+
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            csvtools.import_csv(csv_file_path, lazy=True)
+        assert "missing following columns: Verdict" in str(excinfo.value)
@@ -1,8 +1,11 @@
 # pylint: disable=missing-docstring,redefined-outer-name,no-self-use,protected-access
 
 import datetime
+import multiprocessing
 import os
 import shutil
+import sqlite3
+import threading
 
 import pytest
 
@@ -12,6 +15,19 @@ from dump2polarion.results import dbtools
 from tests import conf
 
 
+@pytest.fixture
+def db_copy(tmpdir):
+    db_file = os.path.join(str(tmpdir), "workitems_copy.sqlite3")
+    shutil.copy(os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3"), db_file)
+    return db_file
+
+
+def _claim_ids(db_file_worker):
+    db_file, worker = db_file_worker
+    records = dbtools.import_sqlite(db_file, claim_batch=4, claimed_by=worker)
+    return [record["id"] for record in records.results]
+
+
 @pytest.fixture(scope="module")
 def records_db():
     db_file = os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3")
@@ -45,6 +61,24 @@ class TestDB:
         assert hasattr(records, "results")
         assert len(records.results) == 14
 
+    def test_import_lazy(self, records_db):
+        db_file = os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3")
+        records = dbtools.import_sqlite(db_file, lazy=True)
+        assert not isinstance(records.results, list)
+        assert records.testrun == "5_8_0_17"
+        assert list(records.results) == records_db.results
+
+    def test_import_rowids(self, records_db, monkeypatch):
+        db_file = os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3")
+        # fetch in several batches
+        monkeypatch.setattr(dbtools, "_FETCH_SIZE", 4)
+        records = dbtools.import_sqlite(db_file)
+        assert records.results == records_db.results
+        assert "rowid" not in records.results[0]
+        rowids = [record.rowid for record in records.results]
+        assert len(set(rowids)) == 15
+        assert {record.db_file for record in records.results} == {db_file}
+
     def test_open_nonexistent(self):
         db_file = "nonexistent"
         with pytest.raises(Dump2PolarionException) as excinfo:
@@ -78,6 +112,38 @@ class TestDB:
         conn.close()
         assert num[0] == 13
 
+    def test_exported_rowids(self, tmpdir, monkeypatch):
+        orig_db_file = os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3")
+        db_file = os.path.join(str(tmpdir), "workitems_copy.sqlite3")
+        shutil.copy(orig_db_file, db_file)
+        records = dbtools.import_sqlite(db_file)
+        exported_rows = dbtools.ExportedRows()
+        for record in records.results[:5]:
+            exported_rows(record)
+        exported_rows({"id": "not_from_db"})
+        # mark in several transactions
+        monkeypatch.setattr(dbtools, "_MARK_CHUNK_SIZE", 2)
+        dbtools.mark_exported_sqlite(db_file, rowids=exported_rows.get(db_file))
+
+        remaining = dbtools.import_sqlite(db_file)
+        assert remaining.results == records.results[5:]
+        conn = dbtools._open_sqlite(db_file)
+        cur = conn.cursor()
+        cur.execute("EXPLAIN QUERY PLAN SELECT * FROM testcases WHERE exported != 'yes'")
+        plan = " ".join(str(row) for row in cur.fetchall())
+        conn.close()
+        assert "testcases_not_exported" in plan
+
+    def test_exported_rowids_other_db(self, tmpdir):
+        orig_db_file = os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3")
+        db_file = os.path.join(str(tmpdir), "workitems_copy.sqlite3")
+        shutil.copy(orig_db_file, db_file)
+        exported_rows = dbtools.ExportedRows()
+        for record in dbtools.import_sqlite(orig_db_file).results:
+            exported_rows(record)
+        dbtools.mark_exported_sqlite(db_file, rowids=exported_rows.get(db_file))
+        assert len(dbtools.import_sqlite(db_file).results) == 15
+
     def test_e2e_ids_notransform(self, config_prop, records_db):
         exporter = XunitExport("5_8_0_17", records_db, config_prop, transform_func=lambda arg: arg)
         complete = exporter.export()
@@ -93,3 +159,86 @@ class TestDB:
         with open(os.path.join(conf.DATA_PATH, fname), encoding="utf-8") as input_xml:
             parsed = input_xml.read()
         assert complete == parsed
+
+
+class TestClaim:
+    def test_claim_disjoint(self, db_copy, records_db):
+        first = dbtools.import_sqlite(db_copy, claim_batch=10, claimed_by="first")
+        second = dbtools.import_sqlite(db_copy, claim_batch=10, claimed_by="second")
+        assert len(first.results) == 10
+        assert len(second.results) == 5
+        assert first.testrun == second.testrun == "5_8_0_17"
+        ids = {record.rowid for record in first.results} | {
+            record.rowid for record in second.results
+        }
+        assert len(ids) == 15
+        assert not dbtools.import_sqlite(db_copy, claim_batch=10, claimed_by="third").results
+        # claimed rows are still imported when not claiming
+        assert len(dbtools.import_sqlite(db_copy).results) == 15
+
+        conn = dbtools._open_sqlite(db_copy)
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        conn.close()
+        assert mode == "wal"
+
+    def test_claim_older_than(self, db_copy):
+        older_than = datetime.datetime(2017, 6, 15)
+        records = dbtools.import_sqlite(
+            db_copy, older_than=older_than, claim_batch=20, claimed_by="first"
+        )
+        assert len(records.results) == 14
+        assert len(dbtools.import_sqlite(db_copy, claim_batch=20, claimed_by="second").results) == 1
+
+    def test_claim_release(self, db_copy):
+        first = dbtools.import_sqlite(db_copy, claim_batch=10, claimed_by="first")
+        dbtools.mark_exported_sqlite(db_copy, rowids=[record.rowid for record in first.results[:3]])
+        dbtools.release_claimed_sqlite(db_copy, "second")
+        assert len(dbtools.import_sqlite(db_copy, claim_batch=20, claimed_by="second").results) == 5
+        dbtools.release_claimed_sqlite(db_copy, "first")
+        # exported rows are not claimed again
+        assert len(dbtools.import_sqlite(db_copy, claim_batch=20, claimed_by="third").results) == 7
+        dbtools.release_claimed_sqlite(db_copy)
+        assert (
+            len(dbtools.import_sqlite(db_copy, claim_batch=20, claimed_by="fourth").results) == 12
+        )
+
+    def test_release_not_claimed(self, db_copy):
+        dbtools.release_claimed_sqlite(db_copy)
+        assert len(dbtools.import_sqlite(db_copy).results) == 15
+
+    def test_enable_wal_locked(self, db_copy):
+        locker = sqlite3.connect(db_copy, isolation_level=None, check_same_thread=False)
+        locker.execute("BEGIN IMMEDIATE")
+        conn = dbtools._open_sqlite(db_copy)
+        timer = threading.Timer(0.2, locker.rollback)
+        timer.start()
+        try:
+            dbtools.enable_wal(conn)
+        finally:
+            timer.join()
+            locker.close()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+    def test_enable_wal_locked_timeout(self, db_copy):
+        locker = sqlite3.connect(db_copy, isolation_level=None, check_same_thread=False)
+        locker.execute("BEGIN IMMEDIATE")
+        conn = dbtools._open_sqlite(db_copy)
+        try:
+            with pytest.raises(sqlite3.OperationalError):
+                dbtools.enable_wal(conn, timeout=0.1)
+        finally:
+            conn.close()
+            locker.close()
+
+    def test_claim_concurrent(self, db_copy):
+        # the database is switched to WAL when created by csv2sqlite
+        conn = dbtools._open_sqlite(db_copy)
+        dbtools.enable_wal(conn)
+        conn.close()
+        workers = ["worker{}".format(num) for num in range(5)]
+        with multiprocessing.Pool(5) as pool:
+            claimed = pool.map(_claim_ids, [(db_copy, worker) for worker in workers])
+        all_ids = [record_id for ids in claimed for record_id in ids]
+        assert len(all_ids) == 15
+        assert len(set(all_ids)) == 15
@@ -0,0 +1,102 @@
+# pylint: disable=missing-docstring,redefined-outer-name,no-self-use
+
+import os
+import shutil
+import time
+
+import pytest
+from mock import patch
+
+from dump2polarion.results import importcache, registry
+from dump2polarion.results.importer import import_results
+from dump2polarion.results.junittools import import_junit
+from tests import conf
+
+
+@pytest.fixture
+def junit_file(tmpdir):
+    input_file = str(tmpdir.join("junit-report.xml"))
+    shutil.copy(os.path.join(conf.DATA_PATH, "junit-report.xml"), input_file)
+    return input_file
+
+
+@pytest.fixture
+def cache_dir(tmpdir):
+    return str(tmpdir.join("cache"))
+
+
+def _entries(cache_dir):
+    return sorted(fname for fname in os.listdir(cache_dir) if fname.endswith(".pickle.gz"))
+
+
+class TestImportCache:
+    def test_cached(self, junit_file, cache_dir, captured_log):
+        imported = import_results(junit_file, cache_dir=cache_dir)
+        assert len(_entries(cache_dir)) == 1
+        assert "Using cached data" not in captured_log.getvalue()
+        with patch("dump2polarion.results.junittools._iter_testcases") as parse_mock:
+            cached = import_results(junit_file, cache_dir=cache_dir)
+        assert not parse_mock.called
+        assert "Using cached data" in captured_log.getvalue()
+        assert cached == imported
+        assert cached.results == import_junit(junit_file).results
+
+    def test_lazy(self, junit_file, cache_dir):
+        imported = import_results(junit_file, cache_dir=cache_dir, lazy=True)
+        assert isinstance(imported.results, list)
+        # `older_than` doesn't change the key
+        import_results(junit_file, cache_dir=cache_dir, older_than=time.time())
+        assert len(_entries(cache_dir)) == 1
+
+    def test_changed_file(self, junit_file, cache_dir):
+        import_results(junit_file, cache_dir=cache_dir)
+        with open(junit_file, "a", encoding="utf-8") as out_file:
+            out_file.write("\n")
+        import_results(junit_file, cache_dir=cache_dir)
+        assert len(_entries(cache_dir)) == 2
+
+    def test_corrupted(self, junit_file, cache_dir, captured_log):
+        import_results(junit_file, cache_dir=cache_dir)
+        entry_file = os.path.join(cache_dir, _entries(cache_dir)[0])
+        with open(entry_file, "wb") as out_file:
+            out_file.write(b"corrupted")
+        imported = import_results(junit_file, cache_dir=cache_dir)
+        assert len(imported.results) == len(import_junit(junit_file).results)
+        assert "Using cached data" not in captured_log.getvalue()
+
+    def test_not_cacheable(self, tmpdir):
+        db_file = str(tmpdir.join("workitems.sqlite3"))
+        shutil.copy(os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3"), db_file)
+        assert not importcache.is_cacheable(db_file, registry.get_spec("sqlite"))
+        assert not importcache.is_cacheable(
+            "https://example.com/ostriz/results", registry.get_spec("ostriz")
+        )
+        assert not importcache.is_cacheable(
+            str(tmpdir.join("nonexistent.xml")), registry.get_spec("junit")
+        )
+
+    def test_sqlite_any_ext(self, tmpdir, cache_dir):
+        db_file = str(tmpdir.join("results.bin"))
+        shutil.copy(os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3"), db_file)
+        imported = import_results(db_file, cache_dir=cache_dir)
+        assert len(imported.results) == 15
+        assert not os.path.exists(cache_dir) or not _entries(cache_dir)
+
+    def test_evict_age(self, cache_dir, junit_file):
+        import_results(junit_file, cache_dir=cache_dir)
+        entry_file = os.path.join(cache_dir, _entries(cache_dir)[0])
+        old = time.time() - importcache.MAX_AGE - 1
+        os.utime(entry_file, (old, old))
+        importcache.evict(cache_dir)
+        assert not _entries(cache_dir)
+
+    def test_evict_size(self, cache_dir):
+        os.makedirs(cache_dir)
+        for num in range(3):
+            entry_file = os.path.join(cache_dir, "{}.pickle.gz".format(num))
+            with open(entry_file, "wb") as out_file:
+                out_file.write(b"x" * 10)
+            mtime = time.time() - 10 + num
+            os.utime(entry_file, (mtime, mtime))
+        importcache.evict(cache_dir, max_size=20)
+        assert _entries(cache_dir) == ["1.pickle.gz", "2.pickle.gz"]
@@ -1,13 +1,28 @@
 # pylint: disable=missing-docstring,redefined-outer-name,no-self-use,comparison-with-callable
 
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+
 import pytest
+from mock import patch
 
 from dump2polarion.exceptions import Dump2PolarionException
 from dump2polarion.results.csvtools import import_csv
 from dump2polarion.results.dbtools import SQLITE_EXT, import_sqlite
-from dump2polarion.results.importer import _get_importer
+from dump2polarion.results.importer import (
+    STDIN,
+    _get_import_inputs,
+    _get_importer,
+    expand_input_files,
+    import_results,
+)
 from dump2polarion.results.junittools import import_junit
 from dump2polarion.results.ostriztools import import_ostriz
+from tests import conf
 
 
 class TestImporterFormats:
@@ -34,7 +49,187 @@ class TestImporterFormats:
         importer = _get_importer("workitems{}".format(ext))
         assert importer == import_sqlite
 
+    @pytest.mark.parametrize("ext", (".gz", ".xz", ".bz2"))
+    def test_compressed(self, ext):
+        assert _get_importer("test_junit.xml" + ext) == import_junit
+        assert _get_importer("workitems.CSV" + ext) == import_csv
+        assert _get_importer("test_ostriz_file.json" + ext) == import_ostriz
+
+    def test_compressed_db(self):
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            _get_importer("workitems.sqlite3.gz")
+        assert "Compressed SQLite database is not supported" in str(excinfo.value)
+
     def test_invalid(self):
         with pytest.raises(Dump2PolarionException) as excinfo:
             _get_importer("workitems.txt")
         assert "Cannot recognize type of input data, add file extension" in str(excinfo.value)
+
+
+def _copy_data(fname, dest):
+    shutil.copy(os.path.join(conf.DATA_PATH, fname), str(dest))
+    return str(dest)
+
+
+def _stdin(content):
+    return io.TextIOWrapper(io.BufferedReader(io.BytesIO(content)), encoding="utf-8")
+
+
+class TestImporterSniff:
+    @pytest.mark.parametrize(
+        "fname,importer",
+        (
+            ("junit-report.xml", import_junit),
+            ("ostriz.json", import_ostriz),
+            ("workitems_ids.csv", import_csv),
+            ("workitems_ids.sqlite3", import_sqlite),
+        ),
+    )
+    def test_no_ext(self, tmpdir, fname, importer):
+        input_file = _copy_data(fname, tmpdir.join("results"))
+        assert _get_importer(input_file) == importer
+
+    def test_content_over_name(self, tmpdir):
+        ostriz_file = _copy_data("ostriz.json", tmpdir.join("results.json"))
+        assert _get_importer(ostriz_file) == import_ostriz
+        csv_file = _copy_data("workitems_ids.csv", tmpdir.join("ostriz_export.csv"))
+        assert _get_importer(csv_file) == import_csv
+
+    def test_not_recognized(self, tmpdir):
+        input_file = tmpdir.join("results")
+        input_file.write("not recognized")
+        with patch("dump2polarion.results.registry._iter_entry_points", return_value=[]):
+            with pytest.raises(Dump2PolarionException) as excinfo:
+                _get_importer(str(input_file))
+        assert "Cannot recognize type of input data" in str(excinfo.value)
+
+    def test_compressed_db_content(self, tmpdir):
+        with open(os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3"), "rb") as input_file:
+            content = input_file.read()
+        db_file = tmpdir.join("workitems")
+        db_file.write_binary(gzip.compress(content))
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            _get_importer(str(db_file))
+        assert "Compressed SQLite database is not supported" in str(excinfo.value)
+
+
+class TestImportStdin:
+    @pytest.mark.parametrize("compress", (None, gzip.compress, lzma.compress))
+    @pytest.mark.parametrize(
+        "fname,importer",
+        (
+            ("junit-report.xml", import_junit),
+            ("ostriz.json", import_ostriz),
+            ("workitems_ids.csv", import_csv),
+        ),
+    )
+    def test_stdin(self, monkeypatch, fname, importer, compress):
+        input_file = os.path.join(conf.DATA_PATH, fname)
+        with open(input_file, "rb") as input_data:
+            content = input_data.read()
+        if compress:
+            content = compress(content)
+        monkeypatch.setattr("sys.stdin", _stdin(content))
+        data = import_results(STDIN, lazy=True)
+        assert list(data.results) == list(importer(input_file).results)
+
+    def test_stdin_db(self, monkeypatch):
+        with open(os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3"), "rb") as input_data:
+            monkeypatch.setattr("sys.stdin", _stdin(input_data.read()))
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            import_results(STDIN)
+        assert "The 'sqlite' input data can't be read from standard input" in str(excinfo.value)
+
+    def test_stdin_multiple(self):
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            import_results([STDIN, os.path.join(conf.DATA_PATH, "junit-report.xml")])
+        assert "Standard input can't be combined" in str(excinfo.value)
+
+
+@pytest.fixture
+def results_dir(tmpdir):
+    for fname in ("junit-report.xml", "junit-report-params.xml", "workitems_ids.csv"):
+        shutil.copy(os.path.join(conf.DATA_PATH, fname), str(tmpdir))
+    tmpdir.join("notes.txt").write("not imported")
+    return tmpdir
+
+
+class TestImportMultiple:
+    def test_expand_dir(self, results_dir):
+        input_files = expand_input_files(str(results_dir))
+        assert [os.path.basename(fname) for fname in input_files] == [
+            "junit-report-params.xml",
+            "junit-report.xml",
+            "workitems_ids.csv",
+        ]
+
+    def test_expand_glob(self, results_dir):
+        input_files = expand_input_files(str(results_dir.join("junit-*.xml")))
+        assert len(input_files) == 2
+
+    def test_expand_remote(self):
+        location = "http://trackerbot/ostriz/jenkins?build=1"
+        assert expand_input_files(location) == [location]
+
+    def test_expand_nothing(self, results_dir):
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            expand_input_files(str(results_dir.join("*.json")))
+        assert "No input files found" in str(excinfo.value)
+
+    @pytest.mark.parametrize("jobs", (1, 2))
+    def test_import_dir(self, results_dir, jobs):
+        data = import_results(str(results_dir), jobs=jobs)
+        assert len(data.results) == 2 + 7 + 15
+        assert data.testrun == "5_8_0_17"
+
+    def test_import_compressed_dir(self, tmpdir):
+        for fname, ext, compressor in (
+            ("junit-report.xml", ".gz", gzip),
+            ("junit-report-params.xml", ".xz", lzma),
+            ("workitems_ids.csv", ".bz2", bz2),
+        ):
+            with open(os.path.join(conf.DATA_PATH, fname), "rb") as input_file:
+                content = input_file.read()
+            tmpdir.join(fname + ext).write_binary(compressor.compress(content))
+        data = import_results(str(tmpdir))
+        assert len(data.results) == 2 + 7 + 15
+        assert data.testrun == "5_8_0_17"
+
+    def test_import_compressed_json(self, tmpdir):
+        with open(os.path.join(conf.DATA_PATH, "ostriz.json"), "rb") as input_file:
+            content = input_file.read()
+        ostriz_file = tmpdir.join("ostriz.json.xz")
+        ostriz_file.write_binary(lzma.compress(content))
+        data = import_results(str(ostriz_file))
+        assert data == import_ostriz(os.path.join(conf.DATA_PATH, "ostriz.json"))
+
+    def test_import_list(self, results_dir):
+        junit_file = str(results_dir.join("junit-report.xml"))
+        data = import_results([junit_file, junit_file], jobs=2)
+        assert data.results == import_junit(junit_file).results * 2
+        assert data.testrun is None
+
+    def test_import_testrun_conflict(self, results_dir, captured_log):
+        csv_content = results_dir.join("workitems_ids.csv").read()
+        results_dir.join("workitems_other.csv").write(csv_content.replace("5_8_0_17", "5_9_0_1"))
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            import_results(str(results_dir.join("*.csv")))
+        assert "The test run ids found in input files differ" in str(excinfo.value)
+
+        data = import_results(str(results_dir.join("*.csv")), force=True)
+        assert data.testrun == "5_8_0_17"
+        assert "The test run ids found in input files differ" in captured_log.getvalue()
+
+    def test_import_inputs_grouped(self):
+        inputs = _get_import_inputs(
+            ["a.csv", "ostriz_1.json", "b.xml", "http://ostriz/api", "ostriz_2.json"]
+        )
+        assert inputs == ["a.csv", ["ostriz_1.json", "http://ostriz/api", "ostriz_2.json"], "b.xml"]
+
+    def test_import_mixed_sources(self, results_dir):
+        ostriz_file = os.path.join(conf.DATA_PATH, "ostriz.json")
+        csv_file = str(results_dir.join("workitems_ids.csv"))
+        data = import_results([ostriz_file, csv_file, ostriz_file], jobs=2)
+        # the same Ostriz results are merged
+        assert len(data.results) == 6 + 15
+        assert data.testrun == "5_8_0_17"
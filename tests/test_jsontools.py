@@ -1,5 +1,6 @@
 # pylint: disable=missing-docstring,redefined-outer-name,no-self-use,protected-access
 
+import json
 import os
 from io import StringIO
 
@@ -39,3 +40,76 @@ class TestJSONImport:
             jsontools.import_json(input_file)
         input_file.close()
         assert "Cannot load results from" in str(excinfo.value)
+
+    def test_import_lazy(self):
+        json_file = os.path.join(conf.DATA_PATH, "test_run_import.json")
+        data = jsontools.import_json(json_file, lazy=True)
+        assert not isinstance(data.results, list)
+        assert list(data.results) == jsontools.import_json(json_file).results
+
+    def test_missing_results(self, tmpdir):
+        json_file = tmpdir.join("no_results.json")
+        json_file.write('{"foo": [1, 2]}')
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            jsontools.import_json(str(json_file))
+        assert "Cannot load results from" in str(excinfo.value)
+        assert "results" in str(excinfo.value)
+
+
+class TestIterJSONArray:
+    @pytest.mark.parametrize("chunk_size", (1, 3, 7, 64 * 1024))
+    def test_same_as_load(self, chunk_size):
+        json_file = os.path.join(conf.DATA_PATH, "test_run_import.json")
+        with open(json_file, encoding="utf-8") as input_json:
+            loaded = json.load(input_json)["results"]
+        with open(json_file, encoding="utf-8") as input_json:
+            items = list(jsontools._iter_json_array(input_json, "results", chunk_size=chunk_size))
+        assert items == loaded
+
+    @pytest.mark.parametrize("chunk_size", (1, 2, 5, 100))
+    def test_other_keys(self, chunk_size):
+        content = (
+            '{"meta": {"results": [0], "text": "a ] } ,"}, "count": 12345,\n'
+            ' "results" : [ {"id": 1}, 12345, "x", [1, {"a": null}], true ] , "tail": 1}'
+        )
+        items = list(jsontools._iter_json_array(StringIO(content), "results", chunk_size))
+        assert items == [{"id": 1}, 12345, "x", [1, {"a": None}], True]
+
+    @pytest.mark.parametrize("content", ('{"results": []}', '{"results":[ ]}'))
+    def test_empty(self, content):
+        assert not list(jsontools._iter_json_array(StringIO(content), "results"))
+
+    @pytest.mark.parametrize(
+        "content", ("{}", "", "[]", '{"results": [{"id": 1}', '{"results": [{"id": 1} {}]}')
+    )
+    def test_invalid(self, content):
+        with pytest.raises((KeyError, ValueError)):
+            list(jsontools._iter_json_array(StringIO(content), "results", chunk_size=4))
+
+    @pytest.mark.parametrize("chunk_size", range(1, 12))
+    def test_truncated_values(self, chunk_size):
+        content = '{"results": [12345.5, 1e3, -Infinity, "a\\u00e9b", null, true]}'
+        items = list(jsontools._iter_json_array(StringIO(content), "results", chunk_size))
+        assert items == [12345.5, 1000.0, float("-inf"), "a\u00e9b", None, True]
+
+    def test_big_value_reads(self):
+        reads = []
+
+        class _CountingIO(StringIO):
+            def read(self, size=-1):
+                reads.append(size)
+                return super().read(size)
+
+        content = json.dumps({"results": [{"id": "a" * 1024 * 1024}, 1]})
+        items = list(jsontools._iter_json_array(_CountingIO(content), "results", chunk_size=1024))
+        assert items == [{"id": "a" * 1024 * 1024}, 1]
+        # the read size grows while the big value is incomplete
+        assert len(reads) < 20
+
+    @pytest.mark.parametrize("record", ('{"id": x}', "tru e", '"a\\u12x4"', '{"id" 1}'))
+    def test_malformed_not_read(self, record):
+        content = '{"results": [' + record + ", " + ", ".join(['{"id": 1}'] * 10000) + "]}"
+        input_json = StringIO(content)
+        with pytest.raises(ValueError):
+            list(jsontools._iter_json_array(input_json, "results", chunk_size=16))
+        assert input_json.tell() < 100
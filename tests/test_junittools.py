@@ -49,3 +49,26 @@ class TestJunitImport:
         assert list(data.results[1]["params"].keys()) == ["api_ver", "package"]
         assert data.results[0]["id"] == "foobar"
         assert data.results[1]["id"] == "barbaz"
+
+    def test_iter_records(self):
+        junit_file = os.path.join(conf.DATA_PATH, "junit-report.xml")
+        records = junittools.iter_junit_records(junit_file)
+        assert not isinstance(records, list)
+        assert list(records) == junittools.import_junit(junit_file).results
+
+    def test_import_lazy(self):
+        junit_file = os.path.join(conf.DATA_PATH, "junit-report.xml")
+        data = junittools.import_junit(junit_file, lazy=True)
+        assert not isinstance(data.results, list)
+        assert list(data.results) == junittools.import_junit(junit_file).results
+
+    def test_processed_testcases_discarded(self):
+        junit_file = os.path.join(conf.DATA_PATH, "junit-report.xml")
+        testcases_num = 0
+        for testcase in junittools._iter_testcases(junit_file):
+            testcases_num += 1
+            assert testcase.getprevious() is None
+        assert testcases_num == 7
+        # processed testcases were cleared and removed from the tree
+        assert len(testcase.getparent()) == 1
+        assert not len(testcase)
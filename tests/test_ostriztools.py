@@ -1,13 +1,17 @@
 # pylint: disable=missing-docstring,redefined-outer-name,no-self-use,protected-access
 
+import hashlib
+import http.server
+import json
 import os
+import threading
 
 import pytest
-from mock import Mock, patch
 
-from dump2polarion.exceptions import Dump2PolarionException
+from dump2polarion.exceptions import Dump2PolarionException, NothingToDoException
 from dump2polarion.exporters.xunit_exporter import XunitExport
 from dump2polarion.results import ostriztools
+from dump2polarion.results.importer import import_results
 from tests import conf
 
 
@@ -17,6 +21,61 @@ def records_json():
     return ostriztools.import_ostriz(json_file)
 
 
+class OstrizHandler(http.server.BaseHTTPRequestHandler):
+    """Serve Ostriz JSON data, support revalidation using ETag."""
+
+    # pylint: disable=invalid-name
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        content = self.server.content
+        if content is None:
+            self.send_error(404)
+            return
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ostriz_server():
+    server = http.server.HTTPServer(("127.0.0.1", 0), OstrizHandler)
+    server.requests = []
+    with open(os.path.join(conf.DATA_PATH, "ostriz.json"), "rb") as input_json:
+        server.content = input_json.read()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thread.start()
+    server.url = "http://127.0.0.1:{}/ostriz".format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def ostriz_sources(tmpdir):
+    """Split the Ostriz data into two sources."""
+    with open(os.path.join(conf.DATA_PATH, "ostriz.json"), encoding="utf-8") as input_json:
+        tests = list(json.load(input_json)["tests"].items())
+    sources = []
+    for num, part in enumerate((tests[:3], tests[3:])):
+        json_file = os.path.join(str(tmpdir), "ostriz_{}.json".format(num))
+        with open(json_file, "w", encoding="utf-8") as out_json:
+            json.dump({"tests": dict(part)}, out_json)
+        sources.append(json_file)
+    return sources
+
+
 @pytest.fixture(scope="module")
 def records_json_search():
     json_file = os.path.join(conf.DATA_PATH, "ostriz_search.json")
@@ -66,22 +125,41 @@ class TestOstriz:
             ostriztools.import_ostriz(os.path.join(conf.DATA_PATH, fname))
         assert "Failed to parse JSON" in str(excinfo.value)
 
-    def test_remote_invalid_json(self):
-        with patch("requests.get", return_value=False):
-            with pytest.raises(Dump2PolarionException) as excinfo:
-                ostriztools.import_ostriz("https://foo")
+    def test_remote_invalid_json(self, ostriz_server, tmpdir):
+        ostriz_server.content = None
+        with pytest.raises(Dump2PolarionException) as excinfo:
+            ostriztools.import_ostriz(ostriz_server.url, cache_dir=str(tmpdir))
         assert "Failed to parse JSON" in str(excinfo.value)
+        assert "Failed to download" in str(excinfo.value)
 
-    def test_remote_json(self, records_json):
-        json_file = os.path.join(conf.DATA_PATH, "ostriz.json")
-        with open(json_file, encoding="utf-8") as input_json:
-            parsed = input_json.read()
-        retval = Mock()
-        retval.text = parsed
-        with patch("requests.get", return_value=retval):
-            loaded_json = ostriztools.import_ostriz("https://foo")
+    def test_remote_json(self, records_json, ostriz_server, tmpdir):
+        loaded_json = ostriztools.import_ostriz(ostriz_server.url, cache_dir=str(tmpdir))
         assert loaded_json == records_json
 
+    def test_remote_json_cached(self, records_json, ostriz_server, tmpdir):
+        for __ in range(2):
+            loaded_json = ostriztools.import_ostriz(ostriz_server.url, cache_dir=str(tmpdir))
+            assert loaded_json == records_json
+        assert "If-None-Match" not in ostriz_server.requests[0]
+        # the cached data were revalidated and not downloaded again
+        assert ostriz_server.requests[1]["If-None-Match"]
+        assert len(tmpdir.listdir()) == 2
+
+    def test_remote_json_changed(self, ostriz_server, tmpdir):
+        ostriztools.import_ostriz(ostriz_server.url, cache_dir=str(tmpdir))
+        ostriz_server.content = ostriz_server.content.replace(b"5.8.0.17", b"5.9.0.1")
+        loaded_json = ostriztools.import_ostriz(ostriz_server.url, cache_dir=str(tmpdir))
+        assert loaded_json.testrun == "5_9_0_1"
+        loaded_json = ostriztools.import_ostriz(ostriz_server.url, cache_dir=str(tmpdir))
+        assert loaded_json.testrun == "5_9_0_1"
+
+    def test_remote_json_default_cache(self, records_json, ostriz_server, tmpdir, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir))
+        assert ostriztools.get_cache_dir() == os.path.join(str(tmpdir), "dump2polarion", "ostriz")
+        loaded_json = ostriztools.import_ostriz(ostriz_server.url)
+        assert loaded_json == records_json
+        assert len(os.listdir(ostriztools.get_cache_dir())) == 2
+
     def test_no_json(self):
         with pytest.raises(Dump2PolarionException) as excinfo:
             ostriztools.import_ostriz("NONEXISTENT.json")
@@ -117,3 +195,113 @@ class TestOstriz:
         with open(os.path.join(conf.DATA_PATH, fname), encoding="utf-8") as input_xml:
             parsed = input_xml.read()
         assert complete == parsed
+
+
+class TestOstrizSources:
+    def test_merge_sources(self, records_json, ostriz_sources):
+        loaded_json = ostriztools.import_ostriz(ostriz_sources)
+        assert loaded_json == records_json
+
+    def test_merge_file_and_url(self, records_json, ostriz_sources, ostriz_server, tmpdir):
+        with open(ostriz_sources[1], "rb") as input_json:
+            ostriz_server.content = input_json.read()
+        loaded_json = ostriztools.import_ostriz(
+            [ostriz_sources[0], ostriz_server.url], cache_dir=str(tmpdir.mkdir("cache"))
+        )
+        assert loaded_json == records_json
+
+    def test_merge_duplicate(self, records_json, ostriz_sources):
+        loaded_json = ostriztools.import_ostriz(ostriz_sources + ostriz_sources[:1])
+        assert loaded_json == records_json
+
+    def test_duplicate_finished_last(self, tmpdir):
+        test_data = {
+            "build": "5.8.0.17",
+            "statuses": {"overall": "failed"},
+            "start_time": 1495768540,
+            "finish_time": 1495768541,
+        }
+        newer_data = dict(test_data, statuses={"overall": "passed"}, finish_time=1495768542)
+        sources = [
+            {"tests/test_foo.py/test_foo": newer_data},
+            {"tests/test_foo.py/test_foo": test_data},
+        ]
+        imported = ostriztools._parse_ostriz(sources)
+        assert [result["verdict"] for result in imported.results] == ["passed"]
+        imported = ostriztools._parse_ostriz(sources[::-1])
+        assert [result["verdict"] for result in imported.results] == ["passed"]
+
+    @pytest.mark.parametrize("build", ("5.8.0.17-20170526", "5_8_0_17"))
+    def test_requested_build(self, ostriz_sources, build):
+        loaded_json = ostriztools.import_ostriz(ostriz_sources, build=build)
+        assert loaded_json.testrun == "5_8_0_17"
+        if build == "5_8_0_17":
+            # results of both builds with the testrun id
+            assert len(loaded_json.results) == 7
+        else:
+            assert len(loaded_json.results) == 1
+
+    def test_build_not_found(self, ostriz_sources):
+        with pytest.raises(NothingToDoException) as excinfo:
+            ostriztools.import_ostriz(ostriz_sources, build="5.9.0.1")
+        assert "No data for build 5.9.0.1 found" in str(excinfo.value)
+
+    def test_timing_logged(self, ostriz_sources, captured_log):
+        ostriztools.import_ostriz(ostriz_sources)
+        log = captured_log.getvalue()
+        assert "Loaded 3 tests from {}".format(ostriz_sources[0]) in log
+        assert "Loaded 5 tests from {}".format(ostriz_sources[1]) in log
+        assert "Merged 6 results from 2 sources" in log
+
+    def test_import_results(self, records_json, ostriz_sources):
+        loaded_json = import_results(ostriz_sources, jobs=2)
+        assert loaded_json == records_json
+
+
+@pytest.fixture
+def ostriz_builds(tmpdir):
+    """Ostriz data with results of two testruns."""
+    with open(os.path.join(conf.DATA_PATH, "ostriz.json"), encoding="utf-8") as input_json:
+        data = json.load(input_json)
+    for test_data in list(data["tests"].values())[3:5]:
+        test_data["build"] = "5.9.0.1-20180101"
+    json_file = os.path.join(str(tmpdir), "ostriz_builds.json")
+    with open(json_file, "w", encoding="utf-8") as out_json:
+        json.dump(data, out_json)
+    return json_file
+
+
+class TestOstrizBuilds:
+    def test_all_builds(self, ostriz_builds):
+        builds = ostriztools.import_ostriz_builds(ostriz_builds)
+        assert list(builds) == ["5_8_0_17", "5_9_0_1"]
+        assert builds["5_8_0_17"].testrun == "5_8_0_17"
+        assert len(builds["5_8_0_17"].results) == 5
+        assert builds["5_9_0_1"].testrun == "5_9_0_1"
+        assert len(builds["5_9_0_1"].results) == 2
+
+    def test_same_as_single_build(self, ostriz_builds):
+        builds = ostriztools.import_ostriz_builds(ostriz_builds)
+        for testrun_id, imported in builds.items():
+            assert ostriztools.import_ostriz(ostriz_builds, build=testrun_id) == imported
+
+    def test_builds_same_testrun(self, records_json):
+        # both builds in the data have the same testrun id
+        builds = ostriztools.import_ostriz_builds(os.path.join(conf.DATA_PATH, "ostriz.json"))
+        assert list(builds) == ["5_8_0_17"]
+        assert len(builds["5_8_0_17"].results) == 7
+        assert records_json.results[0] in builds["5_8_0_17"].results
+
+    def test_invalid_build(self, captured_log):
+        data = {
+            "test_foo.py/test_foo": {"build": "INVALID", "statuses": {"overall": "passed"}},
+            "test_foo.py/test_bar": {"build": "5.8.0.17", "statuses": {"overall": "passed"}},
+        }
+        builds = ostriztools._parse_ostriz_builds(data)
+        assert list(builds) == ["5_8_0_17"]
+        assert "InvalidVersion parsing testrun ID from INVALID" in captured_log.getvalue()
+
+    def test_no_builds(self):
+        with pytest.raises(NothingToDoException) as excinfo:
+            ostriztools._parse_ostriz_builds({"test_foo.py/test_foo": {"statuses": {}}})
+        assert "No build found in data" in str(excinfo.value)
@@ -1,12 +1,16 @@
 # pylint: disable=missing-docstring,redefined-outer-name,no-self-use
 
+import gzip
+import json
 import os
 import shutil
+import subprocess
+import sys
 
 import pytest
 from mock import patch
 
-from dump2polarion import dumper_cli
+from dump2polarion import dumper_cli, utils
 from dump2polarion.exceptions import Dump2PolarionException
 from dump2polarion.exporters.transform import only_passed_and_wait
 from dump2polarion.results import dbtools
@@ -26,6 +30,16 @@ class TestDumperCLIUnits:
         assert args.force is False
         assert args.log_level is None
 
+    def test_get_args_multiple_inputs(self):
+        args = dumper_cli.get_args(["-i", "dummy1", "dummy2"])
+        assert args.input_file == ["dummy1", "dummy2"]
+
+    def test_get_args_build(self):
+        args = dumper_cli.get_args(["-i", "dummy"])
+        assert args.build is None
+        args = dumper_cli.get_args(["-i", "dummy", "--build", "5_8_0_17"])
+        assert args.build == "5_8_0_17"
+
     def test_testrun_id_match(self):
         args = dumper_cli.get_args(["-i", "dummy", "-t", "5_8_0_17"])
         found = dumper_cli.get_testrun_id(args, {}, "5_8_0_17")
@@ -94,6 +108,17 @@ class TestDumperCLIUnits:
             retval = dumper_cli.submit_if_ready(args, submit_args, config_prop)
         assert retval == 0
 
+    def test_backends_not_imported(self):
+        # fresh interpreter, the backends are already imported by other tests here
+        code = "import sys; import dump2polarion.dumper_cli; print(' '.join(sys.modules))"
+        root_path = os.path.dirname(os.path.dirname(conf.DATA_PATH))
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=root_path)
+        modules = output.decode("utf-8").split()
+        assert "dump2polarion.results.importer" in modules
+        backends = [name for name in modules if name.startswith("dump2polarion.results.")]
+        assert not [name for name in backends if name.endswith("tools")]
+        assert "sqlite3" not in modules
+
 
 E2E_DATA = [
     # default transform
@@ -151,6 +176,239 @@ class TestDumperCLIE2E:
             produced = out_xml.read()
         assert produced == parsed
 
+    def test_main_stream(self, tmpdir, config_e2e):
+        input_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+        output_file = tmpdir.join("out.xml")
+        args = ["-i", input_file, "-o", str(output_file), "-c", config_e2e, "--stream"]
+
+        with patch("dump2polarion.submit_and_verify", return_value=True) as submit_mock, patch(
+            "dump2polarion.dumper_cli.utils.init_log"
+        ):
+            retval = dumper_cli.main(args)
+        assert retval == 0
+        assert submit_mock.call_args[1]["xml_file"] == str(output_file)
+
+        golden_output = "complete_transform.xml"
+        with open(os.path.join(conf.DATA_PATH, golden_output), encoding="utf-8") as golden_xml:
+            parsed = golden_xml.read()
+        with open(str(output_file), encoding="utf-8") as out_xml:
+            produced = out_xml.read()
+        assert produced == parsed
+
+    def test_main_stream_gzip(self, tmpdir, config_e2e):
+        input_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+        output_file = tmpdir.join("out.xml.gz")
+        args = ["-i", input_file, "-o", str(output_file), "-c", config_e2e, "--stream"]
+
+        with patch("dump2polarion.submit.utils.get_session") as session_mock, patch(
+            "dump2polarion.submit.verify_submit", return_value=True
+        ), patch("dump2polarion.dumper_cli.utils.init_log"):
+            session_mock.return_value.post.return_value.json.return_value = {
+                "files": {"results.xml": {"job-ids": [1]}}
+            }
+            retval = dumper_cli.main(args)
+        assert retval == 0
+        posted = session_mock.return_value.post.call_args[1]["data"]
+        body = b"".join(posted)
+
+        with open(os.path.join(conf.DATA_PATH, "complete_transform.xml"), "rb") as golden_xml:
+            assert golden_xml.read() in body
+        with gzip.open(str(output_file), "rb") as out_xml:
+            assert out_xml.read() in body
+
+    def test_main_shard_failed(self, tmpdir, config_e2e):
+        db_file = os.path.join(str(tmpdir), "workitems_copy.sqlite3")
+        shutil.copy(os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3"), db_file)
+        args = ["-i", db_file, "-c", config_e2e, "--shard-records", "3"]
+
+        with patch("dump2polarion.submit.utils.get_session") as session_mock, patch(
+            "dump2polarion.submit.verify_submit", return_value=True
+        ), patch("dump2polarion.dumper_cli.utils.init_log"):
+            # the second of three shards fails
+            session_mock.return_value.post.return_value.json.side_effect = [
+                {"files": {"results.xml": {"job-ids": [1]}}},
+                {"files": {"results.xml": {"error-message": "failed"}}},
+            ]
+            retval = dumper_cli.main(args)
+        assert retval == 2
+        assert session_mock.return_value.post.call_count == 2
+
+        # no rows were marked as exported
+        conn = dbtools._open_sqlite(db_file)
+        cur = conn.cursor()
+        cur.execute("SELECT count(*) FROM testcases WHERE exported == 'yes'")
+        num = cur.fetchone()
+        conn.close()
+        assert num[0] == 0
+
+    def test_main_import_cache(self, tmpdir, config_e2e, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir.join("cache")))
+        input_file = os.path.join(conf.DATA_PATH, "junit-report.xml")
+        golden_output = os.path.join(conf.DATA_PATH, "junit_transform.xml")
+        with open(golden_output, encoding="utf-8") as golden_xml:
+            parsed = golden_xml.read()
+
+        for num in range(2):
+            output_file = tmpdir.join("out{}.xml".format(num))
+            args = ["-i", input_file, "-o", str(output_file), "-c", config_e2e, "-n"]
+            args.extend(["-t", "5_8_0_17", "--import-cache"])
+            with patch("dump2polarion.dumper_cli.utils.init_log"):
+                retval = dumper_cli.main(args)
+            assert retval == 0
+            assert output_file.read() == parsed
+        assert len(tmpdir.join("cache", "dump2polarion", "imports").listdir()) == 1
+
+    def test_main_submit_tree(self, config_e2e):
+        input_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+        args = ["-i", input_file, "-c", config_e2e]
+
+        with patch("dump2polarion.submit_and_verify", return_value=True) as submit_mock, patch(
+            "dump2polarion.dumper_cli.utils.init_log"
+        ):
+            retval = dumper_cli.main(args)
+        assert retval == 0
+        assert submit_mock.call_args[1]["xml_root"].tag == "testsuites"
+
+    @pytest.mark.parametrize("input_name", ("workitems_ids.csv", "workitems_ids.sqlite3"))
+    def test_main_jobs(self, tmpdir, config_e2e, input_name):
+        input_file = os.path.join(str(tmpdir), input_name)
+        # lazily read records are consumed by the pool in another thread
+        shutil.copy(os.path.join(conf.DATA_PATH, input_name), input_file)
+        output_file = tmpdir.join("out.xml")
+        args = ["-i", input_file, "-o", str(output_file), "-c", config_e2e, "-n", "-j", "2"]
+
+        with patch("dump2polarion.dumper_cli.utils.init_log"):
+            retval = dumper_cli.main(args)
+        assert retval == 0
+
+        golden_output = "complete_transform.xml"
+        with open(os.path.join(conf.DATA_PATH, golden_output), encoding="utf-8") as golden_xml:
+            parsed = golden_xml.read()
+        with open(str(output_file), encoding="utf-8") as out_xml:
+            produced = out_xml.read()
+        assert produced == parsed
+
+    def test_main_compact_gzip(self, tmpdir, config_e2e):
+        input_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+        output_file = tmpdir.join("out.xml.gz")
+        args = ["-i", input_file, "-o", str(output_file), "-c", config_e2e, "-n", "--compact"]
+
+        with patch("dump2polarion.dumper_cli.utils.init_log"):
+            retval = dumper_cli.main(args)
+        assert retval == 0
+
+        with gzip.open(str(output_file)) as out_xml:
+            produced = out_xml.read()
+        golden_output = "complete_transform.xml"
+        golden_root = utils.get_xml_root(os.path.join(conf.DATA_PATH, golden_output))
+        assert produced == utils.etree_to_bytes(golden_root)
+
+    def test_main_profile_report(self, tmpdir, config_e2e):
+        input_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
+        report_file = tmpdir.join("report.json")
+        args = ["-i", input_file, "-c", config_e2e, "--profile-report", str(report_file)]
+
+        with patch("dump2polarion.submit_and_verify", return_value=True), patch(
+            "dump2polarion.dumper_cli.utils.init_log"
+        ):
+            retval = dumper_cli.main(args)
+        assert retval == 0
+
+        stages = json.loads(report_file.read())["stages"]
+        assert [(stage["name"], stage["records"]) for stage in stages] == [
+            ("import", 15),
+            ("export", 7),
+            ("dumper", None),
+        ]
+
+    def test_main_multiple_inputs(self, tmpdir, config_e2e):
+        db_files = []
+        for num in (1, 2):
+            db_file = os.path.join(str(tmpdir), "workitems_{}.sqlite3".format(num))
+            shutil.copy(os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3"), db_file)
+            db_files.append(db_file)
+        args = ["-i", os.path.join(str(tmpdir), "*.sqlite3"), "-c", config_e2e, "-j", "2"]
+
+        with patch("dump2polarion.submit_and_verify", return_value=True) as submit_mock, patch(
+            "dump2polarion.dumper_cli.utils.init_log"
+        ):
+            retval = dumper_cli.main(args)
+        assert retval == 0
+        xml_root = submit_mock.call_args[1]["xml_root"]
+        assert len(xml_root.findall("testsuite/testcase")) == 2 * 7
+
+        # exported records in all the input databases were marked as exported
+        for db_file in db_files:
+            conn = dbtools._open_sqlite(db_file)
+            cur = conn.cursor()
+            cur.execute("SELECT count(*) FROM testcases WHERE exported == 'yes'")
+            num = cur.fetchone()
+            conn.close()
+            assert num[0] == 7
+
+    def test_main_all_builds(self, tmpdir, config_e2e):
+        with open(os.path.join(conf.DATA_PATH, "ostriz.json"), encoding="utf-8") as input_json:
+            data = json.load(input_json)
+        for test_data in list(data["tests"].values())[:2]:
+            test_data["build"] = "5.9.0.1-20180101"
+        input_file = tmpdir.join("ostriz_builds.json")
+        input_file.write(json.dumps(data))
+        output_dir = tmpdir.mkdir("out")
+        args = ["-i", str(input_file), "-c", config_e2e, "-o", str(output_dir), "--all-builds"]
+
+        with patch("dump2polarion.submit_and_verify", return_value=True) as submit_mock, patch(
+            "dump2polarion.dumper_cli.utils.init_log"
+        ):
+            retval = dumper_cli.main(args)
+        assert retval == 0
+        testruns = [
+            call[1]["xml_root"]
+            .find("properties/property[@name='polarion-testrun-id']")
+            .get("value")
+            for call in submit_mock.call_args_list
+        ]
+        assert testruns == ["5_9_0_1", "5_8_0_17"]
+        assert len(output_dir.listdir()) == 2
+
+    def test_main_all_builds_testrun(self, config_e2e, captured_log):
+        input_file = os.path.join(conf.DATA_PATH, "ostriz.json")
+        args = ["-i", input_file, "-c", config_e2e, "-t", "5_8_0_17", "--all-builds"]
+        with patch("dump2polarion.dumper_cli.utils.init_log"):
+            retval = dumper_cli.main(args)
+        assert retval == 1
+        assert "can't be combined" in captured_log.getvalue()
+
+    # the database is recognized by content, not by the extension
+    @pytest.mark.parametrize("db_name", ("workitems_copy.sqlite3", "results.bin"))
+    def test_main_claim_batch(self, tmpdir, config_e2e, db_name):
+        db_file = os.path.join(str(tmpdir), db_name)
+        shutil.copy(os.path.join(conf.DATA_PATH, "workitems_ids.sqlite3"), db_file)
+        args = ["-i", db_file, "-c", config_e2e, "--claim-batch", "10"]
+
+        submitted = []
+        for __ in range(2):
+            with patch("dump2polarion.submit_and_verify", return_value=True) as submit_mock, patch(
+                "dump2polarion.dumper_cli.utils.init_log"
+            ):
+                retval = dumper_cli.main(args)
+            assert retval == 0
+            xml_root = submit_mock.call_args[1]["xml_root"]
+            submitted.extend(xml_root.findall("testsuite/testcase"))
+        assert len(submitted) == 7
+
+        conn = dbtools._open_sqlite(db_file)
+        cur = conn.cursor()
+        cur.execute("SELECT count(*) FROM testcases WHERE exported == 'yes'")
+        exported = cur.fetchone()[0]
+        cur.execute(
+            "SELECT count(*) FROM testcases WHERE claimed_by IS NOT NULL AND exported != 'yes'"
+        )
+        claimed = cur.fetchone()[0]
+        conn.close()
+        assert exported == 7
+        # claim of rows skipped by transform was released
+        assert claimed == 0
+
     def test_main_missing_testrun(self, tmpdir, config_e2e, captured_log):
         input_file = os.path.join(conf.DATA_PATH, "junit-report.xml")
         output_file = tmpdir.join("out.xml")
@@ -257,5 +515,9 @@ class TestDumperCLIE2E:
         select = "SELECT count(*) FROM testcases WHERE exported == 'yes'"
         cur.execute(select)
         num = cur.fetchone()
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        indexes = [row[0] for row in cur.fetchall()]
         conn.close()
-        assert num[0] == 13
+        # only the records that were exported are marked, not the records skipped by transform
+        assert num[0] == 7
+        assert indexes == ["testcases_not_exported"]
@@ -0,0 +1,67 @@
+# pylint: disable=missing-docstring,no-self-use
+
+import tracemalloc
+
+import pytest
+
+from dump2polarion import profiling
+
+
+class TestProfiling:
+    def test_stage_inactive(self):
+        with profiling.stage("import") as stats:
+            stats.records = 10
+        assert stats is profiling._NULL_STATS
+
+    def test_nested_stages(self):
+        with profiling.profile(trace_memory=True) as report:
+            with profiling.stage("dumper"):
+                with profiling.stage("import") as stats:
+                    data = [str(num) * 10 for num in range(10000)]
+                    stats.records = len(data)
+                del data
+                with profiling.stage("export"):
+                    pass
+        stages = report.to_dict()["stages"]
+        assert [(stage["name"], stage["parent"]) for stage in stages] == [
+            ("import", "dumper"),
+            ("export", "dumper"),
+            ("dumper", None),
+        ]
+        import_stage, export_stage, dumper_stage = stages
+        assert import_stage["records"] == 10000
+        assert dumper_stage["records"] is None
+        assert dumper_stage["wall_time"] >= import_stage["wall_time"]
+        assert import_stage["cpu_time"] >= 0
+        assert import_stage["max_rss"] > 0
+        if hasattr(tracemalloc, "reset_peak"):
+            # the peak of the export stage is measured separately since python 3.9
+            assert export_stage["tracemalloc_peak"] < import_stage["tracemalloc_peak"]
+        assert dumper_stage["tracemalloc_peak"] >= import_stage["tracemalloc_peak"]
+
+    def test_no_trace_memory(self):
+        with profiling.profile() as report:
+            with profiling.stage("import"):
+                pass
+        assert report.stages[0].tracemalloc_peak is None
+        assert report.stages[0].wall_time is not None
+
+    def test_hook(self):
+        finished = []
+        profiling.add_hook(finished.append)
+        try:
+            with pytest.raises(ValueError):
+                with profiling.stage("submit"):
+                    raise ValueError("failed")
+        finally:
+            profiling.remove_hook(finished.append)
+        assert [stats.name for stats in finished] == ["submit"]
+        assert finished[0].wall_time is not None
+
+    def test_write_json(self, tmpdir):
+        with profiling.profile() as report:
+            with profiling.stage("import") as stats:
+                stats.records = 1
+        output_file = tmpdir.join("report.json")
+        report.write_json(str(output_file))
+        assert '"name": "import"' in output_file.read()
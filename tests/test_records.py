@@ -0,0 +1,84 @@
+# pylint: disable=missing-docstring,no-self-use
+
+import copy
+import pickle
+from collections import OrderedDict
+
+import pytest
+
+from dump2polarion.results.records import RowRecord, get_fields_index
+
+FIELDNAMES = ["id", "title", "verdict", "comment"]
+
+
+class TestRowRecord:
+    def test_same_as_dict(self):
+        values = ("RHCF3-1", "test_foo", "passed", "")
+        record = RowRecord(get_fields_index(FIELDNAMES), values)
+        assert record == OrderedDict(zip(FIELDNAMES, values))
+        assert list(record) == FIELDNAMES
+        assert len(record) == 4
+        assert "verdict" in record
+        assert "stdout" not in record
+        assert record.get("stdout") is None
+
+    def test_padded_and_truncated(self):
+        fields = get_fields_index(FIELDNAMES)
+        short = RowRecord(fields, ["RHCF3-1", "test_foo"])
+        assert dict(short) == {
+            "id": "RHCF3-1",
+            "title": "test_foo",
+            "verdict": None,
+            "comment": None,
+        }
+        long = RowRecord(fields, ["RHCF3-1", "test_foo", "passed", "", "extra"])
+        assert list(long.values()) == ["RHCF3-1", "test_foo", "passed", ""]
+
+    def test_shared_fields(self):
+        fields = get_fields_index(FIELDNAMES)
+        records = [RowRecord(fields, (str(num),) * 4) for num in range(3)]
+        restored = pickle.loads(pickle.dumps(records))
+        assert restored == records
+        assert restored[0]._fields is restored[2]._fields
+
+    def test_read_only(self):
+        record = RowRecord(get_fields_index(FIELDNAMES), ("RHCF3-1",))
+        with pytest.raises(TypeError):
+            record["title"] = "foo"  # pylint: disable=unsupported-assignment-operation
+        with pytest.raises(KeyError):
+            record["stdout"]  # pylint: disable=pointless-statement
+
+    def test_duplicate_fields(self):
+        fields = get_fields_index(["id", "title", "verdict", "title", "comment"])
+        record = RowRecord(fields, ("RHCF3-1", "t1", "passed", "t1b", "c"))
+        assert dict(record) == {
+            "id": "RHCF3-1",
+            "title": "t1b",
+            "verdict": "passed",
+            "comment": "c",
+        }
+        assert len(record) == 4
+        short = RowRecord(fields, ("RHCF3-1", "t1", "passed"))
+        assert short.get("comment") is None
+        restored = pickle.loads(pickle.dumps(record))
+        assert restored == record
+        assert restored._fields.width == 5
+
+    def test_plain_dict_fields(self):
+        record = RowRecord({"id": 0, "comment": 2}, ("RHCF3-1", "ignored", "c"))
+        assert dict(record) == {"id": "RHCF3-1", "comment": "c"}
+
+    def test_copy(self):
+        record = RowRecord(get_fields_index(FIELDNAMES), ("RHCF3-1", "test_foo"))
+        copied = record.copy()
+        copied.pop("id")
+        copied["stdout"] = "foo"
+        assert copied == {"title": "test_foo", "verdict": None, "comment": None, "stdout": "foo"}
+        assert record["id"] == "RHCF3-1"
+
+    def test_deepcopy(self):
+        record = RowRecord(get_fields_index(FIELDNAMES), ("RHCF3-1", "test_foo"))
+        copied = copy.deepcopy(record)
+        copied["comment"] = "changed"
+        assert copied == dict(record, comment="changed")
+        assert copy.copy(record) == dict(record)
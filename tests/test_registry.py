@@ -0,0 +1,112 @@
+# pylint: disable=missing-docstring,redefined-outer-name,no-self-use
+
+import os
+
+import pytest
+from mock import patch
+
+from dump2polarion.results import registry
+from dump2polarion.results.junittools import import_junit
+from tests import conf
+
+
+def _head(fname):
+    with open(os.path.join(conf.DATA_PATH, fname), "rb") as input_file:
+        return input_file.read(registry.SNIFF_SIZE)
+
+
+class _EntryPoint:
+    name = "custom"
+
+    def __init__(self, spec):
+        self.spec = spec
+
+    def load(self):
+        if isinstance(self.spec, Exception):
+            raise self.spec
+        return self.spec
+
+
+@pytest.fixture
+def plugins():
+    with patch("dump2polarion.results.registry._plugin_specs", None):
+        yield
+
+
+class TestSniff:
+    @pytest.mark.parametrize(
+        "fname,name",
+        (
+            ("junit-report.xml", "junit"),
+            ("junit-report-params.xml", "junit"),
+            ("ostriz.json", "ostriz"),
+            ("ostriz_search.json", "ostriz"),
+            ("test_run_import.json", "json"),
+            ("workitems_ids.csv", "csv"),
+            ("workitems_ids.sqlite3", "sqlite"),
+        ),
+    )
+    def test_data(self, fname, name):
+        assert registry.sniff(_head(fname)).name == name
+
+    def test_csv_fieldnames(self):
+        assert (
+            registry.sniff(b'"ID";"Title";"Verdict"\r\nRHCF3-1;test_foo;passed\r\n').name == "csv"
+        )
+
+    @pytest.mark.parametrize(
+        "head", (b"", b"not recognized", b'{"other": []}', b"<testcases></testcases>")
+    )
+    def test_unknown(self, head, plugins):
+        with patch("dump2polarion.results.registry._iter_entry_points", return_value=[]):
+            assert registry.sniff(head) is None
+
+    def test_load_parser(self):
+        assert registry.load_parser(registry.get_spec("junit")) == import_junit
+
+    def test_ext(self):
+        assert registry.get_spec_by_ext(".XML").name == "junit"
+        assert registry.get_spec_by_ext(".db3").name == "sqlite"
+
+
+class TestPlugins:
+    def test_entry_point(self, plugins):
+        spec = registry.ImporterSpec(
+            "custom", lambda head: head.startswith(b"custom"), "os.path:join", (".custom",)
+        )
+        with patch(
+            "dump2polarion.results.registry._iter_entry_points",
+            return_value=[_EntryPoint(spec)],
+        ) as entry_points_mock:
+            # plugins are not loaded when the built-in importers match
+            assert registry.sniff(_head("junit-report.xml")).name == "junit"
+            assert not entry_points_mock.called
+            assert registry.sniff(b"custom data") == spec
+            assert registry.get_spec_by_ext(".custom") == spec
+        assert entry_points_mock.call_count == 1
+        assert ".custom" in registry.iter_extensions()
+        assert not spec.binary
+        assert spec.stream
+        assert registry.load_parser(spec) == os.path.join
+
+    def test_extensions_not_loaded(self, plugins):
+        with patch("dump2polarion.results.registry._iter_entry_points") as entry_points_mock:
+            assert ".csv" in registry.iter_extensions()
+        assert not entry_points_mock.called
+
+    def test_entry_point_failed(self, plugins, captured_log):
+        with patch(
+            "dump2polarion.results.registry._iter_entry_points",
+            return_value=[_EntryPoint(ImportError("missing"))],
+        ):
+            assert registry.sniff(b"custom data") is None
+        assert "Failed to load importer 'custom': missing" in captured_log.getvalue()
+
+    def test_register(self):
+        spec = registry.ImporterSpec(
+            "xml_custom", lambda head: b"<testsuite" in head, "os.path:join", ()
+        )
+        with patch("dump2polarion.results.registry._registered_specs", []):
+            registry.register_importer(spec)
+            assert registry.sniff(_head("junit-report.xml")) == spec
+        assert registry.sniff(_head("junit-report.xml")).name == "junit"
@@ -1,7 +1,10 @@
 # pylint: disable=missing-docstring,no-self-use,protected-access
 
+import gzip
+import itertools
 import os
 
+from lxml import etree
 from mock import patch
 
 from dump2polarion import submit, utils
@@ -222,3 +225,303 @@ class TestSubmitAndVerify:
             )
         assert response
         assert "Results received" in captured_log.getvalue()
+
+
+class TestSubmitShards:
+    def test_shards_verified_together(self, config_prop):
+        with open(os.path.join(conf.DATA_PATH, "complete_transform.xml"), encoding="utf-8") as xml:
+            xml_str = xml.read()
+        job_ids = iter(([1], [2], [3]))
+        with patch("dump2polarion.submit.verify_submit", return_value=True) as verify_mock:
+            response = submit.submit_shards_and_verify(
+                [xml_str, xml_str, xml_str],
+                config=config_prop,
+                user="john",
+                password="123",
+                session=DummySession(
+                    lambda: DummyResponse({"files": {"results.xml": {"job-ids": next(job_ids)}}})
+                ),
+            )
+        assert response
+        assert verify_mock.call_count == 1
+        assert verify_mock.call_args[0][3] == [1, 2, 3]
+
+    def test_shards_failed(self, config_prop, captured_log):
+        with open(os.path.join(conf.DATA_PATH, "complete_transform.xml"), encoding="utf-8") as xml:
+            xml_str = xml.read()
+        with patch("dump2polarion.submit.verify_submit") as verify_mock:
+            response = submit.submit_shards_and_verify(
+                [xml_str, xml_str],
+                config=config_prop,
+                user="john",
+                password="123",
+                session=DummySession(lambda: None),
+            )
+        assert not response
+        assert not verify_mock.called
+        assert "0 of 2 shards were submitted" in captured_log.getvalue()
+
+    def test_later_shard_failed(self, config_prop, captured_log):
+        with open(os.path.join(conf.DATA_PATH, "complete_transform.xml"), encoding="utf-8") as xml:
+            xml_str = xml.read()
+        responses = iter(
+            (
+                DummyResponse({"files": {"results.xml": {"job-ids": [1]}}}),
+                DummyResponse({"files": {"results.xml": {"error-message": "failed"}}}),
+                DummyResponse({"files": {"results.xml": {"job-ids": [3]}}}),
+            )
+        )
+        with patch("dump2polarion.submit.verify_submit") as verify_mock:
+            response = submit.submit_shards_and_verify(
+                [xml_str, xml_str, xml_str],
+                config=config_prop,
+                user="john",
+                password="123",
+                session=DummySession(lambda: next(responses)),
+            )
+        assert response is None
+        assert not verify_mock.called
+        assert "1 of 3 shards were submitted" in captured_log.getvalue()
+        # the last shard was not submitted
+        assert next(responses)
+
+
+class TestSubmitTree:
+    def test_submit_tree_compact(self, config_prop):
+        posted = {}
+
+        class RecordingSession:
+            def post(self, url, files=None, **kwargs):
+                posted["payload"] = files["file"][1]
+                return DummyResponse({"files": {"results.xml": {"job-ids": [1]}}})
+
+        xml_root = utils.get_xml_root(os.path.join(conf.DATA_PATH, "complete_transform.xml"))
+        with patch("dump2polarion.submit.utils.get_xml_root_from_str") as parse_mock:
+            response = submit.submit_and_verify(
+                xml_root=xml_root,
+                config=config_prop,
+                user="john",
+                password="123",
+                session=RecordingSession(),
+                dry_run=True,
+                no_verify=True,
+            )
+        assert response
+        assert not parse_mock.called
+        payload = posted["payload"]
+        assert isinstance(payload, bytes)
+        assert payload.startswith(b"<?xml version='1.0' encoding='utf-8'?>\n<testsuites>")
+        assert b"\n  " not in payload
+        assert b'<property name="polarion-dry-run" value="true"/>' in payload
+
+    def test_submit_bytes(self, config_prop):
+        response = submit.submit_and_verify(
+            b"<testcases/>",
+            config=config_prop,
+            user="john",
+            password="123",
+            session=DummySession(
+                lambda: DummyResponse({"files": {"results.xml": {"job-ids": [1]}}})
+            ),
+            no_verify=True,
+        )
+        assert response
+
+    def test_submit_compressed(self, config_prop):
+        posted = {}
+
+        class RecordingSession:
+            def post(self, url, data=None, headers=None, **kwargs):
+                posted["data"] = data
+                posted["headers"] = headers
+                return DummyResponse({"files": {"results.xml": {"job-ids": [1]}}})
+
+        config = dict(config_prop, compress_upload=True)
+        response = submit.submit_and_verify(
+            "<testcases/>",
+            config=config,
+            user="john",
+            password="123",
+            session=RecordingSession(),
+            no_verify=True,
+        )
+        assert response
+        assert posted["headers"]["Content-Encoding"] == "gzip"
+        assert posted["headers"]["Content-Type"].startswith("multipart/form-data; boundary=")
+        body = gzip.decompress(posted["data"])
+        assert b'name="file"; filename="results.xml"' in body
+        assert b"<testcases/>" in body
+
+
+class TestSubmitStream:
+    @staticmethod
+    def _recording_session(posted):
+        class RecordingSession:
+            def post(self, url, data=None, files=None, headers=None, **kwargs):
+                posted["data"] = data
+                posted["files"] = files
+                posted["headers"] = headers
+                if data is not None:
+                    posted["body"] = b"".join(data)
+                return DummyResponse({"files": {"results.xml": {"job-ids": [1]}}})
+
+        return RecordingSession()
+
+    def test_stream_file(self, config_prop):
+        posted = {}
+        input_file = os.path.join(conf.DATA_PATH, "complete_transform.xml")
+        with patch("dump2polarion.submit.utils.get_xml_root") as parse_mock:
+            response = submit.submit_and_verify(
+                xml_file=input_file,
+                config=config_prop,
+                user="john",
+                password="123",
+                session=self._recording_session(posted),
+                no_verify=True,
+            )
+        assert response
+        assert not parse_mock.called
+        data = posted["data"]
+        assert isinstance(data, submit.SizedMultipartStream)
+        assert posted["headers"]["Content-Type"] == data.content_type
+        with open(input_file, "rb") as input_xml:
+            content = input_xml.read()
+        assert len(data) == len(posted["body"])
+        assert posted["body"].endswith(
+            b"\r\n" + content + b"\r\n--" + data.boundary.encode() + b"--\r\n"
+        )
+
+    def test_stream_gzip_file(self, config_prop, tmpdir):
+        posted = {}
+        with open(os.path.join(conf.DATA_PATH, "complete_transform.xml"), "rb") as input_xml:
+            content = input_xml.read()
+        input_file = tmpdir.join("out.xml.gz")
+        input_file.write_binary(gzip.compress(content))
+        with patch("dump2polarion.submit.utils.get_xml_root") as parse_mock:
+            response = submit.submit_and_verify(
+                xml_file=str(input_file),
+                config=config_prop,
+                user="john",
+                password="123",
+                session=self._recording_session(posted),
+                no_verify=True,
+            )
+        assert response
+        assert not parse_mock.called
+        data = posted["data"]
+        # length of the decompressed document is not known
+        assert not isinstance(data, submit.SizedMultipartStream)
+        assert posted["body"].endswith(
+            b"\r\n" + content + b"\r\n--" + data.boundary.encode() + b"--\r\n"
+        )
+
+    def test_stream_gzip_file_patching_needed(self, config_prop, tmpdir):
+        posted = {}
+        with open(os.path.join(conf.DATA_PATH, "complete_transform.xml"), "rb") as input_xml:
+            content = input_xml.read()
+        input_file = tmpdir.join("out.xml.gz")
+        input_file.write_binary(gzip.compress(content))
+        response = submit.submit_and_verify(
+            xml_file=str(input_file),
+            config=config_prop,
+            user="john",
+            password="123",
+            session=self._recording_session(posted),
+            dry_run=True,
+            no_verify=True,
+        )
+        assert response
+        assert b'<property name="polarion-dry-run" value="true"/>' in posted["files"]["file"][1]
+
+    def test_stream_no_dry_run_property(self, tmpdir):
+        with open(os.path.join(conf.DATA_PATH, "complete_transform.xml"), encoding="utf-8") as xml:
+            content = xml.read()
+        input_file = tmpdir.join("out.xml")
+        input_file.write(content.replace('<property name="polarion-dry-run" value="False"/>', ""))
+        xml_doc = submit._get_xml_doc(None, None, str(input_file), None, dry_run=False)
+        assert isinstance(xml_doc, submit._XMLStream)
+        xml_doc = submit._get_xml_doc(None, None, str(input_file), None, dry_run=True)
+        assert isinstance(xml_doc, etree._Element)
+
+    def test_stream_chunks(self, config_prop):
+        posted = {}
+        chunks = (
+            chunk.encode("utf-8")
+            for chunk in (
+                "<testcases>",
+                "<properties>",
+                '<property name="dry-run" ',
+                'value="true"/>',
+            )
+        )
+        chunks = itertools.chain(chunks, [b"</properties>", b"<testcase/></testcases>"])
+        response = submit.submit_and_verify(
+            xml_chunks=chunks,
+            config=config_prop,
+            user="john",
+            password="123",
+            session=self._recording_session(posted),
+            dry_run=True,
+            no_verify=True,
+        )
+        assert response
+        assert not isinstance(posted["data"], submit.SizedMultipartStream)
+        assert b'value="true"/></properties><testcase/></testcases>\r\n' in posted["body"]
+
+    def test_stream_patching_needed(self, config_prop):
+        posted = {}
+        response = submit.submit_and_verify(
+            xml_file=os.path.join(conf.DATA_PATH, "complete_transform.xml"),
+            config=config_prop,
+            user="john",
+            password="123",
+            session=self._recording_session(posted),
+            dry_run=True,
+            no_verify=True,
+        )
+        assert response
+        assert posted["data"] is None
+        assert b'<property name="polarion-dry-run" value="true"/>' in posted["files"]["file"][1]
+
+    def test_stream_compressed(self, config_prop):
+        posted = {}
+        config = dict(config_prop, compress_upload=True)
+        response = submit.submit_and_verify(
+            xml_chunks=[b"<testcases/>"],
+            config=config,
+            user="john",
+            password="123",
+            session=self._recording_session(posted),
+            no_verify=True,
+        )
+        assert response
+        assert posted["headers"]["Content-Encoding"] == "gzip"
+        assert b"\r\n\r\n<testcases/>\r\n" in gzip.decompress(posted["body"])
+
+    def test_read_xml_head(self):
+        chunks = iter(
+            [
+                b'<testcases project-id="RHCF3"><response-properties><response-property/>',
+                b'</response-properties><properties><property name="dry-run" value="true"/>',
+                b"</properties><testcase id='1'>",
+                b"</testcase>",
+            ]
+        )
+        head, read_chunks = submit._read_xml_head(chunks)
+        assert len(read_chunks) == 3
+        assert next(chunks) == b"</testcase>"
+        assert head.get("project-id") == "RHCF3"
+        assert [el.tag for el in head] == ["response-properties", "properties"]
+        assert head.find("properties/property").get("value") == "true"
+
+    def test_stream_invalid(self, config_prop, captured_log):
+        response = submit.submit_and_verify(
+            xml_chunks=[b"<testcases><properties></testcase>"],
+            config=config_prop,
+            user="john",
+            password="123",
+            session=DummySession(DummyResponse),
+            no_verify=True,
+        )
+        assert not response
+        assert "Failed to parse XML" in captured_log.getvalue()
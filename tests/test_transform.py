@@ -1,10 +1,11 @@
 # pylint: disable=missing-docstring,redefined-outer-name,no-self-use,protected-access,invalid-name
 
+import copy
 from typing import List, Tuple
 
 import pytest
 
-from dump2polarion.exporters import transform_projects
+from dump2polarion.exporters import transform, transform_projects
 
 # format:
 # original record, expected record, parameter id
@@ -117,3 +118,45 @@ class TestTransform:
         tfunc = transform_projects.get_xunit_transform(config_rhcf3)
         result = tfunc(data[0])
         assert result == data[1]
+
+
+class TestCopyOnWrite:
+    def test_original_untouched(self):
+        tfunc = transform_projects.get_xunit_transform({"polarion-project-id": "RHCF3"})
+        orig = {
+            "classname": "cfme.tests.rest.TestRESTAPI",
+            "title": "test_1[param]",
+            "verdict": "skipped",
+            "comment": "SKIPME: BZ123",
+            "file": "cfme/tests/rest.py",
+            "params": {"param": "value"},
+            "stdout": "x" * 1000,
+        }
+        orig_copy = copy.deepcopy(orig)
+        result = tfunc(orig)
+        result["params"] = {"other": "value"}
+        assert orig == orig_copy
+        assert result["comment"] == "BZ123"
+        assert "classname" not in result
+        # unchanged values are shared with the original record
+        assert result["stdout"] is orig["stdout"]
+
+    def test_nested_copied(self):
+        orig = {"params": {"param": "value"}}
+        record = transform.CopyOnWriteRecord(orig)
+        record["params"]["param"] = "changed"
+        assert record["params"] == {"param": "changed"}
+        assert orig["params"] == {"param": "value"}
+
+    def test_delete_and_readd(self):
+        orig = {"title": "foo", "id": "bar"}
+        record = transform.CopyOnWriteRecord(orig)
+        del record["id"]
+        with pytest.raises(KeyError):
+            del record["id"]
+        assert list(record) == ["title"]
+        record["id"] = "baz"
+        record["new"] = "value"
+        assert dict(record) == {"title": "foo", "id": "baz", "new": "value"}
+        assert len(record) == 3
+        assert orig == {"title": "foo", "id": "bar"}
@@ -1,5 +1,6 @@
 # pylint: disable=missing-docstring,redefined-outer-name,no-self-use
 
+import gzip
 import os
 
 import pytest
@@ -24,6 +25,31 @@ class TestUtils:
         unicode_str = utils.get_unicode_str(b"@")
         assert unicode_str == "@"
 
+    @pytest.mark.parametrize(
+        "text,expected",
+        (
+            ("plain text", "plain text"),
+            ("multi\nline\ttext\r\n", "multi\nline\ttext\r\n"),
+            ("invalid\x00\x1b chars", "invalid chars"),
+            ("\u00ae\n\ufffe\ud800", "\u00ae\n"),
+            ("long\n" * 100 + "\x0c", "long\n" * 100),
+            ("long\u00ae\n" * 100 + "\x0c", "long\u00ae\n" * 100),
+        ),
+        ids=("printable", "whitespace", "control", "nonascii", "long", "long_nonascii"),
+    )
+    def test_sanitize_xml_str(self, text, expected):
+        assert utils.sanitize_xml_str(text) == expected
+        assert utils.get_unicode_str(text) == expected
+
+    def test_write_xml_sanitize(self, tmpdir):
+        output_file = str(tmpdir.join("out.xml"))
+        utils.write_xml("<xml>\x00</xml>", output_loc=output_file)
+        with open(output_file, encoding="utf-8") as xml_file:
+            assert xml_file.read() == "<xml></xml>"
+        utils.write_xml("<xml>\x00</xml>", output_loc=output_file, sanitize=False)
+        with open(output_file, encoding="utf-8") as xml_file:
+            assert xml_file.read() == "<xml>\x00</xml>"
+
     def test_write_xml_gen(self, tmpdir):
         dirname = str(tmpdir)
         utils.write_xml("<xml />", output_loc=dirname)
@@ -52,12 +78,52 @@ class TestUtils:
         utils.write_xml_root(xml_root, filename=os.path.join(dirname, "output123.xml"))
         assert "output123.xml" in os.listdir(dirname)[0]
 
+    def test_write_xml_root_gzip(self, tmpdir):
+        fname = "complete_transform_noresponse.xml"
+        xml_root = utils.get_xml_root(os.path.join(conf.DATA_PATH, fname))
+        output_file = os.path.join(str(tmpdir), "output123.xml.gz")
+        utils.write_xml_root(xml_root, filename=output_file, pretty_print=False)
+        with gzip.open(output_file) as out_xml:
+            produced = out_xml.read()
+        assert produced == utils.etree_to_bytes(xml_root)
+
+    def test_write_xml_gzip(self, tmpdir):
+        output_file = os.path.join(str(tmpdir), "output123.xml.gz")
+        utils.write_xml("<xml />", filename=output_file)
+        with gzip.open(output_file, "rt", encoding="utf-8") as out_xml:
+            assert out_xml.read() == "<xml />"
+
     def test_write_xml_no_data(self, tmpdir):
         dirname = str(tmpdir)
         with pytest.raises(Dump2PolarionException) as excinfo:
             utils.write_xml("", filename=os.path.join(dirname, "output123.xml"))
         assert "No data to write" in str(excinfo.value)
 
+    @pytest.mark.parametrize("ext", (".gz", ".xz", ".bz2"))
+    def test_open_input_compressed(self, tmpdir, ext):
+        input_file = str(tmpdir.join("input.csv" + ext))
+        with utils.COMPRESSED_EXT[ext].open(input_file, "wt", encoding="utf-8") as out_file:
+            out_file.write("Ti®le\n")
+        with utils.open_input(input_file) as input_data:
+            assert input_data.read() == "Ti®le\n"
+        with utils.open_input(input_file, binary=True) as input_data:
+            assert input_data.read() == "Ti®le\n".encode("utf-8")
+
+    def test_open_input_magic(self, tmpdir):
+        input_file = str(tmpdir.join("input.csv"))
+        with gzip.open(input_file, "wt", encoding="utf-8") as out_file:
+            out_file.write("Title\n")
+        with utils.open_input(input_file) as input_data:
+            assert input_data.read() == "Title\n"
+
+    def test_open_input_plain(self):
+        with utils.open_input(os.path.join(conf.DATA_PATH, "workitems_ids.csv")) as input_data:
+            assert input_data.readline().startswith("Exported on")
+
+    def test_strip_compressed_ext(self):
+        assert utils.strip_compressed_ext("report.xml.GZ") == "report.xml"
+        assert utils.strip_compressed_ext("report.xml") == "report.xml"
+
     def test_invalid_xml_root(self):
         with pytest.raises(Dump2PolarionException) as excinfo:
             utils.get_xml_root("NONEXISTENT.xml")
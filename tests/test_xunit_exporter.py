@@ -7,7 +7,9 @@ import pytest
 from lxml import etree
 
 from dump2polarion.exceptions import Dump2PolarionException, NothingToDoException
-from dump2polarion.exporters.xunit_exporter import ImportedData, XunitExport
+from dump2polarion.exporters import xunit_exporter
+from dump2polarion.exporters.transform import only_passed_and_wait
+from dump2polarion.exporters.xunit_exporter import ImportedData, XunitExport, compile_export_plan
 from dump2polarion.results.importer import import_results
 from dump2polarion.utils import get_unicode_str
 from tests import conf
@@ -23,9 +25,13 @@ def records_ids():
 def records_names():
     csv_file = os.path.join(conf.DATA_PATH, "workitems_ids.csv")
     records = import_results(csv_file)
+    results = []
     for res in records.results:
+        # the imported records are read-only
+        res = res.copy()
         res.pop("id")
-    return records
+        results.append(res)
+    return records._replace(results=results)
 
 
 def test_top_element(config_prop, records_ids):
@@ -150,3 +156,199 @@ class TestE2E(TestConfigPropMixin):
         with open(os.path.join(conf.DATA_PATH, fname), encoding="utf-8") as input_xml:
             parsed = input_xml.read()
         assert complete == parsed
+
+    def test_e2e_transform_modifies_record(self, records_ids):
+        def _transform(result):
+            result["title"] = "modified"
+            return result
+
+        exporter = XunitExport("5_8_0_17", records_ids, self.config_prop, transform_func=_transform)
+        complete = exporter.export()
+        assert 'name="modified"' in complete
+        # the imported records were not changed
+        assert all(result["title"] != "modified" for result in records_ids.results)
+
+    def test_e2e_lazy_results(self, records_ids):
+        lazy_records = ImportedData(results=iter(records_ids.results), testrun=None)
+        exporter = XunitExport("5_8_0_17", lazy_records, self.config_prop)
+        complete = exporter.export()
+        fname = "complete_transform.xml"
+        with open(os.path.join(conf.DATA_PATH, fname), encoding="utf-8") as input_xml:
+            parsed = input_xml.read()
+        assert complete == parsed
+
+    def test_e2e_lazy_noresults(self):
+        lazy_records = ImportedData(results=iter(()), testrun=None)
+        exporter = XunitExport("5_8_0_17", lazy_records, self.config_prop)
+        with pytest.raises(NothingToDoException) as excinfo:
+            exporter.export()
+        assert "Nothing to export" in str(excinfo.value)
+
+
+class TestStream(TestConfigPropMixin):
+    @pytest.mark.parametrize(
+        "transform_func,golden_output",
+        ((lambda arg: arg, "complete_notransform.xml"), (None, "complete_transform.xml")),
+        ids=("notransform", "transform"),
+    )
+    def test_stream_matches_export(self, tmpdir, records_ids, transform_func, golden_output):
+        exporter = XunitExport(
+            "5_8_0_17", records_ids, self.config_prop, transform_func=transform_func
+        )
+        output_file = tmpdir.join("out.xml")
+        written = exporter.write_xml_stream(str(output_file))
+        assert written == str(output_file)
+
+        with open(os.path.join(conf.DATA_PATH, golden_output), encoding="utf-8") as input_xml:
+            parsed = input_xml.read()
+        with open(written, encoding="utf-8") as out_xml:
+            produced = out_xml.read()
+        assert produced == parsed
+
+    def test_stream_compact(self, tmpdir, records_ids):
+        exporter = XunitExport("5_8_0_17", records_ids, self.config_prop)
+        output_stream = tmpdir.join("stream.xml")
+        output_tree = tmpdir.join("tree.xml")
+        exporter.write_xml_stream(str(output_stream), pretty_print=False)
+        exporter.write_xml_root(exporter.export_xml_root(), str(output_tree), pretty_print=False)
+        assert output_stream.read_binary() == output_tree.read_binary()
+        assert b"\n  <" not in output_stream.read_binary()
+
+    def test_stream_noresults(self, tmpdir, records_ids):
+        exporter = XunitExport(
+            "5_8_0_17", records_ids, self.config_prop, transform_func=lambda arg: None
+        )
+        output_file = tmpdir.join("out.xml")
+        with pytest.raises(NothingToDoException) as excinfo:
+            exporter.write_xml_stream(str(output_file))
+        assert "Nothing to export" in str(excinfo.value)
+        assert not output_file.check()
+
+
+class TestShards(TestConfigPropMixin):
+    @staticmethod
+    def _get_tests_num(xml_str):
+        xml_root = etree.fromstring(xml_str.encode("utf-8"))
+        return int(xml_root.find("testsuite").get("tests"))
+
+    def test_shards_records(self, records_ids):
+        exporter = XunitExport(
+            "5_8_0_17", records_ids, self.config_prop, transform_func=lambda arg: arg
+        )
+        complete = exporter.export()
+        shards = exporter.export_shards(max_records=5)
+        assert [self._get_tests_num(shard) for shard in shards] == [5, 5, 1]
+        assert sum(self._get_tests_num(shard) for shard in shards) == self._get_tests_num(complete)
+
+        complete_root = etree.fromstring(complete.encode("utf-8"))
+        complete_props = etree.tostring(complete_root.find("properties"))
+        for shard in shards:
+            shard_root = etree.fromstring(shard.encode("utf-8"))
+            assert etree.tostring(shard_root.find("properties")) == complete_props
+
+    def test_shards_bytes(self, records_ids):
+        exporter = XunitExport(
+            "5_8_0_17", records_ids, self.config_prop, transform_func=lambda arg: arg
+        )
+        shards = exporter.export_shards(max_bytes=1)
+        assert len(shards) == 11
+        assert all(self._get_tests_num(shard) == 1 for shard in shards)
+
+    def test_shards_noresults(self, records_ids):
+        exporter = XunitExport(
+            "5_8_0_17", records_ids, self.config_prop, transform_func=lambda arg: None
+        )
+        with pytest.raises(NothingToDoException) as excinfo:
+            exporter.export_shards(max_records=5)
+        assert "Nothing to export" in str(excinfo.value)
+
+    def test_write_shards(self, tmpdir, records_ids):
+        exporter = XunitExport(
+            "5_8_0_17", records_ids, self.config_prop, transform_func=lambda arg: arg
+        )
+        shards = exporter.export_shards(max_records=10)
+        exporter.write_xml_shards(shards, str(tmpdir.join("out.xml")))
+        assert tmpdir.join("out-001.xml").check()
+        assert tmpdir.join("out-002.xml").check()
+
+
+class TestParallelTransform(TestConfigPropMixin):
+    @pytest.mark.parametrize(
+        "transform_func,golden_output",
+        (
+            (None, "complete_transform.xml"),
+            (only_passed_and_wait, "complete_passed_wait_transform.xml"),
+        ),
+        ids=("default", "picklable"),
+    )
+    def test_jobs_same_output(self, records_ids, transform_func, golden_output):
+        exporter = XunitExport(
+            "5_8_0_17", records_ids, self.config_prop, transform_func=transform_func, jobs=2
+        )
+        assert exporter._can_transform_in_pool()
+        complete = exporter.export()
+        with open(os.path.join(conf.DATA_PATH, golden_output), encoding="utf-8") as input_xml:
+            parsed = input_xml.read()
+        assert complete == parsed
+
+    def test_jobs_unpicklable(self, records_ids, captured_log):
+        exporter = XunitExport(
+            "5_8_0_17", records_ids, self.config_prop, transform_func=lambda arg: arg, jobs=2
+        )
+        assert not exporter._can_transform_in_pool()
+        assert "transforming results serially" in captured_log.getvalue()
+
+    @pytest.mark.parametrize("jobs", (1, 2))
+    def test_exported_callback(self, records_ids, jobs):
+        exported = []
+        exporter = XunitExport(
+            "5_8_0_17",
+            records_ids,
+            self.config_prop,
+            transform_func=only_passed_and_wait,
+            jobs=jobs,
+            exported_callback=exported.append,
+        )
+        xml_root = exporter.export_xml_root()
+        # the original records are reported, in the order of the testcases
+        assert [record["id"] for record in exported] == [
+            prop.get("value")
+            for prop in xml_root.findall(
+                "testsuite/testcase/properties/property[@name='polarion-testcase-id']"
+            )
+        ]
+        assert all(record in records_ids.results for record in exported)
+
+    def test_jobs_lazy_input(self, records_ids, monkeypatch):
+        monkeypatch.setattr(xunit_exporter, "_TRANSFORM_CHUNKSIZE", 5)
+        consumed = []
+
+        def _lazy_results():
+            for __ in range(100):
+                for record in records_ids.results:
+                    consumed.append(record)
+                    yield record
+
+        exporter = XunitExport(
+            "5_8_0_17",
+            records_ids._replace(results=_lazy_results()),
+            self.config_prop,
+            transform_func=only_passed_and_wait,
+            jobs=2,
+        )
+        transformed = exporter._transformed_results()
+        next(transformed)
+        # at most two windows of `jobs * chunksize` results were read
+        assert len(consumed) <= 2 * 2 * 5
+        assert sum(1 for __ in transformed) == 100 * len(records_ids.results) - 1
+
+
+class TestExportPlan:
+    def test_verdicts_table(self):
+        plan = compile_export_plan()
+        assert plan.verdicts["pass"].counter == "passed"
+        assert plan.verdicts["pass"].tag is None
+        assert plan.verdicts["blocked"] == ("skipped", "error", "error")
+        assert plan.verdicts["null"] == ("waiting", "skipped", "skipped")
+        with pytest.raises(TypeError):
+            plan.verdicts["foo"] = plan.verdicts["pass"]